@@ -1,6 +1,95 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Skill, ScheduledSession, CustomUser
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Prefetch
+from django.shortcuts import redirect, render
+from django.urls import path
+from django.utils.functional import cached_property
+
+from .models import Skill, ScheduledSession, CustomUser, UserImport
+
+
+def estimated_count(queryset):
+    """The planner's row estimate for an unfiltered queryset, or None.
+
+    PostgreSQL keeps one in ``pg_class.reltuples``; SQLite in
+    ``sqlite_stat1`` once ``ANALYZE`` has run.
+    """
+    if queryset.query.where:
+        return None
+    table = queryset.model._meta.db_table
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+    elif connection.vendor == "sqlite":
+        sql = "SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s"
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:  # No statistics yet
+        return None
+    # reltuples is -1 for a table that was never analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Counts unfiltered changelists of big tables from the planner's
+    estimate; an exact ``COUNT(*)`` scans the whole table."""
+
+    ESTIMATE_FROM = 100_000
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= self.ESTIMATE_FROM:
+            return estimate
+        return super().count
+
+
+class SkillFilter(admin.SimpleListFilter):
+    """Filters on a skill foreign key by name, typed with suggestions from
+    the admin autocomplete view, instead of listing every skill."""
+
+    template = "admin/api/skill_filter.html"
+    field_name = None
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(
+                **{f"{self.field_name}__in": Skill.objects.named(self.value())}
+            )
+        return queryset
+
+    def preserved_params(self):
+        """The other filters, kept when this one's form is submitted."""
+        return [
+            (name, value)
+            for name, values in self.request.GET.lists()
+            if name not in (self.parameter_name, "p")
+            for value in values
+        ]
+
+
+class TeachSkillFilter(SkillFilter):
+    title = "teach skill"
+    parameter_name = field_name = "teach_skill"
+
+
+class LearnSkillFilter(SkillFilter):
+    title = "learn skill"
+    parameter_name = field_name = "learn_skill"
 
 
 class SkillAdmin(admin.ModelAdmin):
@@ -16,41 +105,131 @@ class CustomUserAdmin(admin.ModelAdmin):
         "proficiency",
         "get_skills",
         "xp_points",
+        "get_rating",
     )  # Show basic user details
     search_fields = ("email", "fullName")  # Enable searching by email & name
     ordering = ("email",)  # Order by email
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    change_list_template = "admin/api/customuser/change_list.html"
+
+    def get_queryset(self, request):
+        # One query for the skills of the whole page, and the materialized
+        # rating aggregate joined in
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("reputation")
+            .prefetch_related(
+                Prefetch("skills", queryset=Skill.objects.only("name").order_by("name"))
+            )
+        )
 
     def get_skills(self, obj):
         return ", ".join([skill.name for skill in obj.skills.all()])
 
     get_skills.short_description = "Skills"  # Optional: Rename column in admin panel
 
+    def get_rating(self, obj):
+        try:
+            reputation = obj.reputation
+        except CustomUser.reputation.RelatedObjectDoesNotExist:
+            return "-"
+        return f"{reputation.mean:.2f} ({reputation.rating_count})"
+
+    get_rating.short_description = "Rating"
+    get_rating.admin_order_field = "reputation__bayesian_score"
+
+    def get_urls(self):
+        urls = [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_users),
+                name="api_customuser_import",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    # Bulk import from a CSV/JSONL upload, queued for the run_user_imports
+    # worker, see api.user_import
+    def import_users(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        form = UserImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            job = UserImport.objects.create(file=form.cleaned_data["file"])
+            self.message_user(
+                request,
+                f"Queued the import of {job.file.name}; "
+                "the run_user_imports worker will pick it up.",
+            )
+            return redirect("admin:api_userimport_changelist")
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "form": form,
+            "title": "Import users",
+        }
+        return render(request, "admin/api/customuser/import_users.html", context)
+
+
+class UserImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or JSONL, see api.user_import")
+
+
+@admin.register(UserImport)
+class UserImportAdmin(admin.ModelAdmin):
+    list_display = ("file", "status", "imported", "skipped", "created_at", "finished_at")
+    list_filter = ("status",)
+    ordering = ("-created_at",)
+    # Setting a failed import back to pending resumes it from its checkpoint
+    readonly_fields = ("file", "imported", "skipped", "error", "created_at", "finished_at")
+
+    def has_add_permission(self, request):
+        # Uploads go through the users' import page
+        return False
+
+
 @admin.register(ScheduledSession)
 class ScheduledSessionAdmin(admin.ModelAdmin):
     # Display fields in list view
     list_display = (
         'id',
         'user',
+        'teacher',
         'teach_skill',
         'learn_skill',
         'scheduled_date',
+        'end_date',
         'is_completed',
         'is_rated',
     )
     
-    # Make list view filterable
+    # Join the listed foreign keys, including the nullable teacher
+    list_select_related = ('user', 'teacher', 'teach_skill', 'learn_skill')
+
+    # Make list view filterable; skills are typed, not listed
     list_filter = (
         'is_completed',
         'is_rated',
-        'teach_skill',
-        'learn_skill',
+        TeachSkillFilter,
+        LearnSkillFilter,
         'scheduled_date',
     )
+
+    # Big tables: estimate the unfiltered count, skip the second count
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     # Add search functionality
     search_fields = (
         'user__username',
         'user__email',
+        'teacher__username',
+        'teacher__email',
         'teach_skill__name',
         'learn_skill__name',
     )
@@ -58,10 +237,10 @@ class ScheduledSessionAdmin(admin.ModelAdmin):
     # Fields to display in edit/create form
     fieldsets = (
         (None, {
-            'fields': ('user', 'teach_skill', 'learn_skill')
+            'fields': ('user', 'teacher', 'teach_skill', 'learn_skill')
         }),
         ('Scheduling', {
-            'fields': ('scheduled_date',)
+            'fields': ('scheduled_date', 'end_date')
         }),
         ('Status', {
             'fields': ('is_completed', 'is_rated')
@@ -69,7 +248,8 @@ class ScheduledSessionAdmin(admin.ModelAdmin):
     )
     
     # Raw ID fields for better performance with many users/skills
-    raw_id_fields = ('user', 'teach_skill', 'learn_skill')
+    raw_id_fields = ('user', 'teacher')
+    autocomplete_fields = ('teach_skill', 'learn_skill')
     
     # Date-based navigation
     date_hierarchy = 'scheduled_date'
@@ -77,6 +257,12 @@ class ScheduledSessionAdmin(admin.ModelAdmin):
     # Default ordering
     ordering = ('-scheduled_date',)
     
+    def get_queryset(self, request):
+        # The skills' embeddings are never shown
+        return super().get_queryset(request).defer(
+            'teach_skill__embedding', 'learn_skill__embedding'
+        )
+
     # Customize the user display
     def user_info(self, obj):
         return f"{obj.user.username} ({obj.user.email})"
@@ -0,0 +1,328 @@
+"""Reproducible benchmarks of the hot API endpoints.
+
+``seed()`` fills an empty database with users, skills, sessions and
+ratings. Popularity is skewed the way real traffic is: skills and users are
+picked with Zipf-like weights (``1 / rank ** ZIPF_EXPONENT``), so a few
+skills have most of the teachers and a few users most of the sessions.
+Everything derives from one random seed, so two runs build the same data.
+
+``run_endpoints()`` calls each benchmarked endpoint in-process through
+Django's test client and reports latency percentiles and the number of
+queries per request, in two passes: "cold" bumps the versions of every
+cached namespace before each request, so nothing is served from
+``api.cache``, and "warm" repeats the requests with the caches filled.
+Queries are counted by ``api.instrumentation``, which also sees those run
+in the matching thread pool. ``manage.py benchmark`` runs both on a
+throwaway database and writes the results as JSON for diffing between
+commits.
+"""
+
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+from itertools import accumulate, count
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import cache, instrumentation, reputation
+from .models import CustomUser, Rating, ScheduledSession, SessionParticipant, Skill
+from .session_history import participant_rows
+from .skills import resolve_skills
+
+ZIPF_EXPONENT = 1.1
+SKILL_NAMES = [
+    "Python", "JavaScript", "Guitar", "Spanish", "Cooking", "Photography",
+    "Drawing", "Piano", "French", "Yoga", "Excel", "Marketing", "Writing",
+    "Chess", "Django", "React", "Singing", "Public Speaking", "Statistics",
+    "Knitting", "German", "Running", "Baking", "SQL", "Design",
+]  # fmt: skip
+# Relative frequency of the ratings 1 to 5
+RATING_WEIGHTS = [1, 2, 5, 15, 20]
+PASSWORD = "benchmark-password"
+ENDPOINTS = ("find_match", "user_sessions", "user_profile", "get_skills", "register")
+PASSES = ("cold", "warm")
+# Every namespace the benchmarked endpoints cache under; profiles are keyed
+# by the skills and badges versions
+CACHED_NAMESPACES = ("matches", "skills", "badges")
+
+
+def zipf_weights(n):
+    return [1 / rank**ZIPF_EXPONENT for rank in range(1, n + 1)]
+
+
+def skill_names(count):
+    """``count`` distinct names, numbering repeats of ``SKILL_NAMES``."""
+    return [
+        SKILL_NAMES[i % len(SKILL_NAMES)]
+        + (f" {i // len(SKILL_NAMES) + 1}" if i >= len(SKILL_NAMES) else "")
+        for i in range(count)
+    ]
+
+
+def seed(users=1000, skills=50, sessions=5000, rated=0.6, random_seed=0):
+    """Insert a skewed data set and return the number of rows per model.
+
+    ``rated`` is the share of completed sessions that get a rating.
+    """
+    rng = random.Random(random_seed)
+    now = timezone.now().replace(minute=0, second=0, microsecond=0)
+    # Hashing is slow on purpose; every benchmark user shares one hash
+    password = make_password(PASSWORD)
+
+    with transaction.atomic():
+        user_rows = CustomUser.objects.bulk_create(
+            CustomUser(
+                username=f"bench{i}@example.com",
+                email=f"bench{i}@example.com",
+                fullName=f"Benchmark User {i}",
+                proficiency=rng.choice(CustomUser.PROFICIENCY_LEVELS)[0],
+                password=password,
+            )
+            for i in range(users)
+        )
+        skill_rows = resolve_skills(skill_names(skills))
+
+        # Shuffle so the popular users aren't simply the first ids
+        by_activity = user_rows[:]
+        rng.shuffle(by_activity)
+        user_weights = list(accumulate(zipf_weights(users)))
+        skill_weights = list(accumulate(zipf_weights(skills)))
+
+        def pick_users(k):
+            return rng.choices(by_activity, cum_weights=user_weights, k=k)
+
+        def pick_skills(k):
+            return rng.choices(skill_rows, cum_weights=skill_weights, k=k)
+
+        known, taught = set(), set()
+        for user in user_rows:
+            known.update(
+                (user.pk, skill.pk) for skill in pick_skills(rng.randint(1, 4))
+            )
+            if rng.random() < 0.3:
+                taught.update(
+                    (user.pk, skill.pk) for skill in pick_skills(rng.randint(1, 3))
+                )
+        CustomUser.skills.through.objects.bulk_create(
+            CustomUser.skills.through(customuser_id=user_id, skill_id=skill_id)
+            for user_id, skill_id in known
+        )
+        Skill.teachers.through.objects.bulk_create(
+            Skill.teachers.through(customuser_id=user_id, skill_id=skill_id)
+            for user_id, skill_id in taught
+        )
+        teachers_of = {}
+        for user_id, skill_id in sorted(taught):
+            teachers_of.setdefault(skill_id, []).append(user_id)
+
+        session_rows = []
+        for learner, skill in zip(pick_users(sessions), pick_skills(sessions)):
+            candidates = [
+                pk for pk in teachers_of.get(skill.pk, ()) if pk != learner.pk
+            ]
+            start = now + timedelta(hours=rng.randint(-24 * 90, 24 * 30))
+            session_rows.append(
+                ScheduledSession(
+                    user=learner,
+                    teacher_id=rng.choice(candidates) if candidates else None,
+                    teach_skill=skill,
+                    learn_skill=skill,
+                    scheduled_date=start,
+                    end_date=start + ScheduledSession.DEFAULT_LENGTH,
+                    is_completed=start < now,
+                )
+            )
+        for session in session_rows:
+            session.is_rated = (
+                session.is_completed
+                and session.teacher_id is not None
+                and rng.random() < rated
+            )
+        # bulk_create skips post_save, so write the listing rows here
+        ScheduledSession.objects.bulk_create(session_rows, batch_size=1000)
+        SessionParticipant.objects.bulk_create(
+            (row for session in session_rows for row in participant_rows(session)),
+            batch_size=1000,
+        )
+        Rating.objects.bulk_create(
+            (
+                Rating(
+                    skill_match=session,
+                    learner_id=session.user_id,
+                    teacher_id=session.teacher_id,
+                    rating=rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0],
+                )
+                for session in session_rows
+                if session.is_rated
+            ),
+            batch_size=1000,
+        )
+        reputation.rebuild()
+    cache.bump_version("matches")
+
+    return {
+        "users": users,
+        "skills": len(skill_rows),
+        "skills_known": len(known),
+        "skills_taught": len(taught),
+        "sessions": len(session_rows),
+        "ratings": sum(session.is_rated for session in session_rows),
+    }
+
+
+def percentiles(samples):
+    """p50, p95 and p99 of ``samples`` (seconds) in milliseconds."""
+    cuts = statistics.quantiles(samples, n=100) if len(samples) > 1 else []
+    return {
+        f"p{p}": round(cuts[p - 1] * 1000, 2) if cuts else None for p in (50, 95, 99)
+    }
+
+
+def _consume(response):
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response
+
+
+def endpoints():
+    """Benchmarked endpoints: name -> function of the iteration number that
+    makes one request with ``client``."""
+    users = list(CustomUser.objects.order_by("pk").values_list("pk", flat=True)[:50])
+    tokens = [
+        str(RefreshToken.for_user(CustomUser(pk=pk)).access_token) for pk in users
+    ]
+    names = list(Skill.objects.order_by("pk").values_list("name", flat=True)[:50])
+    registrations = count()
+
+    def auth(i):
+        return {"HTTP_AUTHORIZATION": f"Bearer {tokens[i % len(tokens)]}"}
+
+    def register(client, i):
+        n = next(registrations)
+        return client.post(
+            "/api/register/",
+            {
+                "email": f"bench-register-{n}@example.com",
+                "password": f"Register-{n}-pass",
+                "fullName": f"Registered {n}",
+                "skill_names": names[n % len(names) :][:2],
+            },
+            content_type="application/json",
+        )
+
+    return {
+        "find_match": lambda client, i: client.post(
+            "/api/find_match/",
+            {"learn": names[i % len(names)]},
+            content_type="application/json",
+        ),
+        "user_sessions": lambda client, i: client.get("/api/sessions/", **auth(i)),
+        "user_profile": lambda client, i: client.get("/api/profile/", **auth(i)),
+        "get_skills": lambda client, i: client.get("/api/skills/"),
+        "register": register,
+    }
+
+
+def invalidate_caches():
+    for namespace in CACHED_NAMESPACES:
+        cache.bump_version(namespace)
+
+
+def _queries():
+    """Queries the instrumentation has counted in this process so far."""
+    return sum(m["queries"] for m in instrumentation.metrics().values())
+
+
+def _measure(request, client, repeat, before_each=None):
+    latencies, queries, errors = [], [], 0
+    for i in range(repeat):
+        if before_each:
+            before_each()
+        counted = _queries()
+        start = time.perf_counter()
+        response = _consume(request(client, i))
+        latencies.append(time.perf_counter() - start)
+        queries.append(_queries() - counted)
+        errors += response.status_code >= 400
+
+    return {
+        "requests": repeat,
+        "errors": errors,
+        "latency_ms": {
+            **percentiles(latencies),
+            "mean": round(statistics.fmean(latencies) * 1000, 2),
+        },
+        "queries": {"mean": statistics.fmean(queries), "max": max(queries)},
+    }
+
+
+def run_endpoints(repeat=50, warmup=3, only=None):
+    """Time ``repeat`` requests to each endpoint with cold caches, then the
+    same ``repeat`` requests with warm ones.
+
+    ``warmup`` untimed requests come first. Before the warm pass its
+    requests are made once untimed, so every per-user entry it reads is
+    cached.
+    """
+    client = Client()
+    results = {}
+    for name, request in endpoints().items():
+        if only and name not in only:
+            continue
+        for i in range(warmup):
+            _consume(request(client, i))
+        cold = _measure(request, client, repeat, before_each=invalidate_caches)
+        for i in range(repeat):
+            _consume(request(client, i))
+        results[name] = {"cold": cold, "warm": _measure(request, client, repeat)}
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "machine": platform.machine(),
+    }
+
+
+def compare(old, new):
+    """Per endpoint and pass: p50 latency change in percent and the change
+    in queries."""
+    changes = {}
+    for name, result in new["endpoints"].items():
+        for phase in PASSES:
+            before = old.get("endpoints", {}).get(name, {}).get(phase)
+            if before is None:
+                continue
+            after = result[phase]
+            old_p50, new_p50 = before["latency_ms"]["p50"], after["latency_ms"]["p50"]
+            changes.setdefault(name, {})[phase] = {
+                "p50_change_pct": (
+                    round((new_p50 - old_p50) / old_p50 * 100, 1) if old_p50 else None
+                ),
+                "queries_change": after["queries"]["max"] - before["queries"]["max"],
+            }
+    return changes
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
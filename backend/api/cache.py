@@ -0,0 +1,144 @@
+"""Versioned, tiered memoization for API payloads.
+
+Two tiers are configured in ``settings.CACHES``: ``"default"`` is an
+in-process LRU and ``"shared"`` (optional) is visible to every worker.
+Lookups try the local tier first and backfill it from the shared one.
+
+Each namespace has a version number. Keys embed the current version, so
+bumping it (from model signals) invalidates every entry of the namespace at
+once without having to enumerate keys. Every process must see the same
+versions, or a bump in one worker leaves the others serving stale entries
+with their own ETags: they live in the shared tier, or without one in the
+host-wide ``"versions"`` SQLite cache.
+
+Versions are the time of the bump, so a miss computed soon after one reads
+from the primary database (``db_router.primary_reads_after``) rather than a
+replica that may not have the write yet.
+"""
+
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from . import db_router
+
+_MISSING = object()
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def record(tier, counter, amount=1):
+    if amount:
+        with _stats_lock:
+            _stats[tier, counter] += amount
+
+
+def stats():
+    """Hit, miss and eviction counts per tier, for this process."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    result = {}
+    for (tier, counter), value in snapshot.items():
+        result.setdefault(tier, {"hits": 0, "misses": 0, "evictions": 0})
+        result[tier][counter] = value
+    return result
+
+
+def _tiers():
+    tiers = [("local", caches[DEFAULT_CACHE_ALIAS])]
+    if "shared" in settings.CACHES:
+        tiers.append(("shared", caches["shared"]))
+    return tiers
+
+
+def version_alias():
+    return "shared" if "shared" in settings.CACHES else "versions"
+
+
+def _version_cache():
+    return caches[version_alias()]
+
+
+def _version_key(namespace):
+    return f"{namespace}:version"
+
+
+def get_version(namespace):
+    store = _version_cache()
+    version = store.get(_version_key(namespace))
+    if version is None:
+        # Start from a timestamp so a cache flush never reuses an old version
+        store.add(_version_key(namespace), time.time_ns(), None)
+        version = store.get(_version_key(namespace))
+    return version
+
+
+async def aget_version(namespace):
+    store = _version_cache()
+    version = await store.aget(_version_key(namespace))
+    if version is None:
+        await store.aadd(_version_key(namespace), time.time_ns(), None)
+        version = await store.aget(_version_key(namespace))
+    return version
+
+
+def bump_version(namespace):
+    _version_cache().set(_version_key(namespace), time.time_ns(), None)
+
+
+def make_key(namespace, version, *parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f"{namespace}:{version}:{digest}"
+
+
+def get_or_set(namespace, parts, compute, timeout=DEFAULT_TIMEOUT):
+    """Return the cached value for ``parts`` in ``namespace``, or compute it.
+
+    ``compute`` is called without arguments on a miss in every tier, and
+    its result is stored in all of them for ``timeout`` seconds.
+    """
+    version = get_version(namespace)
+    key = make_key(namespace, version, *parts)
+    missed = []
+    for name, tier in _tiers():
+        value = tier.get(key, _MISSING)
+        if value is not _MISSING:
+            record(name, "hits")
+            for upper in missed:
+                upper.set(key, value, timeout)
+            return value
+        record(name, "misses")
+        missed.append(tier)
+
+    with db_router.primary_reads_after(version):
+        value = compute()
+    for tier in missed:
+        tier.set(key, value, timeout)
+    return value
+
+
+async def aget_or_set(namespace, parts, compute, timeout=DEFAULT_TIMEOUT):
+    """Async ``get_or_set``; ``compute`` is a coroutine function."""
+    version = await aget_version(namespace)
+    key = make_key(namespace, version, *parts)
+    missed = []
+    for name, tier in _tiers():
+        value = await tier.aget(key, _MISSING)
+        if value is not _MISSING:
+            record(name, "hits")
+            for upper in missed:
+                await upper.aset(key, value, timeout)
+            return value
+        record(name, "misses")
+        missed.append(tier)
+
+    with db_router.primary_reads_after(version):
+        value = await compute()
+    for tier in missed:
+        await tier.aset(key, value, timeout)
+    return value
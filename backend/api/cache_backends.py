@@ -0,0 +1,178 @@
+"""Cache backends for the API's cache tiers (see CACHES in settings)."""
+
+import itertools
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import cache
+
+
+def _tier(params):
+    """The ``cache.stats()`` tier a backend counts its evictions under, set by
+    the TIER option of its CACHES entry."""
+    return params.get("OPTIONS", {}).get("TIER", "shared")
+
+
+class LRUCache(LocMemCache):
+    """Django's in-process LRU cache, counting evictions for ``cache.stats()``."""
+
+    def _cull(self):
+        size = len(self._cache)
+        super()._cull()
+        cache.record("local", "evictions", size - len(self._cache))
+
+    # Lookups never block on I/O, so async callers skip the thread hop the
+    # base class makes through sync_to_async.
+    async def aget(self, key, default=None, version=None):
+        return self.get(key, default, version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set(key, value, timeout, version)
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.add(key, value, timeout, version)
+
+
+class FileCache(FileBasedCache):
+    """Django's file cache, counting evictions for ``cache.stats()``."""
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._tier = _tier(params)
+
+    def _cull(self):
+        size = len(self._list_cache_files())
+        if size < self._max_entries:
+            return
+        super()._cull()
+        cache.record(self._tier, "evictions", size - len(self._list_cache_files()))
+
+
+class SQLiteCache(BaseCache):
+    """A cache shared by every process on the host, stored in one SQLite file.
+
+    Runs in WAL mode so readers never block on a writer. Every CULL_EVERY
+    writes of a process, and once the table has reached MAX_ENTRIES,
+    expired rows are dropped first, then the rows closest to expiry. The
+    table can overshoot MAX_ENTRIES by up to CULL_EVERY rows per process.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._tier = _tier(params)
+        self._cull_every = int(params.get("OPTIONS", {}).get("CULL_EVERY", 100))
+        self._writes = itertools.count(1)
+
+    @property
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+            self._local.db = db
+        return db
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._db.execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    # In WAL mode a read never waits for a writer, so async callers read on
+    # the event loop instead of hopping to a thread
+    async def aget(self, key, default=None, version=None):
+        return self.get(key, default, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._cull()
+        self._db.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, self._pickle(value), self.get_backend_timeout(timeout)),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._cull()
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute(
+                "DELETE FROM cache WHERE key = ? AND expires <= ?", (key, time.time())
+            )
+            added = db.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, self._pickle(value), self.get_backend_timeout(timeout)),
+            ).rowcount
+        finally:
+            db.execute("COMMIT")
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(
+            self._db.execute(
+                "UPDATE cache SET expires = ? "
+                "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (self.get_backend_timeout(timeout), key, time.time()),
+            ).rowcount
+        )
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount
+        )
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return (
+            self._db.execute(
+                "SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, time.time()),
+            ).fetchone()
+            is not None
+        )
+
+    def clear(self):
+        self._db.execute("DELETE FROM cache")
+
+    def _pickle(self, value):
+        return sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def _cull(self):
+        # Counting the rows costs a scan of the expiry index, not worth
+        # paying on every write
+        if next(self._writes) % self._cull_every:
+            return
+        db = self._db
+        (size,) = db.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if size < self._max_entries:
+            return
+        db.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+        (size,) = db.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if size < self._max_entries:
+            return
+        count = size if self._cull_frequency == 0 else size // self._cull_frequency
+        evicted = db.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+            "ORDER BY expires IS NULL, expires LIMIT ?)",
+            (count,),
+        ).rowcount
+        cache.record(self._tier, "evictions", evicted)
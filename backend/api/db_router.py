@@ -0,0 +1,199 @@
+"""Read-only views read from a replica, everything else from the primary.
+
+``ReplicaMiddleware`` marks requests to the views named in
+``READ_REPLICA["VIEWS"]`` (URL names), and ``ReplicaRouter`` sends their
+reads to the ``READ_REPLICA["ALIAS"]`` database. Writes, and reads of all
+other requests, go to ``default``.
+
+Replicas lag behind the primary by up to ``STICKY_SECONDS``, so reads stay
+on the primary when they could miss a write:
+
+- once a request writes, its later reads use the primary;
+- a request that writes, or uses an unsafe method on any other view, pins
+  the user of its JWT to the primary for ``STICKY_SECONDS``. Pins are kept
+  in the cache ``api.cache`` keeps its versions in, so every worker sees
+  them; anonymous requests aren't pinned;
+- ``api.cache`` computes misses under ``primary_reads_after()``: an entry
+  filled within ``STICKY_SECONDS`` of its namespace's version bump is read
+  from the primary, so no stale replica result is cached under the new
+  version.
+
+Without the replica alias in ``DATABASES`` the middleware does nothing.
+"""
+
+import contextlib
+import contextvars
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.urls import Resolver404, resolve
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import cache
+
+DEFAULTS = {
+    "ALIAS": "replica",
+    "VIEWS": (),
+    "STICKY_SECONDS": 5,
+}
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, "READ_REPLICA", {})}
+
+
+_jwt = JWTAuthentication()
+
+
+def user_id(request):
+    """The user id in the request's valid JWT, or None."""
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        return _jwt.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+    except AuthenticationFailed:
+        return None
+
+
+def _pins():
+    return caches[cache.version_alias()]
+
+
+def _pin_key(user_id):
+    return f"primary_until:{user_id}"
+
+
+def pin(user_id):
+    """Send ``user_id``'s reads to the primary for ``STICKY_SECONDS``."""
+    _pins().set(_pin_key(user_id), True, config()["STICKY_SECONDS"])
+
+
+def is_pinned(user_id):
+    return _pins().get(_pin_key(user_id)) is not None
+
+
+class RequestRouting:
+    def __init__(self, request, read_only_view):
+        self.request = request
+        self.read_only_view = read_only_view
+        self.wrote = False
+
+    @cached_property
+    def user_id(self):
+        return user_id(self.request)
+
+    @cached_property
+    def pinned(self):
+        return self.user_id is not None and is_pinned(self.user_id)
+
+    @property
+    def use_replica(self):
+        # Only looks up the pin for the views that could use the replica
+        return self.read_only_view and not self.wrote and not self.pinned
+
+
+_current = contextvars.ContextVar("request_routing", default=None)
+_primary = contextvars.ContextVar("primary_reads", default=False)
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Send the reads of the block to the primary."""
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+def primary_reads_after(bumped_ns):
+    """``primary_reads()`` if ``bumped_ns`` (a ``time.time_ns()``) is more
+    recent than replicas may lag, else a no-op context manager."""
+    if time.time_ns() - bumped_ns < config()["STICKY_SECONDS"] * 1_000_000_000:
+        return primary_reads()
+    return contextlib.nullcontext()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _current.get()
+        if routing is not None and not _primary.get() and routing.use_replica:
+            return config()["ALIAS"]
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None:
+            routing.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get the schema through replication
+        return db == "default"
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = self.routing(request)
+        token = _current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, routing)
+
+    async def __acall__(self, request):
+        routing = self.routing(request)
+        token = _current.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, routing)
+
+    @staticmethod
+    def routing(request):
+        conf = config()
+        if conf["ALIAS"] not in settings.DATABASES:
+            return None
+        try:
+            url_name = resolve(
+                request.path_info, getattr(request, "urlconf", None)
+            ).url_name
+        except Resolver404:
+            url_name = None
+        return RequestRouting(request, url_name in conf["VIEWS"])
+
+    @staticmethod
+    def finish(request, response, routing):
+        if routing is None:
+            return response
+        if routing.wrote or (
+            request.method not in SAFE_METHODS and not routing.read_only_view
+        ):
+            if routing.user_id is not None:
+                pin(routing.user_id)
+        return response
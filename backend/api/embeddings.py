@@ -0,0 +1,71 @@
+"""Skill embeddings used by the matching endpoints.
+
+Each ``Skill`` stores the spaCy vector of its name as a unit-length float32
+blob, so similarity between skills is a plain dot product and a whole
+candidate set can be scored with a single matrix operation. Tests swap the
+model for ``api.testing.hashed_vector`` through ``settings.SKILL_VECTORIZER``.
+"""
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DTYPE = np.float32
+
+
+def vectorizer():
+    """The function turning text into a vector, ``settings.SKILL_VECTORIZER``."""
+    return import_string(settings.SKILL_VECTORIZER)
+
+
+def embed_text(text):
+    """Return the normalized embedding of ``text`` as a float32 vector."""
+    vector = np.asarray(vectorizer()(text), dtype=DTYPE)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector = vector / norm
+    return vector
+
+
+def encode(text):
+    """Return the embedding of ``text`` packed for ``Skill.embedding``."""
+    return embed_text(text).tobytes()
+
+
+def decode(blob):
+    return np.frombuffer(blob, dtype=DTYPE)
+
+
+def ensure_embeddings(skills):
+    """Fill in missing embeddings on ``skills`` and persist them."""
+    from .models import Skill
+
+    missing = [skill for skill in skills if not skill.embedding]
+    for skill in missing:
+        skill.embedding = encode(skill.name)
+    if missing:
+        Skill.objects.bulk_update(missing, ["embedding"])
+    return skills
+
+
+def skill_vector(skill):
+    return decode(ensure_embeddings([skill])[0].embedding)
+
+
+def embedding_matrix(skills):
+    """Stack the embeddings of ``skills`` into an ``(n, dim)`` matrix."""
+    skills = ensure_embeddings(list(skills))
+    if not skills:
+        return np.zeros((0, 0), dtype=DTYPE)
+    return np.vstack([decode(skill.embedding) for skill in skills])
+
+
+def cosine_scores(query, matrix):
+    """Cosine similarity of ``query`` against every row of ``matrix``.
+
+    Both sides are stored normalized, so this is a single mat-vec product.
+    Rows with a zero vector (out-of-vocabulary names) score 0.
+    """
+    if matrix.size == 0:
+        return np.zeros(0, dtype=DTYPE)
+    return matrix @ query
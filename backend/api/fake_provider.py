@@ -0,0 +1,124 @@
+"""Local stand-in for the Africa's Talking messaging API.
+
+Used by the outbox tests, and by load tests through ``python manage.py
+fake_provider``, so SMS delivery can be exercised without network access or
+credentials. ``latency`` delays every response and a fraction
+``error_rate`` of requests fail with HTTP 500::
+
+    with FakeProvider(latency=0.05) as provider:
+        settings.AFRICASTALKING_SMS_URL = provider.url
+        ...
+
+``reply(status, body)`` queues a response for the next request instead,
+e.g. a 429 or a 201 with a body that isn't JSON (pass a string).
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        provider = self.server.provider
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        numbers = [n for n in form.get("to", [""])[0].split(",") if n]
+        provider.record(numbers, form.get("message", [""])[0])
+
+        if provider.latency:
+            time.sleep(provider.latency)
+        scripted = provider.next_reply()
+        if scripted is not None:
+            return self._reply(*scripted)
+        if random.random() < provider.error_rate:
+            return self._reply(500, {"error": "Simulated provider failure"})
+
+        recipients = [
+            {
+                "number": number,
+                "status": "Success",
+                "statusCode": 101,
+                "messageId": f"ATXid_{provider.requests}_{i}",
+                "cost": "KES 0.8000",
+            }
+            for i, number in enumerate(numbers)
+        ]
+        self._reply(
+            201,
+            {
+                "SMSMessageData": {
+                    "Message": f"Sent to {len(recipients)}/{len(numbers)}",
+                    "Recipients": recipients,
+                }
+            },
+        )
+
+    def _reply(self, status, body):
+        payload = (body if isinstance(body, str) else json.dumps(body)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.provider.verbose:
+            super().log_message(format, *args)
+
+
+class FakeProvider:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.verbose = False
+        self.requests = 0
+        self.messages = []
+        self._replies = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.provider = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/version1/messaging"
+
+    def record(self, numbers, message):
+        with self._lock:
+            self.requests += 1
+            self.messages.extend((number, message) for number in numbers)
+
+    def reply(self, status, body=None):
+        """Answer a coming request with ``status`` and ``body``, in queued order."""
+        with self._lock:
+            self._replies.append((status, {} if body is None else body))
+
+    def next_reply(self):
+        with self._lock:
+            return self._replies.pop(0) if self._replies else None
+
+    def start(self):
+        # A short poll interval lets stop() return quickly
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,264 @@
+"""Shared, instrumented client for outbound HTTP calls to providers.
+
+``get_client(name)`` returns a process-wide client per integration. Each
+one keeps a keep-alive connection pool per host, applies the timeouts from
+``settings.HTTP_CLIENT`` and guards every host with a circuit breaker: after
+``BREAKER_FAILURES`` consecutive failures calls fail fast with
+``CircuitOpenError`` for ``BREAKER_RESET`` seconds, then a single trial
+call decides whether the host is healthy again.
+
+Latency histograms and error counts per host are available from
+``metrics()``. ``get_async_client(name)`` is the ``httpx``-based variant for
+async views; it shares the breakers and metrics with the sync client and
+raises the same ``requests`` exceptions.
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import instrumentation
+from .instrumentation import LATENCY_BUCKETS
+
+DEFAULTS = {
+    "CONNECT_TIMEOUT": 3.05,
+    "READ_TIMEOUT": 10,
+    "POOL_CONNECTIONS": 8,
+    "POOL_MAXSIZE": 16,
+    "BREAKER_FAILURES": 5,
+    "BREAKER_RESET": 30,
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, "HTTP_CLIENT", {})}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling a host whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failures, reset_timeout):
+        self.max_failures = failures
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self.trial_running):
+                raise CircuitOpenError("Circuit breaker is open")
+            if state == "half-open":
+                self.trial_running = True
+
+    def record(self, ok):
+        with self._lock:
+            self.trial_running = False
+            if ok:
+                self.failures, self.opened_at = 0, None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.max_failures:
+                self.opened_at = time.monotonic()
+
+
+class HostMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+
+    def observe(self, seconds, ok):
+        self.requests += 1
+        self.errors += not ok
+        self.latency_sum += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+        else:
+            self.bucket_counts[-1] += 1
+
+    def snapshot(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), self.bucket_counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "latency_sum": self.latency_sum,
+            "latency_buckets": buckets,
+        }
+
+
+_lock = threading.Lock()
+_breakers = {}
+_metrics = {}
+
+
+def _host(url):
+    return urlsplit(url).netloc
+
+
+def _breaker(host):
+    with _lock:
+        if host not in _breakers:
+            conf = config()
+            _breakers[host] = CircuitBreaker(
+                conf["BREAKER_FAILURES"], conf["BREAKER_RESET"]
+            )
+        return _breakers[host]
+
+
+def _observe(host, seconds, ok):
+    instrumentation.record_http(seconds)
+    with _lock:
+        _metrics.setdefault(host, HostMetrics()).observe(seconds, ok)
+
+
+def _reject(host):
+    with _lock:
+        _metrics.setdefault(host, HostMetrics()).rejected += 1
+
+
+def metrics():
+    """Per-host request, error and latency histogram counts for this process."""
+    with _lock:
+        return {
+            host: {**host_metrics.snapshot(), "circuit": _breakers[host].state}
+            for host, host_metrics in _metrics.items()
+            if host in _breakers
+        }
+
+
+def _is_failure(status_code):
+    return status_code >= 500 or status_code == 429
+
+
+class HttpClient:
+    def __init__(self):
+        conf = config()
+        self.timeout = (conf["CONNECT_TIMEOUT"], conf["READ_TIMEOUT"])
+        self.session = requests.Session()
+        # The adapter's pool manager keeps a separate pool for every host
+        adapter = HTTPAdapter(
+            pool_connections=conf["POOL_CONNECTIONS"], pool_maxsize=conf["POOL_MAXSIZE"]
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        host = _host(url)
+        breaker = _breaker(host)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            _reject(host)
+            raise
+
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, url, **kwargs)
+            ok = not _is_failure(response.status_code)
+            return response
+        finally:
+            _observe(host, time.perf_counter() - start, ok)
+            breaker.record(ok)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+class AsyncHttpClient:
+    def __init__(self):
+        import httpx
+
+        self._httpx = httpx
+        conf = config()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                conf["READ_TIMEOUT"], connect=conf["CONNECT_TIMEOUT"]
+            ),
+            limits=httpx.Limits(
+                max_connections=conf["POOL_MAXSIZE"] * conf["POOL_CONNECTIONS"],
+                max_keepalive_connections=conf["POOL_MAXSIZE"],
+            ),
+        )
+
+    async def request(self, method, url, **kwargs):
+        host = _host(url)
+        breaker = _breaker(host)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            _reject(host)
+            raise
+
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = not _is_failure(response.status_code)
+            return response
+        except self._httpx.TimeoutException as e:
+            raise requests.Timeout(str(e) or "Request timed out") from e
+        except self._httpx.HTTPError as e:
+            raise requests.ConnectionError(str(e) or type(e).__name__) from e
+        finally:
+            _observe(host, time.perf_counter() - start, ok)
+            breaker.record(ok)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+
+_clients = {}
+# httpx clients are bound to the event loop they were first used on
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client(name):
+    with _lock:
+        if name not in _clients:
+            _clients[name] = HttpClient()
+        return _clients[name]
+
+
+def get_async_client(name):
+    """Async client for ``name`` on the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        if name not in clients:
+            clients[name] = AsyncHttpClient()
+        return clients[name]
@@ -0,0 +1,359 @@
+"""Per-request timing: wall time, DB queries, outbound HTTP and rendering.
+
+``PerformanceMiddleware`` opens a ``RequestTimings`` for every request in a
+context variable, so it follows the request into ``sync_to_async`` threads
+and async views. Every DB connection gets an execute wrapper
+(``install``) and ``api.http_client`` reports each outbound call, both
+adding to the current request's timings.
+
+When the response is ready the middleware
+
+- adds a ``Server-Timing`` header if ``PERFORMANCE["SERVER_TIMING"]`` is on,
+- folds the timings into per-endpoint histograms, exposed in Prometheus'
+  text format by ``prometheus()``,
+- checks ``PERFORMANCE["QUERY_BUDGETS"]``, the maximum number of queries
+  per URL name. Over budget it logs a warning, or raises
+  ``QueryBudgetExceeded`` if ``BUDGET_ACTION`` is ``"raise"``, which fails
+  the test that made the request.
+
+Rendering is the time DRF and template responses take to render, which
+the middleware measures itself, plus the JSON encoding of views answering
+with ``TimedJsonResponse``. Timings of streaming responses stop when the
+view returns, not when the stream is consumed.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+DEFAULTS = {
+    "SERVER_TIMING": False,
+    "QUERY_BUDGETS": {},
+    "BUDGET_ACTION": "log",
+    "METRICS_ALLOWED_IPS": ("127.0.0.1", "::1"),
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, "PERFORMANCE", {})}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.http = 0.0
+        self.http_calls = 0
+        self.render = 0.0
+        self._render_started = None
+        # async views can reach the DB from several threads at once
+        self._lock = threading.Lock()
+
+    def add_query(self, seconds):
+        with self._lock:
+            self.queries += 1
+            self.db += seconds
+
+    def add_http(self, seconds):
+        with self._lock:
+            self.http_calls += 1
+            self.http += seconds
+
+    def add_render(self, seconds):
+        with self._lock:
+            self.render += seconds
+
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+def current():
+    """The ``RequestTimings`` of the request being handled, if any."""
+    return _current.get()
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(time.perf_counter() - start)
+
+
+def install(connection):
+    """Time the queries run on ``connection``; called for each new one."""
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def record_http(seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.add_http(seconds)
+
+
+@contextmanager
+def rendering():
+    """Count the time spent in the block as the current request's rendering."""
+    timings = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add_render(time.perf_counter() - start)
+
+
+class TimedJsonResponse(JsonResponse):
+    """A ``JsonResponse`` whose encoding counts as rendering time."""
+
+    def __init__(self, *args, **kwargs):
+        with rendering():
+            super().__init__(*args, **kwargs)
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+        else:
+            self.bucket_counts[-1] += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), self.bucket_counts):
+            total += count
+            yield str(bound), total
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.duration = Histogram()
+        self.queries = 0
+        self.db = 0.0
+        self.http = 0.0
+        self.render = 0.0
+        self.over_budget = 0
+        self.statuses = {}
+
+    def observe(self, timings, duration, status, over_budget):
+        self.duration.observe(duration)
+        self.queries += timings.queries
+        self.db += timings.db
+        self.http += timings.http
+        self.render += timings.render
+        self.over_budget += over_budget
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+_lock = threading.Lock()
+_endpoints = {}
+
+
+def _endpoint(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.url_name or match.route or match.view_name
+
+
+def server_timing(timings, duration):
+    return ", ".join(
+        (
+            f"total;dur={duration * 1000:.1f}",
+            f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries"',
+            f'http;dur={timings.http * 1000:.1f};desc="{timings.http_calls} calls"',
+            f"render;dur={timings.render * 1000:.1f}",
+        )
+    )
+
+
+def metrics():
+    """Per-endpoint counters and duration histograms for this process."""
+    with _lock:
+        return {
+            endpoint: {
+                "requests": m.duration.count,
+                "duration_sum": m.duration.sum,
+                "duration_buckets": dict(m.duration.cumulative()),
+                "queries": m.queries,
+                "db_seconds": m.db,
+                "http_seconds": m.http,
+                "render_seconds": m.render,
+                "over_budget": m.over_budget,
+                "statuses": dict(m.statuses),
+            }
+            for endpoint, m in _endpoints.items()
+        }
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def _family(lines, name, kind, help_text):
+    lines.append(f"# HELP skillbloom_{name} {help_text}")
+    lines.append(f"# TYPE skillbloom_{name} {kind}")
+
+
+def _counter(lines, name, help_text, samples):
+    _family(lines, name, "counter", help_text)
+    for labels, value in samples:
+        lines.append(f"skillbloom_{name}{_labels(labels)} {value}")
+
+
+def _histogram(lines, name, help_text, series):
+    """``series`` holds ``(labels, buckets, sum, count)`` tuples."""
+    _family(lines, name, "histogram", help_text)
+    for labels, buckets, total, count in series:
+        for bound, cumulative in buckets.items():
+            bucket_labels = _labels({**labels, "le": bound})
+            lines.append(f"skillbloom_{name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"skillbloom_{name}_sum{_labels(labels)} {total}")
+        lines.append(f"skillbloom_{name}_count{_labels(labels)} {count}")
+
+
+def prometheus(http_metrics=None):
+    """``metrics()``, and ``http_metrics`` from ``api.http_client`` if
+    given, in Prometheus' text exposition format."""
+    lines = []
+    views = [({"endpoint": e}, m) for e, m in sorted(metrics().items())]
+    _histogram(
+        lines,
+        "request_duration_seconds",
+        "Time spent handling requests.",
+        [
+            (labels, m["duration_buckets"], m["duration_sum"], m["requests"])
+            for labels, m in views
+        ],
+    )
+    for key, name, help_text in (
+        ("queries", "db_queries_total", "DB queries run."),
+        ("db_seconds", "db_seconds_total", "Time spent in DB queries."),
+        ("http_seconds", "http_seconds_total", "Time spent in outbound HTTP calls."),
+        ("render_seconds", "render_seconds_total", "Time spent rendering responses."),
+        ("over_budget", "query_budget_exceeded_total", "Requests over query budget."),
+    ):
+        _counter(lines, name, help_text, [(labels, m[key]) for labels, m in views])
+    _counter(
+        lines,
+        "responses_total",
+        "Responses by status code.",
+        [
+            ({**labels, "status": status}, count)
+            for labels, m in views
+            for status, count in sorted(m["statuses"].items())
+        ],
+    )
+
+    if http_metrics:
+        hosts = [({"host": host}, m) for host, m in sorted(http_metrics.items())]
+        _histogram(
+            lines,
+            "http_client_duration_seconds",
+            "Latency of outbound HTTP calls.",
+            [
+                (labels, m["latency_buckets"], m["latency_sum"], m["requests"])
+                for labels, m in hosts
+            ],
+        )
+        _counter(
+            lines,
+            "http_client_errors_total",
+            "Failed outbound HTTP calls.",
+            [(labels, m["errors"]) for labels, m in hosts],
+        )
+    return "\n".join(lines) + "\n"
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    def process_template_response(self, request, response):
+        # Called just before DRF and template responses are rendered
+        timings = _current.get()
+        if timings is not None:
+            timings._render_started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: self._rendered(timings))
+        return response
+
+    @staticmethod
+    def _rendered(timings):
+        timings.add_render(time.perf_counter() - timings._render_started)
+
+    def finish(self, request, response, timings):
+        duration = time.perf_counter() - timings.started
+        conf = config()
+        endpoint = _endpoint(request)
+        budget = conf["QUERY_BUDGETS"].get(endpoint)
+        over_budget = budget is not None and timings.queries > budget
+
+        with _lock:
+            _endpoints.setdefault(endpoint, EndpointMetrics()).observe(
+                timings, duration, response.status_code, over_budget
+            )
+        if conf["SERVER_TIMING"]:
+            response["Server-Timing"] = server_timing(timings, duration)
+        if over_budget:
+            message = (
+                f"{request.method} {request.path} ({endpoint}) ran "
+                f"{timings.queries} queries, over its budget of {budget}"
+            )
+            if conf["BUDGET_ACTION"] == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,89 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with skewed data, benchmark the hot endpoints "
+        "with cold and warm caches and write latency percentiles and queries "
+        "per request as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--skills", type=int, default=50)
+        parser.add_argument("--sessions", type=int, default=5000)
+        parser.add_argument("--rated", type=float, default=0.6)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            choices=benchmarks.ENDPOINTS,
+            help="Only benchmark this endpoint (repeatable)",
+        )
+        parser.add_argument("--output", help="Write the results to this file")
+        parser.add_argument(
+            "--compare", help="Earlier results to report p50 and query changes against"
+        )
+
+    def handle(self, *args, **options):
+        # The test database and environment, so the benchmark never touches
+        # real data and the test client's host is allowed
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            start = time.perf_counter()
+            rows = benchmarks.seed(
+                users=options["users"],
+                skills=options["skills"],
+                sessions=options["sessions"],
+                rated=options["rated"],
+                random_seed=options["seed"],
+            )
+            seed_seconds = time.perf_counter() - start
+            results = {
+                "environment": benchmarks.environment(),
+                "params": {
+                    key: options[key]
+                    for key in (
+                        "users",
+                        "skills",
+                        "sessions",
+                        "rated",
+                        "seed",
+                        "repeat",
+                    )
+                },
+                "rows": rows,
+                "seed_seconds": round(seed_seconds, 3),
+                "endpoints": benchmarks.run_endpoints(
+                    options["repeat"], options["warmup"], options["endpoint"]
+                ),
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["compare"]:
+            results["compared_to"] = {
+                "file": options["compare"],
+                "changes": benchmarks.compare(
+                    benchmarks.load(options["compare"]), results
+                ),
+            }
+
+        output = json.dumps(results, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+        self.stdout.write(output)
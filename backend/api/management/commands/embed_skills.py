@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from api import embeddings
+from api.models import Skill
+
+
+class Command(BaseCommand):
+    help = "Compute the stored embedding of every skill (missing ones by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute embeddings that are already stored",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        skills = Skill.objects.only("pk", "name", "embedding").order_by("pk")
+        if not options["all"]:
+            skills = skills.filter(embedding__isnull=True)
+
+        batch, updated = [], 0
+        for skill in skills.iterator(chunk_size=options["batch_size"]):
+            skill.embedding = embeddings.encode(skill.name)
+            batch.append(skill)
+            if len(batch) >= options["batch_size"]:
+                updated += Skill.objects.bulk_update(batch, ["embedding"])
+                batch = []
+        if batch:
+            updated += Skill.objects.bulk_update(batch, ["embedding"])
+
+        self.stdout.write(self.style.SUCCESS(f"Embedded {updated} skills"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from api.fake_provider import FakeProvider
+
+
+class Command(BaseCommand):
+    help = "Run a local fake of the Africa's Talking SMS API for tests and benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8025)
+        parser.add_argument(
+            "--latency", type=float, default=0.0, help="Seconds added to each response"
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of requests that fail",
+        )
+
+    def handle(self, *args, **options):
+        provider = FakeProvider(
+            options["host"], options["port"], options["latency"], options["error_rate"]
+        )
+        provider.verbose = True
+        self.stdout.write(
+            f"Fake provider listening on {provider.url}\n"
+            f"Set AFRICASTALKING_SMS_URL={provider.url}"
+        )
+        try:
+            provider.server.serve_forever()
+        except KeyboardInterrupt:
+            provider.server.server_close()
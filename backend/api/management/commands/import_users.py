@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from api import user_import
+
+
+class Command(BaseCommand):
+    help = "Bulk import users from a CSV or JSONL file (see api.user_import)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Password hashing processes"
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint and start from the first row",
+        )
+
+    def handle(self, *args, **options):
+        def progress(done, totals):
+            self.stdout.write(
+                f"{done} rows: {totals['imported']} imported, "
+                f"{totals['skipped']} skipped"
+            )
+
+        totals = user_import.import_users(
+            options["path"],
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            resume=not options["restart"],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {totals['imported']} users, skipped {totals['skipped']}"
+            )
+        )
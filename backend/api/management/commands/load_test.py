@@ -0,0 +1,88 @@
+import asyncio
+import json
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import percentiles
+
+# The query count in the Server-Timing header of api.instrumentation
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent requests at a running server and report throughput and "
+        "latency percentiles"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url")
+        parser.add_argument("--method", default="GET")
+        parser.add_argument("--data", help="JSON request body")
+        parser.add_argument("--token", help="JWT access token to send")
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--timeout", type=float, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            import httpx
+        except ImportError:
+            raise CommandError("load_test needs httpx (pip install httpx)")
+
+        result = asyncio.run(self.run(httpx, options))
+        self.stdout.write(json.dumps(result, indent=2))
+
+    async def run(self, httpx, options):
+        headers = {"Content-Type": "application/json"}
+        if options["token"]:
+            headers["Authorization"] = f"Bearer {options['token']}"
+        body = options["data"].encode() if options["data"] else None
+        remaining = iter(range(options["requests"]))
+        latencies, statuses, queries = [], {}, []
+
+        async def worker(client):
+            for _ in remaining:
+                start = time.perf_counter()
+                try:
+                    response = await client.request(
+                        options["method"], options["url"], content=body
+                    )
+                    status = str(response.status_code)
+                    found = SERVER_TIMING_QUERIES.search(
+                        response.headers.get("Server-Timing", "")
+                    )
+                    if found:
+                        queries.append(int(found[1]))
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        async with httpx.AsyncClient(
+            headers=headers, limits=limits, timeout=options["timeout"]
+        ) as client:
+            start = time.perf_counter()
+            await asyncio.gather(
+                *(worker(client) for _ in range(options["concurrency"]))
+            )
+            elapsed = time.perf_counter() - start
+
+        return {
+            "requests": len(latencies),
+            "concurrency": options["concurrency"],
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "latency_ms": percentiles(latencies),
+            # Only when the server sends Server-Timing headers
+            "queries_per_request": (
+                {"mean": statistics.fmean(queries), "max": max(queries)}
+                if queries
+                else None
+            ),
+            "statuses": statuses,
+        }
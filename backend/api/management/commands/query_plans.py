@@ -0,0 +1,107 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Avg, Count
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api import benchmarks, session_history
+from api.models import (
+    CustomUser,
+    Rating,
+    Review,
+    ScheduledSession,
+    SessionParticipant,
+    Skill,
+)
+
+INDEXED_MODELS = [Skill, ScheduledSession, SessionParticipant, Review, Rating]
+
+
+def hot_path_queries():
+    """The queries the hot-path indexes were designed for, by name."""
+    user = CustomUser.objects.order_by("pk").first() or CustomUser(pk=0)
+    skill = Skill.objects.order_by("pk").first()
+    return {
+        "user_sessions": session_history.sessions_for(user)[:50],
+        "admin_status_filter": ScheduledSession.objects.filter(
+            is_completed=False, is_rated=False
+        ).order_by("-scheduled_date")[:100],
+        "pending_ratings": ScheduledSession.objects.filter(
+            is_completed=True, is_rated=False
+        ).order_by("-scheduled_date")[:100],
+        "teacher_rating": Rating.objects.filter(teacher_id=user.pk)
+        .values("teacher_id")
+        .annotate(count=Count("pk"), average=Avg("rating")),
+        "review_rating": Review.objects.filter(user_id=user.pk)
+        .values("user_id")
+        .annotate(count=Count("pk"), average=Avg("rating")),
+        "skill_by_name": Skill.objects.named(skill.name if skill else "python"),
+    }
+
+
+def drop_indexes():
+    """Drop the hot-path indexes of ``INDEXED_MODELS``."""
+    with connection.schema_editor() as editor:
+        for model in INDEXED_MODELS:
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database and show the query plan and timing of each "
+        "hot-path query with and without the hot-path indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--skills", type=int, default=50)
+        parser.add_argument("--sessions", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--json", action="store_true", help="Print JSON")
+
+    def handle(self, *args, **options):
+        # Indexes are dropped for the "before" plans, so never on real data:
+        # everything runs on the test database, seeded like ``benchmark``'s
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            benchmarks.seed(
+                users=options["users"],
+                skills=options["skills"],
+                sessions=options["sessions"],
+                random_seed=options["seed"],
+            )
+            report = {"after": self.measure(options["repeat"])}
+            drop_indexes()
+            report["before"] = self.measure(options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for name in report["after"]:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for phase in ("before", "after"):
+                result = report[phase][name]
+                self.stdout.write(f"  {phase} ({result['ms']:.3f} ms)")
+                for line in result["plan"].splitlines():
+                    self.stdout.write(f"    {line}")
+
+    def measure(self, repeat):
+        results = {}
+        for name, queryset in hot_path_queries().items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - start) / repeat
+            results[name] = {"plan": queryset.explain(), "ms": elapsed * 1000}
+        return results
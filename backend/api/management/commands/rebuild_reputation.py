@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api import reputation
+
+
+class Command(BaseCommand):
+    help = "Recompute the teacher rating aggregates from the ratings table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        teachers, skills = reputation.rebuild(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt reputation of {teachers} teachers across {skills} skills"
+            )
+        )
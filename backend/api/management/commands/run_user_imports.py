@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import user_import
+
+
+class Command(BaseCommand):
+    help = "Import the user files queued in the admin"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Password hashing processes"
+        )
+        parser.add_argument(
+            "--interval", type=float, default=5.0, help="Seconds to sleep when idle"
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Run the queued imports, then exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            if user_import.run_next(options["workers"]):
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import notifications
+
+
+class Command(BaseCommand):
+    help = "Deliver queued SMS messages from the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--interval", type=float, default=2.0, help="Seconds to sleep when idle"
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain due messages, then exit"
+        )
+        parser.add_argument(
+            "--async",
+            action="store_true",
+            dest="use_async",
+            help="Send each batch's requests concurrently with the async client",
+        )
+
+    def handle(self, *args, **options):
+        if options["use_async"]:
+            return asyncio.run(self.run_async(options))
+        while True:
+            counts = notifications.send_due(options["batch_size"])
+            if any(counts.values()):
+                self.stdout.write(
+                    f"sent {counts['sent']}, retrying {counts['retry']}, "
+                    f"failed {counts['failed']}"
+                )
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
+
+    async def run_async(self, options):
+        while True:
+            counts = await notifications.asend_due(options["batch_size"])
+            if any(counts.values()):
+                self.stdout.write(
+                    f"sent {counts['sent']}, retrying {counts['retry']}, "
+                    f"failed {counts['failed']}"
+                )
+                continue
+            if options["once"]:
+                return
+            await asyncio.sleep(options["interval"])
@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api import db_router
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary into the SQLite replica file, standing in for "
+        "replication when trying the read replica locally"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every", type=float, help="Keep copying, every this many seconds"
+        )
+
+    def handle(self, *args, **options):
+        alias = db_router.config()["ALIAS"]
+        if alias not in connections.settings:
+            raise CommandError(f"No {alias!r} database is configured")
+        primary, replica = connections["default"], connections[alias]
+        if primary.vendor != "sqlite" or replica.vendor != "sqlite":
+            raise CommandError("Only SQLite replicas are synced by this command")
+
+        while True:
+            self.copy(primary, replica.settings_dict["NAME"])
+            self.stdout.write(f"Copied the primary to {replica.settings_dict['NAME']}")
+            if not options["every"]:
+                break
+            time.sleep(options["every"])
+
+    @staticmethod
+    def copy(primary, path):
+        # The backup API copies a consistent snapshot while others write
+        primary.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
@@ -0,0 +1,374 @@
+"""Teacher scoring shared by the matching endpoints."""
+
+import asyncio
+import base64
+import contextvars
+import heapq
+import json
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+
+from . import cache, embeddings, reputation, skill_index
+from .models import CustomUser, Skill, TeacherSkillReputation
+
+PROFICIENCY_SCORES = {"beginner": 0.0, "intermediate": 0.5, "expert": 1.0}
+
+# Teachers of skills at least this similar to the requested one are candidates
+MIN_RELATED_SIMILARITY = 0.6
+RELATED_SKILLS = 20
+
+# How much each normalized signal contributes to a teacher's overall score
+WEIGHTS = {
+    "similarity": 0.6,
+    "proficiency": 0.15,
+    "xp": 0.1,
+    "rating": 0.15,
+}
+
+
+def related_skill_ids(learn_skill):
+    """Ids of ``learn_skill`` and the skills most similar to it."""
+    related = skill_index.get_index().search(
+        embeddings.skill_vector(learn_skill),
+        RELATED_SKILLS,
+        min_score=MIN_RELATED_SIMILARITY,
+    )
+    return {learn_skill.pk} | {skill_id for skill_id, _ in related}
+
+
+def teacher_ids_for(learn_skill):
+    """Users who have ``learn_skill`` or a closely related skill."""
+    return list(
+        CustomUser.objects.filter(skills__in=related_skill_ids(learn_skill))
+        .distinct()
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def _teacher_skill_links(teacher_ids):
+    """Load every skill of ``teacher_ids`` in two queries.
+
+    Returns ``(link_teachers, link_skills, skills)``: two parallel arrays
+    holding, per teacher/skill pair, the row of the teacher in
+    ``teacher_ids`` and the row of the skill in ``skills``.
+    """
+    links = list(
+        CustomUser.skills.through.objects.filter(
+            customuser_id__in=teacher_ids
+        ).values_list("customuser_id", "skill_id")
+    )
+    skills = list(
+        Skill.objects.filter(pk__in={skill_id for _, skill_id in links}).only(
+            "pk", "name", "embedding"
+        )
+    )
+    skill_rows = {skill.pk: row for row, skill in enumerate(skills)}
+    teacher_rows = {teacher_id: row for row, teacher_id in enumerate(teacher_ids)}
+    link_teachers = np.array(
+        [teacher_rows[teacher_id] for teacher_id, _ in links], dtype=np.intp
+    )
+    link_skills = np.array(
+        [skill_rows[skill_id] for _, skill_id in links], dtype=np.intp
+    )
+    return link_teachers, link_skills, skills
+
+
+def _best_by_teacher(size, link_teachers, link_skills, skills, scores):
+    """Reduce per-skill ``scores`` to the best skill of each teacher row."""
+    best_scores = np.zeros(size, dtype=embeddings.DTYPE)
+    best_skills = [None] * size
+    if not len(link_teachers):
+        return best_scores, best_skills
+
+    link_scores = scores[link_skills]
+    # Group links by teacher with the best score first, keep each group's head
+    order = np.lexsort((-link_scores, link_teachers))
+    grouped = link_teachers[order]
+    heads = order[np.r_[True, grouped[1:] != grouped[:-1]]]
+
+    best_scores[link_teachers[heads]] = link_scores[heads]
+    for head in heads:
+        best_skills[link_teachers[head]] = skills[link_skills[head]].name
+    return best_scores, best_skills
+
+
+def similarity_by_teacher(learn_skill, teacher_ids):
+    """Best similarity between ``learn_skill`` and any skill of each teacher.
+
+    Returns ``(scores, skill_names)`` aligned with ``teacher_ids``, where
+    ``skill_names`` holds the teacher skill that scored best. All skills of
+    all candidates are scored with one matrix product.
+    """
+    link_teachers, link_skills, skills = _teacher_skill_links(teacher_ids)
+    scores = embeddings.cosine_scores(
+        embeddings.skill_vector(learn_skill), embeddings.embedding_matrix(skills)
+    )
+    return _best_by_teacher(
+        len(teacher_ids), link_teachers, link_skills, skills, scores
+    )
+
+
+def _reputation(teacher):
+    if teacher.reputation_score is None:
+        return reputation.PRIOR_MEAN
+    return teacher.reputation_score
+
+
+def best_matches(learn_skills, learner_ids=None):
+    """Find the best teacher for each of ``learn_skills``.
+
+    This is the ranking behind ``find_match``, batched: candidates, their
+    skills and their profiles are loaded once for all requests, and every
+    request is scored against every candidate skill in one matrix product.
+    ``learner_ids``, if given, is aligned with ``learn_skills`` and keeps
+    each learner from being matched with themselves.
+
+    Yields ``(learn_skill, match, message)``; ``match`` is ``None`` and
+    ``message`` explains why when no teacher qualifies.
+    """
+    learn_skills = list(learn_skills)
+    learner_ids = learner_ids or [None] * len(learn_skills)
+
+    related = [related_skill_ids(skill) for skill in learn_skills]
+    teachers_by_skill = defaultdict(set)
+    for teacher_id, skill_id in CustomUser.skills.through.objects.filter(
+        skill_id__in=set().union(*related)
+    ).values_list("customuser_id", "skill_id"):
+        teachers_by_skill[skill_id].add(teacher_id)
+    candidates = [
+        set().union(*(teachers_by_skill[skill_id] for skill_id in skill_ids))
+        - {learner_id}
+        for skill_ids, learner_id in zip(related, learner_ids)
+    ]
+
+    teacher_ids = sorted(set().union(*candidates))
+    teacher_rows = {teacher_id: row for row, teacher_id in enumerate(teacher_ids)}
+    teachers = (
+        CustomUser.objects.only("pk", "fullName", "email", "proficiency")
+        .annotate(reputation_score=F("reputation__bayesian_score"))
+        .in_bulk(teacher_ids)
+    )
+    link_teachers, link_skills, skills = _teacher_skill_links(teacher_ids)
+    if skills:
+        scores = embeddings.embedding_matrix(learn_skills) @ (
+            embeddings.embedding_matrix(skills).T
+        )
+
+    for query, learn_skill in enumerate(learn_skills):
+        if not candidates[query]:
+            yield learn_skill, None, "No users found with this skill"
+            continue
+
+        rows = np.array(sorted(teacher_rows[t] for t in candidates[query]))
+        mask = np.isin(link_teachers, rows)
+        best_scores, best_skills = _best_by_teacher(
+            len(teacher_ids),
+            link_teachers[mask],
+            link_skills[mask],
+            skills,
+            scores[query],
+        )
+        # Equally similar teachers are told apart by their rating
+        similarity = best_scores[rows]
+        best_row = max(
+            rows[similarity == similarity.max()],
+            key=lambda row: _reputation(teachers[teacher_ids[row]]),
+        )
+        highest_similarity = float(best_scores[best_row])
+        if highest_similarity <= 0:
+            yield learn_skill, None, "No suitable match found"
+            continue
+
+        teacher = teachers[teacher_ids[best_row]]
+        yield learn_skill, {
+            "id": teacher.id,
+            "name": teacher.fullName or teacher.email,
+            "teaches": best_skills[best_row],
+            "proficiency": teacher.proficiency,
+            "similarity_score": round(highest_similarity, 2),
+        }, None
+
+
+def score_teachers(learn_skill, teacher_ids, xp_max=None):
+    """Blend similarity, proficiency, XP and Bayesian rating per teacher.
+
+    Returns ``(teachers, totals, breakdown)`` where ``teachers`` is a list of
+    value dicts aligned with ``teacher_ids`` (with the best-matching skill
+    under ``"teaches"``) and ``breakdown`` maps each signal name to its
+    normalized per-teacher array. XP is relative to ``xp_max``, by default
+    the highest XP among ``teacher_ids``.
+    """
+    rows = {
+        row["pk"]: row
+        for row in CustomUser.objects.filter(pk__in=teacher_ids).values(
+            "pk",
+            "fullName",
+            "email",
+            "proficiency",
+            "xp_points",
+            reputation_score=F("reputation__bayesian_score"),
+        )
+    }
+    # Prefer how a teacher is rated for this very skill, when they have been
+    skill_scores = dict(
+        TeacherSkillReputation.objects.filter(
+            skill=learn_skill, teacher_id__in=teacher_ids
+        ).values_list("teacher_id", "bayesian_score")
+    )
+    teachers = [rows[teacher_id] for teacher_id in teacher_ids]
+    similarity, teaches = similarity_by_teacher(learn_skill, teacher_ids)
+    for teacher, skill_name in zip(teachers, teaches):
+        teacher["teaches"] = skill_name
+
+    xp = np.array([t["xp_points"] for t in teachers], dtype=np.float64)
+    if xp_max is None:
+        xp_max = xp.max()
+    breakdown = {
+        "similarity": similarity.astype(np.float64),
+        "proficiency": np.array(
+            [PROFICIENCY_SCORES.get(t["proficiency"], 0.0) for t in teachers]
+        ),
+        "xp": np.clip(xp / xp_max, 0.0, 1.0) if xp_max > 0 else np.zeros_like(xp),
+        "rating": np.array(
+            [
+                skill_scores.get(
+                    t["pk"], t["reputation_score"] or reputation.PRIOR_MEAN
+                )
+                / 5.0
+                for t in teachers
+            ]
+        ),
+    }
+    totals = sum(WEIGHTS[name] * values for name, values in breakdown.items())
+    return teachers, totals, breakdown
+
+
+def encode_cursor(score, teacher_id):
+    raw = json.dumps([score, teacher_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Return the ``(score, teacher_id)`` a page ended on, or raise ValueError."""
+    try:
+        score, teacher_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), int(teacher_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+# Upper bound on how long a ranking can outlive ratings and XP, which don't
+# bump the "matches" version
+RANKING_CACHE_TIMEOUT = 60
+
+
+def ranking(learn_skill):
+    """Every candidate teacher for ``learn_skill`` with their total score.
+
+    Returns ``(teacher_ids, scores, xp_max)``: two aligned arrays, in no
+    particular order, and the highest XP among the candidates. Teachers are
+    scored once per version of the ``"matches"`` cache namespace, and only
+    these arrays are cached; ``rank_teachers`` cuts every page from them.
+    """
+
+    def compute():
+        teacher_ids = teacher_ids_for(learn_skill)
+        if not teacher_ids:
+            return np.array([], dtype=np.int64), np.array([]), 0
+        teachers, totals, _ = score_teachers(learn_skill, teacher_ids)
+        xp_max = max(teacher["xp_points"] for teacher in teachers)
+        return np.array(teacher_ids, dtype=np.int64), totals, xp_max
+
+    return cache.get_or_set(
+        "matches", ("ranking", learn_skill.pk), compute, RANKING_CACHE_TIMEOUT
+    )
+
+
+def rank_teachers(learn_skill, limit, cursor=None):
+    """Return one page of teachers for ``learn_skill``, best first.
+
+    Teachers are ordered by total score, then id. The page is the ``limit``
+    best of the cached ``ranking`` after ``cursor``, and only its teachers
+    are loaded for the response. Returns ``(results, next_cursor)``.
+    """
+    teacher_ids, scores, xp_max = ranking(learn_skill)
+    if cursor is not None:
+        score, teacher_id = cursor
+        after = (scores < score) | ((scores == score) & (teacher_ids > teacher_id))
+        teacher_ids, scores = teacher_ids[after], scores[after]
+
+    # One extra row tells whether another page follows
+    page = heapq.nlargest(
+        limit + 1,
+        zip(scores.tolist(), teacher_ids.tolist()),
+        key=lambda entry: (entry[0], -entry[1]),
+    )
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(*page[-1])
+    return _page_results(learn_skill, page, xp_max), next_cursor
+
+
+def _page_results(learn_skill, page, xp_max):
+    """Result dicts, with the score breakdown, for ``(score, teacher_id)`` rows."""
+    if not page:
+        return []
+    teachers, _, breakdown = score_teachers(
+        learn_skill, [teacher_id for _, teacher_id in page], xp_max
+    )
+    return [
+        {
+            "id": teacher["pk"],
+            "name": teacher["fullName"] or teacher["email"],
+            "teaches": teacher["teaches"],
+            "proficiency": teacher["proficiency"],
+            "score": round(score, 4),
+            "breakdown": {
+                name: round(float(values[row]), 4) for name, values in breakdown.items()
+            },
+        }
+        for row, ((score, _), teacher) in enumerate(zip(page, teachers))
+    ]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """Thread pool for matching work started from async views.
+
+    spaCy and numpy release the GIL for most of their work, so a few threads
+    keep CPU-bound matching from stalling the event loop.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.MATCH_WORKERS, thread_name_prefix="matching"
+            )
+        return _executor
+
+
+def _run_closing(func, args):
+    try:
+        return func(*args)
+    finally:
+        # Pool threads live outside the request cycle that recycles connections
+        close_old_connections()
+
+
+async def run_in_executor(func, *args):
+    """Await ``func(*args)`` run in the matching thread pool."""
+    loop = asyncio.get_running_loop()
+    # Carry the request's context (and so its timings) into the pool thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor(), context.run, _run_closing, func, args)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_remove_customuser_badges_skill_teachers_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="skill",
+            name="embedding",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
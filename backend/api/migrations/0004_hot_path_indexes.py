@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:14
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_skill_embedding"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="rating",
+            index=models.Index(
+                fields=["teacher", "rating"], name="rating_teacher_rating_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["user", "rating"], name="review_user_rating_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="scheduledsession",
+            index=models.Index(
+                fields=["user", "-scheduled_date"], name="session_user_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="scheduledsession",
+            index=models.Index(
+                fields=["teach_skill", "-scheduled_date"], name="session_teach_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="scheduledsession",
+            index=models.Index(
+                fields=["is_completed", "is_rated", "-scheduled_date"],
+                name="session_status_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="scheduledsession",
+            index=models.Index(
+                condition=models.Q(("is_completed", True), ("is_rated", False)),
+                fields=["-scheduled_date"],
+                name="session_unrated_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="skill",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="skill_name_lower_idx",
+            ),
+        ),
+    ]
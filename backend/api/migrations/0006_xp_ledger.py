@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_sms_outbox"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="XPTransaction",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("amount", models.PositiveIntegerField()),
+                ("idempotency_key", models.CharField(max_length=64)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="customuser",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("xp_points__gte", 0)), name="user_xp_points_gte_0"
+            ),
+        ),
+        migrations.AddField(
+            model_name="xptransaction",
+            name="recipient",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="xp_received",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="xptransaction",
+            name="sender",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="xp_sent",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="xptransaction",
+            index=models.Index(fields=["sender", "-id"], name="xp_txn_sender_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="xptransaction",
+            index=models.Index(
+                fields=["recipient", "-id"], name="xp_txn_recipient_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="xptransaction",
+            constraint=models.UniqueConstraint(
+                fields=("sender", "idempotency_key"), name="xp_txn_idempotency_key"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="xptransaction",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("amount__gt", 0)), name="xp_txn_amount_gt_0"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="xptransaction",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("sender", models.F("recipient")), _negated=True),
+                name="xp_txn_not_to_self",
+            ),
+        ),
+    ]
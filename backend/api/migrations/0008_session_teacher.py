@@ -0,0 +1,136 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill(apps, schema_editor):
+    """Give existing sessions the teacher user_sessions used to infer, the
+    skill's lowest-id teacher, and list them for both participants."""
+    ScheduledSession = apps.get_model("api", "ScheduledSession")
+    SessionParticipant = apps.get_model("api", "SessionParticipant")
+    SkillTeacher = apps.get_model("api", "Skill").teachers.through
+
+    ScheduledSession.objects.filter(teacher__isnull=True).update(
+        teacher_id=Subquery(
+            SkillTeacher.objects.filter(skill_id=OuterRef("teach_skill_id"))
+            .order_by("customuser_id")
+            .values("customuser_id")[:1]
+        )
+    )
+
+    sessions = ScheduledSession.objects.values_list(
+        "pk", "user_id", "teacher_id", "scheduled_date"
+    )
+    batch = []
+    for session_id, user_id, teacher_id, scheduled_date in sessions.iterator(
+        chunk_size=2000
+    ):
+        batch.append(
+            SessionParticipant(
+                session_id=session_id,
+                participant_id=user_id,
+                is_teacher=False,
+                counterpart_id=teacher_id,
+                scheduled_date=scheduled_date,
+            )
+        )
+        if teacher_id is not None:
+            batch.append(
+                SessionParticipant(
+                    session_id=session_id,
+                    participant_id=teacher_id,
+                    is_teacher=True,
+                    counterpart_id=user_id,
+                    scheduled_date=scheduled_date,
+                )
+            )
+        if len(batch) >= 2000:
+            SessionParticipant.objects.bulk_create(batch)
+            batch = []
+    SessionParticipant.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_teacher_reputation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scheduledsession",
+            name="teacher",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="taught_sessions",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.CreateModel(
+            name="SessionParticipant",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("is_teacher", models.BooleanField()),
+                ("scheduled_date", models.DateTimeField()),
+                (
+                    "counterpart",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "participant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="session_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "session",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="participants",
+                        to="api.scheduledsession",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=[
+                            "participant",
+                            "-scheduled_date",
+                            "-session",
+                            "is_teacher",
+                            "counterpart",
+                        ],
+                        name="participant_date_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("session", "is_teacher"),
+                        name="session_participant_role",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:38
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill(apps, schema_editor):
+    """Existing sessions get the default length of one hour."""
+    ScheduledSession = apps.get_model("api", "ScheduledSession")
+    SessionParticipant = apps.get_model("api", "SessionParticipant")
+
+    ScheduledSession.objects.filter(end_date__isnull=True).update(
+        end_date=F("scheduled_date") + timedelta(hours=1)
+    )
+    SessionParticipant.objects.update(
+        end_date=Subquery(
+            ScheduledSession.objects.filter(pk=OuterRef("session_id")).values(
+                "end_date"
+            )[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_session_teacher"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="sessionparticipant",
+            name="participant_date_idx",
+        ),
+        migrations.AddField(
+            model_name="scheduledsession",
+            name="end_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="sessionparticipant",
+            name="end_date",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="scheduledsession",
+            name="end_date",
+            field=models.DateTimeField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name="sessionparticipant",
+            name="end_date",
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name="sessionparticipant",
+            index=models.Index(
+                fields=[
+                    "participant",
+                    "-scheduled_date",
+                    "-session",
+                    "is_teacher",
+                    "counterpart",
+                    "end_date",
+                ],
+                name="participant_date_idx",
+            ),
+        ),
+    ]
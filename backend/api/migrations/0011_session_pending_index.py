@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_user_import"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="scheduledsession",
+            name="session_user_date_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="scheduledsession",
+            name="session_status_date_idx",
+        ),
+        migrations.AddIndex(
+            model_name="scheduledsession",
+            index=models.Index(
+                condition=models.Q(("is_completed", False), ("is_rated", False)),
+                fields=["-scheduled_date"],
+                name="session_pending_idx",
+            ),
+        ),
+    ]
@@ -1,5 +1,12 @@
+from datetime import timedelta
+
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
+from django.db.models.functions import Lower
+
+from . import embeddings
 
 
 class CustomUser(AbstractUser):
@@ -33,10 +40,28 @@ class CustomUser(AbstractUser):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(xp_points__gte=0), name="user_xp_points_gte_0"
+            )
+        ]
+
     def __str__(self):
         return self.email
 
 
+class SkillQuerySet(models.QuerySet):
+    def named(self, *names):
+        """Skills whose name matches any of ``names``, ignoring case.
+
+        Compares ``LOWER(name)`` so the lookup can use ``skill_name_lower_idx``.
+        """
+        return self.alias(lower_name=Lower("name")).filter(
+            lower_name__in=[name.lower() for name in names]
+        )
+
+
 class Skill(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
@@ -44,6 +69,31 @@ class Skill(models.Model):
         CustomUser, related_name="skills_teaching", blank=True
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Normalized float32 spaCy vector of `name`, see api.embeddings
+    embedding = models.BinaryField(null=True, blank=True, editable=False)
+
+    objects = SkillQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(Lower("name"), name="skill_name_lower_idx")]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._embedded_name = instance.__dict__.get("name")
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Only re-embed when the skill is new or has been renamed
+        if not self.embedding or self.name != getattr(
+            self, "_embedded_name", self.name
+        ):
+            self.embedding = embeddings.encode(self.name)
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "embedding" not in update_fields:
+                kwargs["update_fields"] = [*update_fields, "embedding"]
+        super().save(*args, **kwargs)
+        self._embedded_name = self.name
 
     def __str__(self):
         return self.name
@@ -63,14 +113,158 @@ class ScheduledSession(models.Model):
     learn_skill = models.ForeignKey(
         Skill, related_name="learning_sessions", on_delete=models.CASCADE
     )
+    teacher = models.ForeignKey(
+        CustomUser,
+        related_name="taught_sessions",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    # When the session starts and ends
     scheduled_date = models.DateTimeField()
+    end_date = models.DateTimeField(blank=True)
     is_completed = models.BooleanField(default=False)
     is_rated = models.BooleanField(default=False)
 
+    DEFAULT_LENGTH = timedelta(hours=1)
+    # Bounds how far back an overlapping session can start, see api.scheduling
+    MAX_LENGTH = timedelta(hours=8)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["teach_skill", "-scheduled_date"],
+                name="session_teach_date_idx",
+            ),
+            # Admin changelist filtered to sessions still to take place
+            models.Index(
+                fields=["-scheduled_date"],
+                condition=models.Q(is_completed=False, is_rated=False),
+                name="session_pending_idx",
+            ),
+            # Completed sessions still waiting for a rating
+            models.Index(
+                fields=["-scheduled_date"],
+                condition=models.Q(is_completed=True, is_rated=False),
+                name="session_unrated_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        session = super().from_db(db, field_names, values)
+        session._remember_times()
+        return session
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._remember_times()
+
+    def _remember_times(self):
+        # Deferred fields aren't in __dict__ and stay unknown
+        self._loaded_times = (
+            self.__dict__.get("scheduled_date"),
+            self.__dict__.get("end_date"),
+        )
+
+    def fill_end_date(self):
+        """Default the end to ``DEFAULT_LENGTH`` after the start, and move it
+        with the start when a loaded session is rescheduled without a new end."""
+        if self.end_date is None:
+            self.end_date = self.scheduled_date + self.DEFAULT_LENGTH
+            return
+        loaded_start, loaded_end = getattr(self, "_loaded_times", (None, None))
+        if (
+            loaded_start is not None
+            and loaded_end is not None
+            and self.scheduled_date != loaded_start
+            and self.end_date == loaded_end
+        ):
+            self.end_date = self.scheduled_date + (loaded_end - loaded_start)
+
+    def length_error(self):
+        """Why the session's times are invalid, or None."""
+        if self.end_date <= self.scheduled_date:
+            return "A session must end after it starts"
+        if self.end_date - self.scheduled_date > self.MAX_LENGTH:
+            return f"A session can't be longer than {self.MAX_LENGTH}"
+        return None
+
+    def clean(self):
+        super().clean()
+        if self.scheduled_date is None:
+            return
+        self.fill_end_date()
+        error = self.length_error()
+        if error:
+            raise ValidationError({"end_date": error})
+
+    def save(self, *args, **kwargs):
+        self.fill_end_date()
+        # api.scheduling relies on MAX_LENGTH holding for every row
+        error = self.length_error()
+        if error:
+            raise ValueError(error)
+        super().save(*args, **kwargs)
+        self._remember_times()
+
     def __str__(self):
         return f"{self.user.username} teaches {self.teach_skill} and learns {self.learn_skill}"
 
 
+class SessionParticipant(models.Model):
+    """A session as listed for one of its participants.
+
+    Every session has a row for its learner and, once it has one, its
+    teacher, kept in sync by ``api.signals``. Together with the times and
+    the counterpart copied from the session, this lets ``user_sessions``
+    and the scheduling checks read a user's sessions off one index instead
+    of OR-ing two.
+    """
+
+    session = models.ForeignKey(
+        ScheduledSession, on_delete=models.CASCADE, related_name="participants"
+    )
+    participant = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="session_entries"
+    )
+    is_teacher = models.BooleanField()
+    counterpart = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+",
+    )
+    scheduled_date = models.DateTimeField()
+    end_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session", "is_teacher"], name="session_participant_role"
+            )
+        ]
+        indexes = [
+            # Covers the listing (filter, order, role and counterpart) and
+            # the overlap checks of api.scheduling (start and end)
+            models.Index(
+                fields=[
+                    "participant",
+                    "-scheduled_date",
+                    "-session",
+                    "is_teacher",
+                    "counterpart",
+                    "end_date",
+                ],
+                name="participant_date_idx",
+            )
+        ]
+
+    def __str__(self):
+        role = "teaches" if self.is_teacher else "learns in"
+        return f"{self.participant} {role} session {self.session_id}"
+
+
 class Badge(models.Model):
     name = models.CharField(max_length=100)
     image = models.ImageField(upload_to="badges/")
@@ -90,6 +284,12 @@ class Review(models.Model):
     comment = models.TextField()
     rating = models.IntegerField()
 
+    class Meta:
+        # Per-user review aggregates read only the index
+        indexes = [
+            models.Index(fields=["user", "rating"], name="review_user_rating_idx")
+        ]
+
     def __str__(self):
         return f"Review by {self.reviewer} for {self.user}"
 
@@ -110,5 +310,159 @@ class Rating(models.Model):
     feedback = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Per-teacher rating aggregates read only the index
+        indexes = [
+            models.Index(fields=["teacher", "rating"], name="rating_teacher_rating_idx")
+        ]
+
     def __str__(self):
         return f"{self.learner.email} rated {self.teacher.email} {self.rating}"
+
+
+class RatingAggregate(models.Model):
+    """Running totals of ``Rating`` rows, maintained by ``api.reputation``."""
+
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    # The mean shrunk towards a prior, so a few ratings can't dominate
+    bayesian_score = models.FloatField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class TeacherReputation(RatingAggregate):
+    teacher = models.OneToOneField(
+        CustomUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="reputation",
+    )
+
+    def __str__(self):
+        return f"{self.teacher}: {self.bayesian_score:.2f} ({self.rating_count})"
+
+
+class TeacherSkillReputation(RatingAggregate):
+    teacher = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="skill_reputations"
+    )
+    skill = models.ForeignKey(
+        Skill, on_delete=models.CASCADE, related_name="teacher_reputations"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["skill", "teacher"], name="teacher_skill_reputation_unique"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.teacher} teaching {self.skill}: {self.bayesian_score:.2f}"
+
+
+class XPTransaction(models.Model):
+    """One XP transfer in the append-only ledger kept by ``api.xp``.
+
+    Rows are only ever inserted, in the same transaction that moves the XP
+    between the two users' ``xp_points`` balances.
+    """
+
+    sender = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="xp_sent"
+    )
+    recipient = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="xp_received"
+    )
+    amount = models.PositiveIntegerField()
+    # Client-chosen; retrying a transfer with the same key is a no-op
+    idempotency_key = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sender", "idempotency_key"], name="xp_txn_idempotency_key"
+            ),
+            models.CheckConstraint(
+                condition=models.Q(amount__gt=0), name="xp_txn_amount_gt_0"
+            ),
+            models.CheckConstraint(
+                condition=~models.Q(sender=models.F("recipient")),
+                name="xp_txn_not_to_self",
+            ),
+        ]
+        indexes = [
+            # A user's ledger history, newest first
+            models.Index(fields=["sender", "-id"], name="xp_txn_sender_idx"),
+            models.Index(fields=["recipient", "-id"], name="xp_txn_recipient_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("XP transactions can't be changed once recorded")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.sender} sent {self.amount} XP to {self.recipient}"
+
+
+class SmsOutbox(models.Model):
+    """An SMS waiting to be delivered by the ``send_sms_outbox`` worker."""
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUSES = [(PENDING, "Pending"), (SENT, "Sent"), (FAILED, "Failed")]
+
+    phone_number = models.CharField(max_length=32)
+    message = models.CharField(max_length=160)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's poll: due messages that still need sending
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="sms_outbox_due_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"SMS to {self.phone_number} ({self.status})"
+
+
+class UserImport(models.Model):
+    """A user file uploaded in the admin, imported by the ``run_user_imports``
+    worker."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    file = models.FileField(upload_to="imports/")
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    imported = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import of {self.file.name} ({self.status})"
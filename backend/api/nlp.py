@@ -0,0 +1,66 @@
+"""Lazy, process-wide access to the spaCy model.
+
+Nothing is loaded at import time, so management commands, migrations and
+tests that never touch matching do not pay for the model. Web servers that
+fork workers can call ``preload()`` in the master process (see
+``backend/wsgi.py``) so every worker shares the same pages copy-on-write.
+"""
+
+import gc
+import threading
+
+from django.conf import settings
+
+# Components of the en_core_web_* pipelines. None of them contribute to
+# Doc.vector for the static-vector models, so vectors-only mode skips them.
+PIPELINE_COMPONENTS = [
+    "tok2vec",
+    "tagger",
+    "parser",
+    "senter",
+    "attribute_ruler",
+    "lemmatizer",
+    "ner",
+]
+
+_lock = threading.Lock()
+_nlp = None
+
+
+def get_nlp():
+    global _nlp
+    if _nlp is None:
+        with _lock:
+            if _nlp is None:
+                _nlp = _load()
+    return _nlp
+
+
+def _load():
+    import spacy
+
+    if settings.SPACY_VECTORS_ONLY:
+        return spacy.load(settings.SPACY_MODEL, exclude=PIPELINE_COMPONENTS)
+    return spacy.load(settings.SPACY_MODEL)
+
+
+def is_loaded():
+    return _nlp is not None
+
+
+def preload():
+    """Load the model now and move it out of the garbage collector's reach.
+
+    Freezing keeps the collector from touching (and so copying) the model's
+    objects in forked workers.
+    """
+    get_nlp()
+    gc.freeze()
+
+
+def vectorize(text):
+    """Return the document vector of ``text``."""
+    nlp = get_nlp()
+    if settings.SPACY_VECTORS_ONLY:
+        return nlp.make_doc(text).vector
+    return nlp(text).vector
@@ -0,0 +1,231 @@
+"""Durable, asynchronous SMS delivery through the ``SmsOutbox`` table.
+
+Views only insert a row (``queue_sms``); the ``send_sms_outbox`` worker
+claims due rows in batches, sends them through Africa's Talking with the
+shared ``api.http_client`` client and retries failures with exponential
+backoff. Messages with identical text are sent in one request to all
+recipients. ``asend_due`` does the same with the async client, sending
+every group of a batch concurrently.
+
+Numbers go to the provider in E.164 (``+254...``), which is also how it
+reports them back, whatever format they were queued in.
+"""
+
+import asyncio
+import logging
+import random
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import http_client
+from .models import SmsOutbox
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+# How long a claimed batch is hidden from other workers
+LEASE = timedelta(minutes=5)
+# Africa's Talking per-recipient status codes meaning the SMS was accepted
+ACCEPTED_STATUS_CODES = {100, 101, 102}
+
+
+def queue_sms(phone_number, message):
+    return SmsOutbox.objects.create(phone_number=phone_number, message=message[:160])
+
+
+async def aqueue_sms(phone_number, message):
+    return await SmsOutbox.objects.acreate(
+        phone_number=phone_number, message=message[:160]
+    )
+
+
+def claim_due(batch_size):
+    """Lease up to ``batch_size`` due messages to this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            SmsOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=SmsOutbox.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        SmsOutbox.objects.filter(pk__in=[sms.pk for sms in due]).update(
+            next_attempt_at=now + LEASE
+        )
+    return due
+
+
+def e164(phone_number):
+    """``phone_number`` as ``+<country code><number>``.
+
+    Numbers without a country code (``0712 345678``, ``712345678``) get
+    ``settings.SMS_DEFAULT_COUNTRY_CODE``.
+    """
+    digits = re.sub(r"\D", "", phone_number)
+    if not digits:
+        return phone_number
+    country_code = settings.SMS_DEFAULT_COUNTRY_CODE
+    if phone_number.strip().startswith("+"):
+        return f"+{digits}"
+    if digits.startswith("00"):
+        return f"+{digits[2:]}"
+    if digits.startswith("0"):
+        return f"+{country_code}{digits[1:]}"
+    if digits.startswith(country_code):
+        return f"+{digits}"
+    return f"+{country_code}{digits}"
+
+
+def _request(message, phone_numbers):
+    return {
+        "data": {
+            "username": settings.AFRICASTALKING_USERNAME,
+            "to": ",".join(dict.fromkeys(map(e164, phone_numbers))),
+            "message": message,
+        },
+        "headers": {
+            "apiKey": settings.AFRICASTALKING_API_KEY or "",
+            "Accept": "application/json",
+        },
+    }
+
+
+def _errors(response, phone_numbers):
+    if response.status_code != 201:
+        error = f"SMS provider error {response.status_code}: {response.text[:200]}"
+        return dict.fromkeys(phone_numbers, error)
+
+    try:
+        statuses = {
+            e164(recipient["number"]): (
+                None
+                if recipient.get("statusCode") in ACCEPTED_STATUS_CODES
+                else recipient.get("status") or "Rejected"
+            )
+            for recipient in response.json()["SMSMessageData"]["Recipients"]
+        }
+    except (ValueError, KeyError, TypeError, AttributeError):
+        # The request was accepted, retrying it could send every SMS twice
+        logger.warning(
+            "Unreadable reply from the SMS provider, counting %s as sent: %s",
+            ", ".join(phone_numbers),
+            response.text[:200],
+        )
+        return dict.fromkeys(phone_numbers)
+
+    # Only numbers the provider lists as accepted count as sent; the rest
+    # are retried like any other failure
+    return {
+        number: statuses.get(e164(number), "SMS provider did not confirm delivery")
+        for number in phone_numbers
+    }
+
+
+def deliver(message, phone_numbers):
+    """Send one message to several numbers in a single provider request.
+
+    Returns a dict of phone number to error message (``None`` if accepted).
+    """
+    response = http_client.get_client("africastalking").post(
+        settings.AFRICASTALKING_SMS_URL, **_request(message, phone_numbers)
+    )
+    return _errors(response, phone_numbers)
+
+
+async def adeliver(message, phone_numbers):
+    """Async ``deliver``."""
+    response = await http_client.get_async_client("africastalking").post(
+        settings.AFRICASTALKING_SMS_URL, **_request(message, phone_numbers)
+    )
+    return _errors(response, phone_numbers)
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def _group(batch):
+    by_message = defaultdict(list)
+    for sms in batch:
+        by_message[sms.message].append(sms)
+    return by_message
+
+
+def _apply(batch, results):
+    """Record delivery ``results`` (group, errors) on ``batch`` and save it.
+
+    ``errors`` is ``None`` for a group the open circuit breaker kept from the
+    provider: it is queued again for when the breaker lets a trial through,
+    without using up an attempt.
+    """
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+    now = timezone.now()
+    for group, errors in results:
+        for sms in group:
+            if errors is None:
+                sms.next_attempt_at = now + timedelta(
+                    seconds=http_client.config()["BREAKER_RESET"]
+                )
+                sms.last_error = "Circuit breaker is open"
+                counts["retry"] += 1
+                continue
+            error = errors.get(sms.phone_number)
+            sms.attempts += 1
+            if error is None:
+                sms.status, sms.sent_at, sms.last_error = SmsOutbox.SENT, now, ""
+                counts["sent"] += 1
+            elif sms.attempts >= MAX_ATTEMPTS:
+                sms.status, sms.last_error = SmsOutbox.FAILED, error
+                counts["failed"] += 1
+                logger.error("Giving up on SMS %s: %s", sms.pk, error)
+            else:
+                sms.next_attempt_at = now + backoff(sms.attempts)
+                sms.last_error = error
+                counts["retry"] += 1
+
+    SmsOutbox.objects.bulk_update(
+        batch, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+    )
+    return counts
+
+
+def send_due(batch_size=100):
+    """Send one batch of due messages; return ``{"sent", "retry", "failed"}``."""
+    batch = claim_due(batch_size)
+    results = []
+    for message, group in _group(batch).items():
+        try:
+            errors = deliver(message, [sms.phone_number for sms in group])
+        except http_client.CircuitOpenError:
+            errors = None
+        except requests.RequestException as e:
+            errors = {sms.phone_number: str(e) for sms in group}
+        results.append((group, errors))
+    return _apply(batch, results)
+
+
+async def _adeliver_group(message, group):
+    try:
+        return group, await adeliver(message, [sms.phone_number for sms in group])
+    except http_client.CircuitOpenError:
+        return group, None
+    except requests.RequestException as e:
+        return group, {sms.phone_number: str(e) for sms in group}
+
+
+async def asend_due(batch_size=100):
+    """Like ``send_due``, but with every message group in flight at once."""
+    batch = await sync_to_async(claim_due)(batch_size)
+    results = await asyncio.gather(
+        *(_adeliver_group(message, group) for message, group in _group(batch).items())
+    )
+    return await sync_to_async(_apply)(batch, results)
@@ -0,0 +1,75 @@
+"""Loading and caching of the user profile page."""
+
+from django.db.models import Avg, Count, Prefetch
+
+from . import cache
+from .models import CustomUser, Review, Skill
+from .serializers import UserProfileSerializer
+
+PROFILE_CACHE_TIMEOUT = 300
+
+
+def profile_queryset(user_id):
+    """The user with everything ``UserProfileSerializer`` reads.
+
+    Always five queries: the user with its review aggregates and teacher
+    reputation, then skills, the skills' teachers, badges and reviews.
+    """
+    return (
+        CustomUser.objects.filter(pk=user_id)
+        .select_related("reputation")
+        .annotate(
+            review_count=Count("reviews"),
+            average_rating=Avg("reviews__rating"),
+        )
+        .prefetch_related(
+            Prefetch(
+                "skills",
+                queryset=Skill.objects.defer("embedding").prefetch_related("teachers"),
+            ),
+            "badges",
+            Prefetch(
+                "reviews",
+                queryset=Review.objects.only(
+                    "pk", "user", "reviewer", "comment", "rating"
+                ),
+            ),
+        )
+    )
+
+
+def load_profile(user_id):
+    return profile_queryset(user_id).get()
+
+
+def profile_namespace(user_id):
+    return f"profile:{user_id}"
+
+
+def get_profile(user_id):
+    """Return the serialized profile of ``user_id``, cached per user.
+
+    The snapshot is invalidated by the signals in ``api.signals`` whenever
+    the user or one of their skills, badges or reviews changes.
+    """
+    return cache.get_or_set(
+        profile_namespace(user_id),
+        (cache.get_version("skills"), cache.get_version("badges")),
+        lambda: UserProfileSerializer(load_profile(user_id)).data,
+        PROFILE_CACHE_TIMEOUT,
+    )
+
+
+async def aget_profile(user_id):
+    """Async ``get_profile``, loading through the async ORM on a miss."""
+
+    async def serialize():
+        user = await profile_queryset(user_id).aget()
+        return UserProfileSerializer(user).data
+
+    return await cache.aget_or_set(
+        profile_namespace(user_id),
+        (await cache.aget_version("skills"), await cache.aget_version("badges")),
+        serialize,
+        PROFILE_CACHE_TIMEOUT,
+    )
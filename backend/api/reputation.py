@@ -0,0 +1,105 @@
+"""Per-teacher rating aggregates kept next to the ``Rating`` history.
+
+``record_rating`` folds one new rating into the teacher's
+``TeacherReputation`` and ``TeacherSkillReputation`` rows with ``F()``
+updates, in the caller's transaction. ``rebuild`` recomputes every row from
+the ratings table.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Cast
+
+from . import signals
+from .models import Rating, TeacherReputation, TeacherSkillReputation
+
+# A teacher with no ratings scores PRIOR_MEAN; each real rating counts
+# 1 / (PRIOR_WEIGHT + n) towards moving away from it.
+PRIOR_MEAN = 3.0
+PRIOR_WEIGHT = 5
+
+
+def bayesian_score(rating_count, rating_sum):
+    return (PRIOR_WEIGHT * PRIOR_MEAN + rating_sum) / (PRIOR_WEIGHT + rating_count)
+
+
+def _increment(queryset, rating):
+    count = F("rating_count") + 1
+    total = Cast(F("rating_sum") + rating, FloatField())
+    queryset.update(
+        rating_count=count,
+        rating_sum=F("rating_sum") + rating,
+        mean=total / count,
+        bayesian_score=(Value(PRIOR_WEIGHT * PRIOR_MEAN) + total)
+        / (Value(PRIOR_WEIGHT) + count),
+    )
+
+
+def record_rating(teacher_id, skill_id, rating):
+    """Add ``rating`` to the aggregates of the teacher and of their skill.
+
+    Must run in the transaction that creates the ``Rating``. Missing rows
+    are inserted first, ignoring a concurrent insert of the same row, so
+    the increments always apply to exactly one row each.
+    """
+    TeacherReputation.objects.bulk_create(
+        [TeacherReputation(teacher_id=teacher_id)], ignore_conflicts=True
+    )
+    TeacherSkillReputation.objects.bulk_create(
+        [TeacherSkillReputation(teacher_id=teacher_id, skill_id=skill_id)],
+        ignore_conflicts=True,
+    )
+    _increment(TeacherReputation.objects.filter(teacher_id=teacher_id), rating)
+    _increment(
+        TeacherSkillReputation.objects.filter(teacher_id=teacher_id, skill_id=skill_id),
+        rating,
+    )
+    signals.bump_profiles([teacher_id])
+
+
+def _aggregates(model, rows, **keys):
+    return model(
+        **keys,
+        rating_count=rows["count"],
+        rating_sum=rows["total"],
+        mean=rows["total"] / rows["count"],
+        bayesian_score=bayesian_score(rows["count"], rows["total"]),
+    )
+
+
+def rebuild(batch_size=1000):
+    """Recompute every aggregate from ``Rating``; returns the row counts."""
+    per_teacher = (
+        Rating.objects.values("teacher_id")
+        .annotate(count=Count("pk"), total=Sum("rating"))
+        .order_by()
+    )
+    per_skill = (
+        Rating.objects.values("teacher_id", "skill_match__teach_skill_id")
+        .annotate(count=Count("pk"), total=Sum("rating"))
+        .order_by()
+    )
+    with transaction.atomic():
+        TeacherReputation.objects.all().delete()
+        TeacherSkillReputation.objects.all().delete()
+        teachers = TeacherReputation.objects.bulk_create(
+            (
+                _aggregates(TeacherReputation, rows, teacher_id=rows["teacher_id"])
+                for rows in per_teacher
+            ),
+            batch_size=batch_size,
+        )
+        skills = TeacherSkillReputation.objects.bulk_create(
+            (
+                _aggregates(
+                    TeacherSkillReputation,
+                    rows,
+                    teacher_id=rows["teacher_id"],
+                    skill_id=rows["skill_match__teach_skill_id"],
+                )
+                for rows in per_skill
+            ),
+            batch_size=batch_size,
+        )
+        signals.bump_profiles(rep.teacher_id for rep in teachers)
+    return len(teachers), len(skills)
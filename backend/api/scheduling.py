@@ -0,0 +1,133 @@
+"""Session overlap checks and teacher availability.
+
+No session is longer than ``ScheduledSession.MAX_LENGTH``, so every session
+overlapping ``[start, end)`` starts within ``(start - MAX_LENGTH, end)``.
+Lookups range-scan ``participant_date_idx`` over that window for each user
+instead of testing every session they have. The busy ranges found are
+merged into an ``IntervalIndex``, a sorted list of disjoint ranges that
+answers overlap and free-slot queries by bisection.
+"""
+
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import CustomUser, ScheduledSession, SessionParticipant
+
+
+class SchedulingConflict(Exception):
+    def __init__(self, conflicts):
+        super().__init__("The session overlaps other sessions")
+        self.conflicts = conflicts
+
+
+class IntervalIndex:
+    """Disjoint, sorted ``[start, end)`` ranges merged from possibly
+    overlapping ones."""
+
+    def __init__(self, intervals=()):
+        self.starts, self.ends = [], []
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start, end):
+        # The first range ending after ``start`` is the only candidate
+        i = bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
+
+    def gaps(self, start, end, min_length=None):
+        """Free ``(start, end)`` ranges within ``[start, end)``."""
+        gaps = []
+        cursor = start
+        first = bisect_right(self.ends, start)
+        for busy_start, busy_end in zip(self.starts[first:], self.ends[first:]):
+            if busy_start >= end:
+                break
+            if busy_start > cursor:
+                gaps.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if cursor < end:
+            gaps.append((cursor, end))
+        if min_length is not None:
+            gaps = [(s, e) for s, e in gaps if e - s >= min_length]
+        return gaps
+
+
+def sessions_between(user_ids, start, end):
+    """``SessionParticipant`` rows of ``user_ids`` overlapping ``[start, end)``."""
+    return SessionParticipant.objects.filter(
+        participant_id__in=user_ids,
+        scheduled_date__gt=start - ScheduledSession.MAX_LENGTH,
+        scheduled_date__lt=end,
+        end_date__gt=start,
+    )
+
+
+def conflicts(user_ids, start, end):
+    """Map each of ``user_ids`` with overlapping sessions to their ids."""
+    found = defaultdict(list)
+    for user_id, session_id in sessions_between(user_ids, start, end).values_list(
+        "participant_id", "session_id"
+    ):
+        found[user_id].append(session_id)
+    return dict(found)
+
+
+def busy(user_ids, start, end):
+    """An ``IntervalIndex`` of busy time within ``[start, end)`` per user."""
+    ranges = defaultdict(list)
+    for user_id, busy_start, busy_end in sessions_between(
+        user_ids, start, end
+    ).values_list("participant_id", "scheduled_date", "end_date"):
+        ranges[user_id].append((busy_start, busy_end))
+    return {user_id: IntervalIndex(ranges[user_id]) for user_id in user_ids}
+
+
+def free_slots(user_ids, start, end, min_length=None):
+    """Free ``(start, end)`` ranges within ``[start, end)`` for every user,
+    from one indexed query for all of them."""
+    return {
+        user_id: index.gaps(start, end, min_length)
+        for user_id, index in busy(user_ids, start, end).items()
+    }
+
+
+def schedule(allow_overlap=False, **fields):
+    """Create a ``ScheduledSession`` unless it overlaps the learner's or the
+    teacher's other sessions.
+
+    Returns ``(session, conflicts)``; with ``allow_overlap`` the session is
+    created anyway and the overlaps are only reported. Otherwise raises
+    ``SchedulingConflict``. Both users are locked in primary key order first,
+    so two concurrent bookings can't both pass the check.
+    """
+    session = ScheduledSession(**fields)
+    session.fill_end_date()
+    error = session.length_error()
+    if error:
+        raise ValueError(error)
+
+    user_ids = sorted({session.user_id, session.teacher_id} - {None})
+    with transaction.atomic():
+        list(
+            CustomUser.objects.select_for_update()
+            .filter(pk__in=user_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        found = conflicts(user_ids, session.scheduled_date, session.end_date)
+        if found and not allow_overlap:
+            raise SchedulingConflict(found)
+        session.save()
+    return session, found
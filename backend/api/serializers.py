@@ -1,6 +1,16 @@
 from rest_framework import serializers
 from django.contrib.auth.hashers import make_password
-from .models import CustomUser, Skill, Badge, Review, ScheduledSession
+from django.db import transaction
+from .models import (
+    CustomUser,
+    Skill,
+    Badge,
+    Review,
+    ScheduledSession,
+    TeacherReputation,
+    XPTransaction,
+)
+from .skills import assign_skills
 import json
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
@@ -45,13 +55,12 @@ class CustomUserSerializer(serializers.ModelSerializer):
         # Hash password
         validated_data["password"] = make_password(validated_data["password"])
 
-        # Create user
-        user = CustomUser.objects.create(**validated_data)
+        with transaction.atomic():
+            # Create user
+            user = CustomUser.objects.create(**validated_data)
 
-        # Add skills
-        for skill_name in skill_names:
-            skill, created = Skill.objects.get_or_create(name=skill_name)
-            user.skills.add(skill)
+            # Add skills
+            assign_skills(user, skill_names)
 
         return user
 
@@ -63,9 +72,16 @@ class CustomUserSerializer(serializers.ModelSerializer):
 
 
 class SkillSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, fields=None, **kwargs):
+        """Optionally restrict the output to the given ``fields``."""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Skill
-        fields = "__all__"
+        exclude = ["embedding"]
 
 
 class BadgeSerializer(serializers.ModelSerializer):
@@ -84,11 +100,22 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ["reviewer", "comment", "rating"]
 
 
+class TeacherReputationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TeacherReputation
+        fields = ["rating_count", "mean", "bayesian_score"]
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     skills = SkillSerializer(many=True, read_only=True)
     badges = BadgeSerializer(many=True, read_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)  # Include the reviews field
     xp_points = serializers.SerializerMethodField()
+    # Annotated by api.profiles.load_profile
+    review_count = serializers.IntegerField(read_only=True)
+    average_rating = serializers.FloatField(read_only=True)
+    # Ratings received as a teacher; null until the first one
+    reputation = TeacherReputationSerializer(read_only=True)
 
     def get_xp_points(self, obj):
         return obj.xp_points
@@ -105,10 +132,22 @@ class UserProfileSerializer(serializers.ModelSerializer):
             "email",
             "badges",
             "reviews",
+            "review_count",
+            "average_rating",
+            "reputation",
             "xp_points",
         ]
 
 
+class XPTransactionSerializer(serializers.ModelSerializer):
+    sender = serializers.CharField(source="sender.username", read_only=True)
+    recipient = serializers.CharField(source="recipient.username", read_only=True)
+
+    class Meta:
+        model = XPTransaction
+        fields = ["id", "sender", "recipient", "amount", "created_at"]
+
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
@@ -137,6 +176,7 @@ class SkillMatchSerializer(serializers.ModelSerializer):
         fields = [
             "id",
             "user",
+            "teacher",
             "teach_skill",
             "learn_skill",
             "scheduled_date",  # Add this field
@@ -0,0 +1,173 @@
+"""Session history of a user, as listed by the ``user_sessions`` endpoint."""
+
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import SessionParticipant
+
+
+def encode_cursor(entry):
+    raw = json.dumps([entry.scheduled_date.isoformat(), entry.session_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Return the ``(scheduled_date, id)`` a page ended on, or raise ValueError."""
+    try:
+        scheduled_date, session_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode())
+        )
+        scheduled_date = parse_datetime(scheduled_date)
+        if scheduled_date is None:
+            raise ValueError
+        return scheduled_date, int(session_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def participant_rows(session):
+    """The ``SessionParticipant`` rows ``session`` should be listed with."""
+    rows = [
+        SessionParticipant(
+            session=session,
+            participant_id=session.user_id,
+            is_teacher=False,
+            counterpart_id=session.teacher_id,
+            scheduled_date=session.scheduled_date,
+            end_date=session.end_date,
+        )
+    ]
+    if session.teacher_id is not None:
+        rows.append(
+            SessionParticipant(
+                session=session,
+                participant_id=session.teacher_id,
+                is_teacher=True,
+                counterpart_id=session.user_id,
+                scheduled_date=session.scheduled_date,
+                end_date=session.end_date,
+            )
+        )
+    return rows
+
+
+def sync_participants(session):
+    """Rewrite the listing rows of ``session`` after it was saved."""
+    SessionParticipant.objects.filter(session=session).delete()
+    SessionParticipant.objects.bulk_create(participant_rows(session))
+
+
+def sessions_for(user):
+    """Listing entries of the sessions ``user`` learns in or teaches, newest first.
+
+    Filtered and ordered by ``participant_date_idx``; the session, its
+    skills and the counterpart are joined on primary keys.
+    """
+    return (
+        SessionParticipant.objects.filter(participant=user)
+        .select_related("session__teach_skill", "session__learn_skill", "counterpart")
+        .only(
+            "session_id",
+            "is_teacher",
+            "scheduled_date",
+            "end_date",
+            "session__is_completed",
+            "session__is_rated",
+            "session__teach_skill__name",
+            "session__learn_skill__name",
+            "counterpart__fullName",
+            "counterpart__email",
+        )
+        .order_by("-scheduled_date", "-session_id")
+    )
+
+
+def _page_query(user, limit, cursor):
+    entries = sessions_for(user)
+    if cursor is not None:
+        scheduled_date, session_id = cursor
+        entries = entries.filter(
+            Q(scheduled_date__lt=scheduled_date)
+            | Q(scheduled_date=scheduled_date, session_id__lt=session_id)
+        )
+    if limit is not None:
+        entries = entries[: limit + 1]
+    return entries
+
+
+def _split_page(entries, limit):
+    """Trim the look-ahead row; return ``(sessions, next_cursor)``."""
+    next_cursor = None
+    if limit is not None and len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1])
+    return [serialize_session(entry) for entry in entries], next_cursor
+
+
+def session_page(user, limit=None, cursor=None):
+    """Serialize one page of ``user``'s sessions in one query.
+
+    Pages are keyset-paginated on ``(scheduled_date, id)``. Returns
+    ``(sessions, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    return _split_page(list(_page_query(user, limit, cursor)), limit)
+
+
+async def asession_page(user, limit=None, cursor=None):
+    """Async ``session_page``."""
+    return _split_page([e async for e in _page_query(user, limit, cursor)], limit)
+
+
+async def asession_count(user):
+    """How many sessions ``user`` learns in or teaches, counted on the index."""
+    return await SessionParticipant.objects.filter(participant=user).acount()
+
+
+def iter_sessions(user, chunk_size=500):
+    """Yield every serialized session of ``user``, a keyset page at a time."""
+    cursor = None
+    while True:
+        page, next_cursor = session_page(user, chunk_size, cursor)
+        yield from page
+        if next_cursor is None:
+            return
+        cursor = decode_cursor(next_cursor)
+
+
+async def aiter_sessions(user, chunk_size=500):
+    """Async ``iter_sessions``."""
+    cursor = None
+    while True:
+        page, next_cursor = await asession_page(user, chunk_size, cursor)
+        for session in page:
+            yield session
+        if next_cursor is None:
+            return
+        cursor = decode_cursor(next_cursor)
+
+
+def serialize_session(entry):
+    session, counterpart = entry.session, entry.counterpart
+    if entry.is_teacher:
+        role, unknown = "teacher", "Unknown Student"
+    else:
+        role, unknown = "student", "Unknown Teacher"
+
+    return {
+        "id": session.id,
+        "teach_skill": session.teach_skill.name,
+        "learn_skill": session.learn_skill.name,
+        "role": role,
+        "counterpart": {
+            "id": counterpart.id if counterpart else None,
+            "fullName": counterpart.fullName if counterpart else unknown,
+            "email": counterpart.email if counterpart else "",
+        },
+        "scheduled_date": entry.scheduled_date.isoformat(),
+        "end_date": entry.end_date.isoformat(),
+        "status": "completed" if session.is_completed else "pending",
+        "is_rated": session.is_rated,
+    }
@@ -0,0 +1,72 @@
+"""Completing and rating scheduled sessions, safely under concurrency.
+
+Each state change is a single conditional ``UPDATE`` (compare-and-set on
+``is_completed``/``is_rated``), so of several concurrent requests exactly
+one sees a row updated and goes on to act on it.
+"""
+
+from django.db import transaction
+from django.db.models import F
+
+from . import reputation
+from .models import CustomUser, Rating, ScheduledSession
+
+
+class RatingError(Exception):
+    pass
+
+
+def complete(session_id):
+    """Mark a session completed; False if it already was.
+
+    Raises ``ScheduledSession.DoesNotExist`` for an unknown session.
+    """
+    if ScheduledSession.objects.filter(pk=session_id, is_completed=False).update(
+        is_completed=True
+    ):
+        return True
+    if not ScheduledSession.objects.filter(pk=session_id).exists():
+        raise ScheduledSession.DoesNotExist
+    return False
+
+
+def rate(session_id, rating, feedback=""):
+    """Rate the teacher of a completed session and credit them ``rating``.
+
+    Returns False if the session isn't completed or was already rated.
+    Claiming the session, recording the rating, crediting the teacher and
+    updating their reputation all happen in one transaction.
+    """
+    with transaction.atomic():
+        claimed = ScheduledSession.objects.filter(
+            pk=session_id, is_completed=True, is_rated=False
+        ).update(is_rated=True)
+        if not claimed:
+            if not ScheduledSession.objects.filter(pk=session_id).exists():
+                raise ScheduledSession.DoesNotExist
+            return False
+
+        session = (
+            ScheduledSession.objects.filter(pk=session_id)
+            .values("user_id", "teach_skill_id", "teacher_id")
+            .get()
+        )
+        if session["teacher_id"] is None:
+            # Undoes the claim above
+            raise RatingError("This session has no teacher to rate")
+
+        Rating.objects.create(
+            skill_match_id=session_id,
+            learner_id=session["user_id"],
+            teacher_id=session["teacher_id"],
+            rating=rating,
+            feedback=feedback,
+        )
+        # Credits equal to the rating (e.g. 5 credits for a 5-star rating)
+        CustomUser.objects.filter(pk=session["teacher_id"]).update(
+            credits=F("credits") + rating
+        )
+        reputation.record_rating(
+            session["teacher_id"], session["teach_skill_id"], rating
+        )
+    return True
@@ -0,0 +1,126 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache, instrumentation, profiles, session_history, skill_index
+from .models import Badge, CustomUser, Review, ScheduledSession, Skill
+
+
+def bump_versions(*namespaces):
+    # After commit, so a concurrent reader can't cache the old rows under the
+    # new version
+    def bump():
+        for namespace in namespaces:
+            cache.bump_version(namespace)
+
+    transaction.on_commit(bump)
+
+
+def skills_created(skills):
+    """Counterpart of ``skill_saved`` for skills inserted with bulk_create."""
+    for skill in skills:
+        transaction.on_commit(partial(skill_index.skill_saved, skill))
+    bump_versions("skills", "matches")
+
+
+@receiver(post_save, sender=Skill)
+def skill_saved(sender, instance, **kwargs):
+    # The whole process shares the index, so it only learns of committed rows
+    transaction.on_commit(partial(skill_index.skill_saved, instance))
+    bump_versions("skills", "matches")
+
+
+@receiver(post_delete, sender=Skill)
+def skill_deleted(sender, instance, **kwargs):
+    # Bound now, Django clears instance.pk once the delete is done
+    transaction.on_commit(partial(skill_index.skill_deleted, instance.pk))
+    bump_versions("skills", "matches")
+
+
+@receiver(m2m_changed, sender=Skill.teachers.through)
+def skill_teachers_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_versions("skills")
+
+
+def bump_profiles(user_ids):
+    bump_versions(*(profiles.profile_namespace(user_id) for user_id in user_ids))
+
+
+def changed_users(instance, reverse, action, pk_set):
+    """User ids affected by an m2m change, or None if they're unknown."""
+    if not reverse:
+        return [instance.pk]
+    if action == "post_clear":
+        return None
+    return pk_set
+
+
+@receiver(m2m_changed, sender=CustomUser.skills.through)
+def user_skills_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_versions("matches")
+        user_ids = changed_users(instance, reverse, action, pk_set)
+        if user_ids is None:
+            bump_versions("skills")
+        else:
+            bump_profiles(user_ids)
+
+
+# Fields matching reads, a save of only others (e.g. last_login on each login)
+# keeps the cached matches
+MATCHED_USER_FIELDS = {"email", "fullName", "proficiency", "xp_points"}
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or MATCHED_USER_FIELDS & set(update_fields):
+        bump_versions("matches")
+    bump_profiles([instance.pk])
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    bump_versions("matches")
+    bump_profiles([instance.pk])
+
+
+@receiver(post_save, sender=Badge)
+@receiver(post_delete, sender=Badge)
+def badge_changed(sender, **kwargs):
+    bump_versions("badges")
+
+
+@receiver(m2m_changed, sender=Badge.users.through)
+def badge_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        # Forward side is badge.users, so "reverse" means user.badges
+        user_ids = changed_users(instance, not reverse, action, pk_set)
+        if user_ids is None:
+            bump_versions("badges")
+        else:
+            bump_profiles(user_ids)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    bump_profiles([instance.user_id])
+
+
+# Fields copied into SessionParticipant
+LISTED_SESSION_FIELDS = {"user", "teacher", "scheduled_date", "end_date"}
+
+
+@receiver(post_save, sender=ScheduledSession)
+def session_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or LISTED_SESSION_FIELDS & set(update_fields):
+        session_history.sync_participants(instance)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    instrumentation.install(connection)
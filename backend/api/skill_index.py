@@ -0,0 +1,230 @@
+"""In-process approximate nearest-neighbour index over skill embeddings.
+
+An inverted-file (IVF) index: skills are clustered around ``nlist`` centroids
+with spherical k-means, and a query only scores the skills in the
+``nprobe`` clusters whose centroids are closest to it. With
+``nlist ~ sqrt(n)`` a search touches O(sqrt(n)) vectors instead of all of
+them. Small catalogs fall back to an exact scan.
+
+The index is built lazily from the database and kept current by the
+``Skill`` signals in ``api.signals``; other processes pick up changes when
+their copy is rebuilt in the background after ``MAX_AGE`` seconds.
+"""
+
+import threading
+import time
+
+import numpy as np
+from django.db import connection
+
+from . import embeddings
+
+NPROBE = 16
+# Below this many skills an exact scan is as fast as probing clusters
+EXACT_BELOW = 2048
+KMEANS_ITERATIONS = 10
+# Rebuild from the database after this many seconds
+MAX_AGE = 300
+
+
+class SkillIndex:
+    def __init__(self, nprobe=NPROBE, exact_below=EXACT_BELOW):
+        self.nprobe = nprobe
+        self.exact_below = exact_below
+        self.vectors = {}
+        # Without centroids every skill lives in lists[0] and search is exact
+        self.centroids = None
+        self.lists = [[]]
+        self.assignments = {}
+        self.trained_size = 0
+        self.built_at = time.monotonic()
+        self._matrices = [None]
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def build(self, items):
+        """Replace the contents with ``(skill_id, vector)`` pairs and train."""
+        with self._lock:
+            self.vectors = {
+                skill_id: vector for skill_id, vector in items if np.any(vector)
+            }
+            self._train()
+            self.built_at = time.monotonic()
+
+    def add(self, skill_id, vector):
+        with self._lock:
+            self._discard(skill_id)
+            if not np.any(vector):
+                return
+            self.vectors[skill_id] = vector
+            if len(self.vectors) > max(2 * self.trained_size, self.exact_below):
+                self._train()
+            else:
+                self._assign(skill_id, vector)
+
+    def remove(self, skill_id):
+        with self._lock:
+            self._discard(skill_id)
+
+    def search(self, query, k, min_score=0.0):
+        """Return up to ``k`` ``(skill_id, score)`` pairs, best first."""
+        with self._lock:
+            if self.centroids is None:
+                probed = [0]
+            else:
+                probe = min(self.nprobe, len(self.centroids))
+                probed = np.argpartition(-(self.centroids @ query), probe - 1)
+                probed = probed[:probe]
+
+            ids, scores = [], []
+            for list_no in probed:
+                if self.lists[list_no]:
+                    ids.extend(self.lists[list_no])
+                    scores.append(self._matrix(list_no) @ query)
+
+        if not ids:
+            return []
+        scores = np.concatenate(scores)
+        top = min(k, len(ids))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(ids[i], float(scores[i])) for i in best if scores[i] >= min_score]
+
+    def _matrix(self, list_no):
+        if self._matrices[list_no] is None:
+            self._matrices[list_no] = np.vstack(
+                [self.vectors[skill_id] for skill_id in self.lists[list_no]]
+            )
+        return self._matrices[list_no]
+
+    def _discard(self, skill_id):
+        if self.vectors.pop(skill_id, None) is None:
+            return
+        list_no = self.assignments.pop(skill_id)
+        self.lists[list_no].remove(skill_id)
+        self._matrices[list_no] = None
+
+    def _assign(self, skill_id, vector):
+        list_no = (
+            0 if self.centroids is None else int(np.argmax(self.centroids @ vector))
+        )
+        self.assignments[skill_id] = list_no
+        self.lists[list_no].append(skill_id)
+        self._matrices[list_no] = None
+
+    def _train(self):
+        self.trained_size = len(self.vectors)
+        ids = list(self.vectors)
+        if len(ids) < self.exact_below:
+            self.centroids = None
+            self.lists = [ids]
+            self.assignments = dict.fromkeys(ids, 0)
+            self._matrices = [None]
+            return
+
+        data = np.vstack([self.vectors[skill_id] for skill_id in ids])
+        nlist = int(np.sqrt(len(ids)))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(ids), nlist, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Keep the previous centroid for clusters that emptied out
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        labels = np.argmax(data @ centroids.T, axis=1)
+
+        self.centroids = centroids.astype(embeddings.DTYPE)
+        self.lists = [[] for _ in range(nlist)]
+        self.assignments = {}
+        for skill_id, list_no in zip(ids, labels):
+            self.assignments[skill_id] = int(list_no)
+            self.lists[list_no].append(skill_id)
+        self._matrices = [None] * nlist
+
+
+_lock = threading.Lock()
+_index = None
+# Changes made while a replacement index is being built, replayed onto it
+_pending = None
+
+
+def _load():
+    from .models import Skill
+
+    index = SkillIndex()
+    index.build(
+        (skill_id, embeddings.decode(blob))
+        for skill_id, blob in Skill.objects.exclude(embedding=None).values_list(
+            "pk", "embedding"
+        )
+    )
+    return index
+
+
+def get_index():
+    """Return the process-wide index, building it from the database if needed.
+
+    Only the first call waits for a build. Once the index is older than
+    ``MAX_AGE``, callers keep getting it while a background thread builds
+    its replacement.
+    """
+    global _index, _pending
+    index = _index
+    if index is None:
+        with _lock:
+            if _index is None:
+                _index = _load()
+            return _index
+    if time.monotonic() - index.built_at > MAX_AGE:
+        with _lock:
+            if _pending is None:
+                _pending = []
+                threading.Thread(
+                    target=refresh, name="skill-index", daemon=True
+                ).start()
+    return index
+
+
+def refresh():
+    """Build a new index from the database and swap it in."""
+    global _index, _pending
+    try:
+        index = _load()
+        with _lock:
+            # Both kinds of change are idempotent, so replaying one the
+            # build already saw is harmless
+            for skill_id, vector in _pending or ():
+                if vector is None:
+                    index.remove(skill_id)
+                else:
+                    index.add(skill_id, vector)
+            _index = index
+    finally:
+        with _lock:
+            _pending = None
+        connection.close()
+
+
+def _changed(skill_id, vector):
+    with _lock:
+        index = _index
+        if _pending is not None:
+            _pending.append((skill_id, vector))
+    if index is not None:
+        if vector is None:
+            index.remove(skill_id)
+        else:
+            index.add(skill_id, vector)
+
+
+def skill_saved(skill):
+    if skill.embedding:
+        _changed(skill.pk, embeddings.decode(skill.embedding))
+
+
+def skill_deleted(skill_id):
+    _changed(skill_id, None)
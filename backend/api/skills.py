@@ -0,0 +1,54 @@
+"""Resolving user-supplied skill names to ``Skill`` rows in bulk."""
+
+from django.db import transaction
+
+from . import embeddings, signals
+from .models import Skill
+
+
+def normalize_names(names):
+    """Strip and collapse whitespace, dropping blanks and case-insensitive repeats."""
+    normalized = {}
+    for name in names:
+        name = " ".join(str(name).split())
+        if name:
+            normalized.setdefault(name.lower(), name)
+    return list(normalized.values())
+
+
+def resolve_skills(names):
+    """Return the ``Skill`` for each name, creating the ones that don't exist.
+
+    Existing skills are matched case-insensitively in one query and the
+    missing ones are inserted with a single ``bulk_create``. A concurrent
+    insert of the same name is absorbed by ``ignore_conflicts`` and picked
+    up by the final lookup.
+    """
+    names = normalize_names(names)
+    if not names:
+        return []
+
+    found = {
+        skill.name.lower(): skill
+        for skill in Skill.objects.named(*names).defer("embedding")
+    }
+    missing = [name for name in names if name.lower() not in found]
+    if missing:
+        Skill.objects.bulk_create(
+            [Skill(name=name, embedding=embeddings.encode(name)) for name in missing],
+            ignore_conflicts=True,
+        )
+        created = list(Skill.objects.named(*missing))
+        found.update((skill.name.lower(), skill) for skill in created)
+        # bulk_create skips post_save, so notify the index and caches here
+        signals.skills_created(created)
+
+    return [found[name.lower()] for name in names if name.lower() in found]
+
+
+def assign_skills(user, names):
+    """Attach the skills called ``names`` to ``user`` and return them."""
+    with transaction.atomic():
+        skills = resolve_skills(names)
+        user.skills.add(*skills)
+    return skills
@@ -0,0 +1,75 @@
+"""Test support: a stand-in for the spaCy model and the runner installing it."""
+
+import hashlib
+import os
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+DIMENSIONS = 300
+
+
+def hashed_vector(text):
+    """A bag of the lowercase words of ``text``, one axis per word.
+
+    Words are hashed onto ``DIMENSIONS`` axes, so the vector is the same in
+    every process. Names sharing words are similar ("Python" and "Python
+    programming" score 0.71) and names sharing none score 0, without loading
+    a model.
+    """
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for word in text.lower().split():
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        vector[int.from_bytes(digest, "big") % DIMENSIONS] += 1
+    return vector
+
+
+class TestRunner(DiscoverRunner):
+    """Runs the tests with ``hashed_vector`` instead of the spaCy model, and
+    a fast password hasher.
+
+    Set ``TEST_SKILL_VECTORIZER=api.nlp.vectorize`` to test against the model.
+
+    A read replica is always configured, as a mirror of the test database
+    when ``DATABASES`` has none, but no view reads it: tests opt in by
+    overriding ``READ_REPLICA["VIEWS"]`` and listing the replica in their
+    ``databases``.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.add_replica()
+        self._settings = override_settings(
+            SKILL_VECTORIZER=os.getenv(
+                "TEST_SKILL_VECTORIZER", "api.testing.hashed_vector"
+            ),
+            # Test users don't need slow hashes
+            PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+            DATABASE_ROUTERS=["api.db_router.ReplicaRouter"],
+            READ_REPLICA={**settings.READ_REPLICA, "VIEWS": []},
+        )
+        self._settings.enable()
+        # File and SQLite tiers outlive the run; don't serve an earlier one's
+        for cache in caches.all(initialized_only=False):
+            cache.clear()
+
+    @staticmethod
+    def add_replica():
+        alias = settings.READ_REPLICA["ALIAS"]
+        if alias in settings.DATABASES:
+            return
+        # Added before any test asks for the alias, so nothing has connected
+        # to it; reconfiguring keeps the other aliases' settings as they are
+        settings.DATABASES[alias] = {
+            **settings.DATABASES[DEFAULT_DB_ALIAS],
+            "TEST": {"MIRROR": DEFAULT_DB_ALIAS},
+        }
+        connections.settings = connections.configure_settings(None)
+
+    def teardown_test_environment(self, **kwargs):
+        self._settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1951 @@
-from django.test import TestCase
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+from unittest import mock
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from urllib.parse import urlsplit
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import update_last_login
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import (
+    admin,
+    benchmarks,
+    cache,
+    db_router,
+    embeddings,
+    http_client,
+    instrumentation,
+    matching,
+    nlp,
+    notifications,
+    profiles,
+    reputation,
+    scheduling,
+    session_history,
+    sessions,
+    skill_index,
+    skills,
+    user_import,
+    views,
+    xp,
+)
+from .cache_backends import FileCache, LRUCache, SQLiteCache
+from .fake_provider import FakeProvider
+from .management.commands import query_plans
+from .models import (
+    Badge,
+    CustomUser,
+    Rating,
+    Review,
+    ScheduledSession,
+    SessionParticipant,
+    Skill,
+    SmsOutbox,
+    TeacherReputation,
+    TeacherSkillReputation,
+    UserImport,
+    XPTransaction,
+)
+from .serializers import UserProfileSerializer
+
+
+def make_user(name, **fields):
+    return CustomUser.objects.create_user(
+        username=name, email=f"{name}@example.com", password="x", **fields
+    )
+
+
+def token_client(user):
+    """A client sending ``user``'s JWT, which the async views check themselves."""
+    token = RefreshToken.for_user(user).access_token
+    return APIClient(headers={"Authorization": f"Bearer {token}"})
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+def clear_caches():
+    for backend in caches.all():
+        backend.clear()
+
+
+class XPTransferTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def transfer(self, amount, key=None, recipient="bob"):
+        headers = {"Idempotency-Key": key} if key else {}
+        return self.client.post(
+            "/api/xp/transfer/",
+            {"recipient": recipient, "amount": amount},
+            format="json",
+            headers=headers,
+        )
+
+    def test_transfer_moves_xp_and_records_it(self):
+        response = self.transfer(30)
+
+        self.assertEqual(response.status_code, 201)
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.xp_points, self.bob.xp_points), (70, 130))
+        txn = XPTransaction.objects.get()
+        self.assertEqual(
+            (txn.sender, txn.recipient, txn.amount), (self.alice, self.bob, 30)
+        )
+
+    def test_insufficient_xp_changes_nothing(self):
+        response = self.transfer(101)
+
+        self.assertEqual(response.status_code, 400)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.xp_points, 100)
+        self.assertFalse(XPTransaction.objects.exists())
+
+    def test_retry_with_same_key_is_applied_once(self):
+        first = self.transfer(10, key="abc")
+        retry = self.transfer(10, key="abc")
+
+        self.assertEqual((first.status_code, retry.status_code), (201, 200))
+        self.assertEqual(first.data["transaction"], retry.data["transaction"])
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.xp_points, 90)
+
+    def test_reusing_key_for_another_transfer_conflicts(self):
+        self.transfer(10, key="abc")
+
+        self.assertEqual(self.transfer(20, key="abc").status_code, 409)
+
+    def test_unknown_recipient(self):
+        self.assertEqual(self.transfer(10, recipient="nobody").status_code, 404)
+
+    def test_transfer_to_self_is_rejected(self):
+        self.assertEqual(self.transfer(10, recipient="alice").status_code, 400)
+
+    def test_list_pages_through_history(self):
+        for i in range(5):
+            xp.transfer(self.alice.pk, self.bob.pk, 1, f"out-{i}")
+        xp.transfer(self.bob.pk, self.alice.pk, 1, "in")
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = self.client.get("/api/xp/", params)
+            self.assertEqual(response.status_code, 200)
+            seen += [txn["id"] for txn in response.data["results"]]
+            cursor = response.data["next_cursor"]
+            if cursor is None:
+                break
+
+        self.assertEqual(
+            seen,
+            list(XPTransaction.objects.order_by("-pk").values_list("pk", flat=True)),
+        )
+
+
+class ConcurrencyMixin:
+    THREADS = 8
+
+    def run_threads(self, target):
+        errors = []
+
+        def run(n):
+            try:
+                target(n)
+            except Exception as e:  # surfaced by the assertion below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class XPTransferConcurrencyTests(ConcurrencyMixin, TransactionTestCase):
+    USERS = 4
+    TRANSFERS = 25
+    BALANCE = 100
+
+    def test_concurrent_transfers_conserve_xp(self):
+        users = [make_user(f"user{i}") for i in range(self.USERS)]
+        ids = [user.pk for user in users]
+
+        def transfers(n):
+            rng = random.Random(n)
+            for i in range(self.TRANSFERS):
+                sender, recipient = rng.sample(ids, 2)
+                try:
+                    xp.transfer(sender, recipient, rng.randint(1, 60), f"{n}-{i}")
+                except xp.InsufficientXP:
+                    pass
+
+        self.run_threads(transfers)
+
+        balances = dict(CustomUser.objects.values_list("pk", "xp_points"))
+        self.assertEqual(sum(balances.values()), self.USERS * self.BALANCE)
+        self.assertTrue(all(balance >= 0 for balance in balances.values()))
+        # Every balance is explained by the ledger
+        for user_id, balance in balances.items():
+            sent = XPTransaction.objects.filter(sender_id=user_id).aggregate(
+                total=Sum("amount")
+            )["total"]
+            received = XPTransaction.objects.filter(recipient_id=user_id).aggregate(
+                total=Sum("amount")
+            )["total"]
+            self.assertEqual(balance, self.BALANCE - (sent or 0) + (received or 0))
+
+    def test_concurrent_retries_apply_once(self):
+        alice, bob = make_user("alice"), make_user("bob")
+
+        self.run_threads(lambda n: xp.transfer(alice.pk, bob.pk, 10, "same-key"))
+
+        self.assertEqual(XPTransaction.objects.count(), 1)
+        alice.refresh_from_db()
+        self.assertEqual(alice.xp_points, 90)
+
+
+def make_session(**fields):
+    learner, teacher = make_user("learner"), make_user("teacher")
+    teach, learn = Skill.objects.create(name="Guitar"), Skill.objects.create(name="Go")
+    teach.teachers.add(teacher)
+    session = ScheduledSession.objects.create(
+        user=learner,
+        teacher=teacher,
+        teach_skill=teach,
+        learn_skill=learn,
+        **{"scheduled_date": timezone.now(), **fields},
+    )
+    return session, teacher
+
+
+class SessionRatingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def rate(self, session, rating=4):
+        return self.client.post(
+            f"/api/rate-teacher/{session.pk}/", {"rating": rating}, format="json"
+        )
+
+    def test_rating_credits_teacher(self):
+        session, teacher = make_session(is_completed=True)
+
+        with self.assertNumQueries(10):
+            response = self.rate(session)
+
+        self.assertEqual(response.data["message"], "Teacher rated successfully!")
+        teacher.refresh_from_db()
+        self.assertEqual(teacher.credits, 4)
+        self.assertEqual(teacher.reputation.rating_count, 1)
+        session.refresh_from_db()
+        self.assertTrue(session.is_rated)
+
+    def test_uncompleted_session_cannot_be_rated(self):
+        session, teacher = make_session()
+
+        self.assertEqual(
+            self.rate(session).data["message"],
+            "Session not completed or already rated.",
+        )
+        self.assertFalse(Rating.objects.exists())
+
+    def test_session_without_teacher_stays_unrated(self):
+        session, teacher = make_session(is_completed=True)
+        teacher.delete()
+
+        self.assertEqual(self.rate(session).status_code, 400)
+        session.refresh_from_db()
+        self.assertFalse(session.is_rated)
+
+    def test_invalid_rating(self):
+        session, teacher = make_session(is_completed=True)
+
+        self.assertEqual(self.rate(session, rating=6).status_code, 400)
+
+    def test_unknown_session(self):
+        self.assertEqual(
+            self.client.post("/api/complete-session/999/").status_code, 404
+        )
+
+    def test_complete_session_once(self):
+        session, teacher = make_session()
+
+        with self.assertNumQueries(1):
+            first = self.client.post(f"/api/complete-session/{session.pk}/")
+        second = self.client.post(f"/api/complete-session/{session.pk}/")
+
+        self.assertEqual(first.data["message"], "Session marked as completed.")
+        self.assertEqual(second.data["message"], "Session already completed.")
+
+
+class ReputationTests(TestCase):
+    def setUp(self):
+        self.session, self.teacher = make_session(is_completed=True)
+        self.piano = Skill.objects.create(name="Piano")
+
+    def rated_session(self, rating, teach_skill=None):
+        session = ScheduledSession.objects.create(
+            user=self.session.user,
+            teacher=self.teacher,
+            teach_skill=teach_skill or self.session.teach_skill,
+            learn_skill=self.session.learn_skill,
+            scheduled_date=timezone.now(),
+            is_completed=True,
+        )
+        self.assertTrue(sessions.rate(session.pk, rating))
+        return session
+
+    def test_bayesian_score_shrinks_few_ratings_towards_the_prior(self):
+        self.assertEqual(reputation.bayesian_score(0, 0), reputation.PRIOR_MEAN)
+        self.assertAlmostEqual(reputation.bayesian_score(1, 5), 20 / 6)
+        self.assertAlmostEqual(reputation.bayesian_score(10, 50), 65 / 15)
+        self.assertLess(
+            reputation.bayesian_score(1, 5), reputation.bayesian_score(10, 50)
+        )
+
+    def test_ratings_update_teacher_and_skill_aggregates(self):
+        for rating in (5, 4):
+            self.rated_session(rating)
+        self.rated_session(1, teach_skill=self.piano)
+
+        overall = TeacherReputation.objects.get(teacher=self.teacher)
+        self.assertEqual((overall.rating_count, overall.rating_sum), (3, 10))
+        self.assertAlmostEqual(overall.mean, 10 / 3)
+        self.assertAlmostEqual(overall.bayesian_score, reputation.bayesian_score(3, 10))
+        guitar, piano = TeacherSkillReputation.objects.filter(
+            teacher=self.teacher
+        ).order_by("skill__name")
+        self.assertEqual((guitar.rating_count, guitar.mean), (2, 4.5))
+        self.assertEqual((piano.rating_count, piano.mean), (1, 1.0))
+
+    def test_rebuild_agrees_with_the_running_totals(self):
+        for rating in (5, 2, 4):
+            self.rated_session(rating)
+        self.rated_session(3, teach_skill=self.piano)
+
+        def snapshot():
+            return sorted(
+                TeacherSkillReputation.objects.values_list(
+                    "skill_id", "rating_count", "rating_sum", "mean", "bayesian_score"
+                )
+            ) + list(
+                TeacherReputation.objects.values_list(
+                    "rating_count", "rating_sum", "mean", "bayesian_score"
+                )
+            )
+
+        running = snapshot()
+        self.assertEqual(reputation.rebuild(), (1, 2))
+        for before, after in zip(running, snapshot(), strict=True):
+            for a, b in zip(before, after):
+                self.assertAlmostEqual(a, b)
+
+    def test_rating_refreshes_the_teachers_cached_profile(self):
+        client = token_client(self.teacher)
+        self.assertIsNone(client.get("/api/profile/").json()["reputation"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rated_session(5)
+
+        self.assertEqual(
+            client.get("/api/profile/").json()["reputation"]["rating_count"], 1
+        )
+
+
+class SessionRatingConcurrencyTests(ConcurrencyMixin, TransactionTestCase):
+    def test_concurrent_ratings_credit_once(self):
+        session, teacher = make_session(is_completed=True)
+        messages = []
+
+        def rate(n):
+            response = APIClient().post(
+                f"/api/rate-teacher/{session.pk}/", {"rating": 5}, format="json"
+            )
+            messages.append(response.data["message"])
+
+        self.run_threads(rate)
+
+        self.assertEqual(messages.count("Teacher rated successfully!"), 1)
+        teacher.refresh_from_db()
+        self.assertEqual(teacher.credits, 5)
+        self.assertEqual(Rating.objects.count(), 1)
+        self.assertEqual(TeacherReputation.objects.get().rating_count, 1)
+
+    def test_concurrent_completion_succeeds_once(self):
+        session, teacher = make_session()
+        messages = []
+
+        def complete(n):
+            response = APIClient().post(f"/api/complete-session/{session.pk}/")
+            messages.append(response.data["message"])
+
+        self.run_threads(complete)
+
+        self.assertEqual(messages.count("Session marked as completed."), 1)
+
+
+@override_settings(SPACY_MODEL="test_model", SPACY_VECTORS_ONLY=False)
+class ModelLoaderTests(SimpleTestCase):
+    def setUp(self):
+        self.model = mock.Mock()
+        self.load = mock.patch("spacy.load", return_value=self.model).start()
+        mock.patch.object(nlp, "_nlp", None).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_model_loads_once_on_first_use(self):
+        self.assertFalse(nlp.is_loaded())
+        models = []
+
+        threads = [
+            threading.Thread(target=lambda: models.append(nlp.get_nlp()))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.load.assert_called_once_with("test_model")
+        self.assertEqual(models, [self.model] * 8)
+        self.assertTrue(nlp.is_loaded())
+
+    def test_full_pipeline_vectorizes_the_processed_doc(self):
+        self.assertIs(nlp.vectorize("Guitar"), self.model.return_value.vector)
+        self.model.assert_called_once_with("Guitar")
+
+    @override_settings(SPACY_VECTORS_ONLY=True)
+    def test_vectors_only_skips_the_pipeline(self):
+        vector = nlp.vectorize("Guitar")
+
+        self.load.assert_called_once_with("test_model", exclude=nlp.PIPELINE_COMPONENTS)
+        self.assertIs(vector, self.model.make_doc.return_value.vector)
+        self.model.assert_not_called()
+
+
+class SkillsCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        for name in ("Python", "PyTorch", "Guitar"):
+            Skill.objects.create(name=name)
+
+    def skills(self, **params):
+        return self.client.get("/api/skills/", params)
+
+    def test_unchanged_skills_are_not_modified(self):
+        response = self.skills(q="py")
+        etag = response["ETag"]
+
+        self.assertEqual(
+            self.client.get(
+                "/api/skills/", {"q": "py"}, HTTP_IF_NONE_MATCH=etag
+            ).status_code,
+            304,
+        )
+        self.assertNotEqual(self.skills(q="gu")["ETag"], etag)
+
+    def test_saving_a_skill_invalidates_the_payload(self):
+        etag = self.skills()["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Skill.objects.create(name="Piano")
+
+        response = self.skills()
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("Piano", [skill["name"] for skill in response.data["skills"]])
+
+    def test_versions_are_shared_between_processes(self):
+        # Another process has its own connection to the version store
+        other = caches.create_connection(cache.version_alias())
+        version = cache.get_version("skills")
+
+        cache.bump_version("skills")
+
+        self.assertNotEqual(cache.get_version("skills"), version)
+        self.assertEqual(other.get("skills:version"), cache.get_version("skills"))
+
+    def test_fields_prefix_and_pages(self):
+        response = self.skills(fields="name", q="py", limit=1)
+
+        self.assertEqual(response.data["skills"], [{"name": "Python"}])
+        self.assertEqual((response.data["count"], response.data["next_offset"]), (2, 1))
+        last = self.skills(fields="name", q="py", limit=1, offset=1)
+        self.assertEqual(last.data["skills"], [{"name": "PyTorch"}])
+        self.assertIsNone(last.data["next_offset"])
+
+    def test_invalid_queries_are_rejected(self):
+        for params in (
+            {"fields": "name,password"},
+            {"offset": -1},
+            {"limit": 0},
+            {"limit": "ten"},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.skills(**params).status_code, 400)
+
+    def test_stats_count_hits_misses_and_evictions(self):
+        def local():
+            return cache.stats().get("local", {"hits": 0, "misses": 0, "evictions": 0})
+
+        before = local()
+        self.skills()
+        self.skills()
+        lru = LRUCache("stats-test", {"OPTIONS": {"MAX_ENTRIES": 3}})
+        for key in "abcd":
+            lru.set(key, key)
+
+        after = local()
+        self.assertEqual(
+            {name: after[name] - before[name] for name in after},
+            {"hits": 1, "misses": 1, "evictions": 1},
+        )
+
+    def test_shared_backends_count_evictions_under_their_tier(self):
+        def evictions(tier):
+            return cache.stats().get(tier, {}).get("evictions", 0)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        options = {"MAX_ENTRIES": 4, "CULL_FREQUENCY": 2}
+        sqlite = SQLiteCache(
+            f"{directory.name}/cache.sqlite3",
+            {"OPTIONS": {**options, "TIER": "versions", "CULL_EVERY": 3}},
+        )
+        files = FileCache(f"{directory.name}/files", {"OPTIONS": options})
+        before = evictions("versions"), evictions("shared")
+
+        for key in "abcdef":
+            sqlite.set(key, key)
+            files.set(key, key)
+
+        # The table is only counted on every third write, at 2 and 5 rows
+        self.assertEqual(
+            (evictions("versions") - before[0], evictions("shared") - before[1]),
+            (2, 2),
+        )
+
+
+class ProfileTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = make_user("owner", fullName="Owner")
+        python, guitar = Skill.objects.create(name="Python"), Skill.objects.create(
+            name="Guitar"
+        )
+        self.user.skills.add(python, guitar)
+        python.teachers.add(*(make_user(f"teacher{i}") for i in range(3)))
+        self.user.badges.add(
+            *(
+                Badge.objects.create(name=f"Badge {i}", image="badges/badge.png")
+                for i in range(2)
+            )
+        )
+        for i, rating in enumerate((3, 5)):
+            Review.objects.create(
+                reviewer=make_user(f"reviewer{i}"),
+                user=self.user,
+                comment="Good",
+                rating=rating,
+            )
+        self.client = token_client(self.user)
+
+    def test_profile_graph_loads_in_fixed_queries(self):
+        with self.assertNumQueries(5):
+            data = UserProfileSerializer(profiles.load_profile(self.user.pk)).data
+
+        self.assertEqual(
+            [skill["name"] for skill in data["skills"]], ["Python", "Guitar"]
+        )
+        self.assertEqual(len(data["skills"][0]["teachers"]), 3)
+        self.assertEqual(len(data["badges"]), 2)
+        self.assertEqual((data["review_count"], data["average_rating"]), (2, 4.0))
+        self.assertIsNone(data["reputation"])
+
+    def test_profile_is_cached_until_a_review_changes(self):
+        self.assertEqual(self.client.get("/api/profile/").json()["review_count"], 2)
+        # Only the token's user; the profile comes from the cache
+        with self.assertNumQueries(1):
+            self.client.get("/api/profile/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(
+                reviewer=make_user("late"), user=self.user, comment="Ok", rating=1
+            )
+
+        data = self.client.get("/api/profile/").json()
+        self.assertEqual((data["review_count"], data["average_rating"]), (3, 3.0))
+
+    def test_profile_follows_skill_changes(self):
+        self.client.get("/api/profile/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.skills.remove(Skill.objects.get(name="Guitar"))
+
+        skills = self.client.get("/api/profile/").json()["skills"]
+        self.assertEqual([skill["name"] for skill in skills], ["Python"])
+
+    def test_anonymous_profile_is_unauthorized(self):
+        self.assertEqual(APIClient().get("/api/profile/").status_code, 401)
+
+
+# find_match scores on a pool thread, whose connection only sees committed rows
+class MatchingTests(TransactionTestCase):
+    def setUp(self):
+        clear_caches()
+        self.python = Skill.objects.create(name="Python")
+
+    def teacher(self, name, *skill_names, **fields):
+        user = make_user(name, **fields)
+        user.skills.add(*(Skill.objects.get_or_create(name=n)[0] for n in skill_names))
+        return user
+
+    def find_match(self, client=None, learn="python"):
+        response = (client or APIClient()).post(
+            "/api/find_match/", {"learn": learn}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_matches_teacher_of_related_skill(self):
+        self.teacher("guitarist", "Guitar")
+        teacher = self.teacher("programmer", "Python programming")
+
+        match = self.find_match()["match"]
+
+        self.assertEqual(match["id"], teacher.pk)
+        self.assertEqual(match["teaches"], "Python programming")
+        self.assertEqual(match["similarity_score"], 0.71)
+
+    def test_unrelated_skills_do_not_match(self):
+        self.teacher("guitarist", "Guitar")
+
+        self.assertEqual(
+            self.find_match(),
+            {"match": None, "message": "No users found with this skill"},
+        )
+
+    def test_learner_is_not_matched_with_themselves(self):
+        learner = self.teacher("learner", "Python")
+        other = self.teacher("other", "Python programming")
+
+        self.assertEqual(self.find_match()["match"]["id"], learner.pk)
+        self.assertEqual(
+            self.find_match(token_client(learner))["match"]["id"], other.pk
+        )
+
+    def test_equally_similar_teachers_are_ranked_by_rating(self):
+        self.teacher("first", "Python")
+        second = self.teacher("second", "Python")
+        TeacherReputation.objects.create(
+            teacher=second, rating_count=4, rating_sum=20, mean=5, bayesian_score=4.1
+        )
+
+        self.assertEqual(self.find_match()["match"]["id"], second.pk)
+
+    def test_embeddings_follow_renames(self):
+        before = self.python.embedding
+        self.python.name = "Cooking"
+        self.python.save(update_fields=["name"])
+
+        self.python.refresh_from_db()
+        self.assertNotEqual(self.python.embedding, before)
+        self.assertEqual(
+            embeddings.decode(self.python.embedding).tobytes(),
+            embeddings.encode("Cooking"),
+        )
+
+
+class BatchMatchTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.python = Skill.objects.create(name="Python")
+        self.teacher = make_user("teacher")
+        self.teacher.skills.add(self.python)
+
+    def batch(self, data):
+        return self.client.post(
+            "/api/find_match/batch/", data, content_type="application/json"
+        )
+
+    def lines(self, data):
+        response = self.batch(data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        content = b"".join(response.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_matches_skill_names_in_order(self):
+        lines = self.lines({"learn": ["PYTHON", "Underwater basket weaving"]})
+
+        self.assertEqual(
+            [(line["learn"], line["match"] and line["match"]["id"]) for line in lines],
+            [("PYTHON", self.teacher.pk), ("Underwater basket weaving", None)],
+        )
+        self.assertEqual(lines[0]["skill"], "Python")
+        self.assertEqual(lines[1]["message"], "No such skill found in the database")
+
+    def test_matches_every_skill_of_every_learner(self):
+        learner = make_user("learner")
+        learner.skills.add(self.python, Skill.objects.create(name="Guitar"))
+
+        lines = self.lines({"learners": [learner.pk]})
+
+        self.assertEqual(
+            [(line["learner"], line["skill"]) for line in lines],
+            [(learner.pk, "Python"), (learner.pk, "Guitar")],
+        )
+        # Never the learner themselves, though they have the skill too
+        self.assertEqual(lines[0]["match"]["id"], self.teacher.pk)
+        self.assertIsNone(lines[1]["match"])
+
+    def test_malformed_payloads_are_rejected(self):
+        for data in (
+            {},
+            {"learn": "Python"},
+            {"learn": ["Python", 1]},
+            {"learners": ["abc"]},
+            {"learners": [self.teacher.pk, True]},
+            {"learners": [None]},
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(self.batch(data).status_code, 400)
+
+    @mock.patch.object(views, "MAX_BATCH_SIZE", 2)
+    def test_batch_size_is_limited(self):
+        self.assertEqual(self.batch({"learn": ["a", "b"]}).status_code, 200)
+        response = self.batch({"learners": [1, 2, 3]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(), {"error": "At most 2 matches can be requested at once"}
+        )
+
+
+class RankingTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        skill = Skill.objects.create(name="Python")
+        self.teachers = [make_user(f"teacher{i}", xp_points=i % 3) for i in range(7)]
+        for teacher in self.teachers:
+            teacher.skills.add(skill)
+
+    def page(self, **params):
+        return self.client.get("/api/matches/", {"learn": "Python", **params})
+
+    def test_cursor_pages_cover_every_teacher_once(self):
+        pages, cursor = [], None
+        while True:
+            response = self.page(limit=3, **({"cursor": cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            pages.append([result["id"] for result in response.data["results"]])
+            # XP is relative to the best of all candidates, not of the page
+            for result in response.data["results"]:
+                xp = CustomUser.objects.get(pk=result["id"]).xp_points
+                self.assertEqual(result["breakdown"]["xp"], xp / 2)
+            cursor = response.data["next_cursor"]
+            if cursor is None:
+                break
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        ranked = sum(pages, [])
+        self.assertCountEqual(ranked, [teacher.pk for teacher in self.teachers])
+        # More XP first, then lower ids
+        self.assertEqual(
+            ranked,
+            [
+                teacher.pk
+                for teacher in sorted(self.teachers, key=lambda t: (-t.xp_points, t.pk))
+            ],
+        )
+
+    def assertRankingReused(self, **params):
+        # Only the page's teachers are loaded, the candidates aren't scored again
+        with mock.patch.object(
+            matching, "teacher_ids_for", wraps=matching.teacher_ids_for
+        ) as candidates:
+            self.assertEqual(self.page(**params).status_code, 200)
+        self.assertFalse(candidates.called)
+
+    def test_later_pages_reuse_the_ranking(self):
+        cursor = self.page(limit=3).data["next_cursor"]
+
+        self.assertRankingReused(limit=3, cursor=cursor)
+
+    def test_logins_keep_the_ranking(self):
+        cursor = self.page(limit=3).data["next_cursor"]
+        with self.captureOnCommitCallbacks(execute=True):
+            update_last_login(None, self.teachers[0])
+
+        self.assertRankingReused(limit=3, cursor=cursor)
+
+    def test_xp_changes_rerank(self):
+        self.page(limit=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teachers[0].xp_points = 10
+            self.teachers[0].save(update_fields=["xp_points"])
+
+        ranked = [result["id"] for result in self.page(limit=3).data["results"]]
+        self.assertEqual(ranked[0], self.teachers[0].pk)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.page(cursor="not-a-cursor")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"error": "Invalid cursor"})
+
+
+class SkillIndexTests(SimpleTestCase):
+    DIMENSIONS = 64
+
+    def vectors(self, n, seed=0):
+        """Unit vectors around 40 centres, clustered like real embeddings."""
+        rng = np.random.default_rng(seed)
+        centres = rng.normal(size=(40, self.DIMENSIONS))
+        points = centres[rng.integers(0, 40, n)] + rng.normal(
+            scale=0.5, size=(n, self.DIMENSIONS)
+        )
+        points /= np.linalg.norm(points, axis=1, keepdims=True)
+        return points.astype(embeddings.DTYPE)
+
+    def test_search_recalls_the_exact_neighbours(self):
+        vectors = self.vectors(3000)
+        index = skill_index.SkillIndex(exact_below=500)
+        index.build(enumerate(vectors))
+        self.assertIsNotNone(index.centroids)
+
+        recalls = []
+        for query in self.vectors(100, seed=1):
+            exact = np.argsort(-(vectors @ query))[:10]
+            found = index.search(query, 10)
+            # Scores are the exact ones, best first
+            self.assertEqual(
+                [score for _, score in found],
+                sorted((score for _, score in found), reverse=True),
+            )
+            for skill_id, score in found:
+                self.assertAlmostEqual(score, float(vectors[skill_id] @ query), 5)
+            recalls.append(len(set(exact) & {skill_id for skill_id, _ in found}))
+        self.assertGreaterEqual(sum(recalls) / (10 * len(recalls)), 0.95)
+
+    def test_changes_apply_without_retraining(self):
+        vectors = self.vectors(1000)
+        index = skill_index.SkillIndex(exact_below=500)
+        index.build(enumerate(vectors[:-1]))
+
+        index.add("new", vectors[-1])
+        self.assertEqual(index.search(vectors[-1], 1)[0][0], "new")
+        index.remove(0)
+        self.assertNotIn(0, [skill_id for skill_id, _ in index.search(vectors[0], 5)])
+        self.assertEqual(index.trained_size, 999)
+
+    def test_stale_index_is_served_while_a_new_one_builds(self):
+        stale = skill_index.SkillIndex()
+        stale.build([(1, self.vectors(1)[0])])
+        stale.built_at -= skill_index.MAX_AGE + 1
+        fresh = skill_index.SkillIndex()
+        fresh.build([(1, self.vectors(1)[0]), (2, self.vectors(1, seed=1)[0])])
+        building = threading.Event()
+        release = threading.Event()
+
+        def load():
+            building.set()
+            release.wait(5)
+            return fresh
+
+        with mock.patch.object(skill_index, "_index", stale), mock.patch.object(
+            skill_index, "_pending", None
+        ), mock.patch.object(skill_index, "_load", load):
+            self.assertIs(skill_index.get_index(), stale)
+            self.assertTrue(building.wait(5))
+            self.assertIs(skill_index.get_index(), stale)
+            # Changes made during the build reach both indexes
+            skill_index.skill_deleted(2)
+            release.set()
+            for thread in threading.enumerate():
+                if thread.name == "skill-index":
+                    thread.join(5)
+
+            self.assertIs(skill_index.get_index(), fresh)
+        self.assertEqual(len(fresh), 1)
+
+
+class SkillIndexSignalTests(TestCase):
+    def test_index_changes_wait_for_the_commit(self):
+        with mock.patch.object(skill_index, "_changed") as changed:
+            with self.captureOnCommitCallbacks(execute=True):
+                skill = Skill.objects.create(name="Python")
+                skill_id = skill.pk
+                self.assertFalse(changed.called)
+            changed.assert_called_once_with(skill_id, mock.ANY)
+
+            changed.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                skill.delete()
+                self.assertFalse(changed.called)
+            changed.assert_called_once_with(skill_id, None)
+
+
+class SkillResolutionTests(TestCase):
+    def test_names_are_normalized(self):
+        self.assertEqual(
+            skills.normalize_names(["  Public   speaking ", "", "python", "Python"]),
+            ["Public speaking", "python"],
+        )
+
+    def test_existing_skills_are_reused_in_one_query(self):
+        python = Skill.objects.create(name="Python")
+
+        with self.assertNumQueries(1):
+            resolved = skills.resolve_skills(["PYTHON", " python "])
+
+        self.assertEqual(resolved, [python])
+
+    def test_missing_skills_are_created_in_bulk(self):
+        Skill.objects.create(name="Python")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(3):
+                resolved = skills.resolve_skills(["python", "Guitar", "Go"])
+
+        self.assertEqual([skill.name for skill in resolved], ["Python", "Guitar", "Go"])
+        self.assertEqual(Skill.objects.count(), 3)
+        self.assertTrue(all(skill.embedding for skill in resolved[1:]))
+        # The index and caches hear about the new skills once committed
+        self.assertTrue(callbacks)
+
+    def test_assign_skills_attaches_them_to_the_user(self):
+        user = make_user("learner")
+        Skill.objects.create(name="Python")
+
+        skills.assign_skills(user, ["python", "Chess"])
+        skills.assign_skills(user, ["CHESS"])
+
+        self.assertEqual(
+            sorted(user.skills.values_list("name", flat=True)), ["Chess", "Python"]
+        )
+
+
+class AsyncAuthTests(TestCase):
+    def setUp(self):
+        self.user = make_user("learner")
+
+    def get_sessions(self, token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        return self.client.get("/api/sessions/", headers=headers)
+
+    def test_valid_token_authenticates(self):
+        response = self.get_sessions(RefreshToken.for_user(self.user).access_token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 0)
+
+    def test_missing_token_is_unauthorized(self):
+        response = self.get_sessions()
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(
+            response.json(), {"detail": "Authentication credentials were not provided."}
+        )
+
+    def test_bad_tokens_are_unauthorized(self):
+        expired = RefreshToken.for_user(self.user).access_token
+        expired.set_exp(lifetime=-timedelta(minutes=1))
+        inactive = make_user("inactive")
+        inactive_token = RefreshToken.for_user(inactive).access_token
+        CustomUser.objects.filter(pk=inactive.pk).update(is_active=False)
+
+        for token in ("not-a-jwt", expired, inactive_token):
+            with self.subTest(token=str(token)[:20]):
+                self.assertEqual(self.get_sessions(token).status_code, 401)
+
+    def test_optional_auth_still_rejects_bad_tokens(self):
+        anonymous = self.client.post(
+            "/api/find_match/", {}, content_type="application/json"
+        )
+        bad_token = self.client.post(
+            "/api/find_match/",
+            {},
+            content_type="application/json",
+            headers={"Authorization": "Bearer not-a-jwt"},
+        )
+
+        # Anonymous requests reach the view, which wants a skill
+        self.assertEqual(anonymous.status_code, 400)
+        self.assertEqual(bad_token.status_code, 401)
+
+    def test_other_methods_are_not_allowed(self):
+        self.assertEqual(self.client.delete("/api/sessions/").status_code, 405)
+
+
+class SessionHistoryTests(TestCase):
+    START = datetime(2030, 1, 7, 9, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.session, self.teacher = make_session(scheduled_date=self.START)
+        self.learner = self.session.user
+        for hours in range(1, 5):
+            ScheduledSession.objects.create(
+                user=self.learner,
+                teacher=self.teacher,
+                teach_skill=self.session.teach_skill,
+                learn_skill=self.session.learn_skill,
+                scheduled_date=self.START + timedelta(hours=hours),
+            )
+        self.client = token_client(self.learner)
+
+    def sessions(self, **params):
+        response = self.client.get("/api/sessions/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_count_is_the_total_on_every_page(self):
+        first = self.sessions(limit=2)
+        rest = self.sessions(cursor=first["next_cursor"])
+
+        self.assertEqual((len(first["sessions"]), first["count"]), (2, 5))
+        self.assertEqual((len(rest["sessions"]), rest["count"]), (3, 5))
+        self.assertEqual(self.sessions()["count"], 5)
+
+    def test_pages_walk_the_history_newest_first(self):
+        ids, cursor = [], None
+        while True:
+            page = self.sessions(limit=2, **({"cursor": cursor} if cursor else {}))
+            ids += [session["id"] for session in page["sessions"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        everything = self.sessions()["sessions"]
+        self.assertEqual(ids, [session["id"] for session in everything])
+        self.assertEqual(ids[-1], self.session.pk)
+        self.assertEqual(everything[0]["role"], "student")
+
+    def test_teacher_sees_the_sessions_they_teach(self):
+        taught = token_client(self.teacher).get("/api/sessions/").json()["sessions"]
+
+        self.assertEqual(len(taught), 5)
+        self.assertEqual(
+            {session["counterpart"]["id"] for session in taught}, {self.learner.pk}
+        )
+        self.assertEqual({session["role"] for session in taught}, {"teacher"})
+
+    def test_page_runs_one_query(self):
+        with self.assertNumQueries(1):
+            page, _ = session_history.session_page(self.learner, 2)
+        self.assertEqual(len(page), 2)
+
+    def test_stream_yields_every_session_in_keyset_chunks(self):
+        response = self.client.get("/api/sessions/", {"stream": 1})
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        # The async view streams from an async iterator
+        chunks = async_to_sync(collect)(response.streaming_content)
+        lines = b"".join(chunks).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines], self.sessions()["sessions"]
+        )
+        self.assertEqual(
+            list(session_history.iter_sessions(self.learner, chunk_size=2)),
+            self.sessions()["sessions"],
+        )
+
+    def test_bad_paging_parameters_are_rejected(self):
+        for params in ({"limit": 0}, {"limit": "two"}, {"cursor": "not-a-cursor"}):
+            with self.subTest(params=params):
+                response = self.client.get("/api/sessions/", params)
+                self.assertEqual(response.status_code, 400)
+
+
+class SessionTimesTests(TestCase):
+    START = datetime(2030, 1, 7, 9, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.session, _ = make_session(
+            scheduled_date=self.START, end_date=self.START + timedelta(minutes=90)
+        )
+
+    def test_end_defaults_to_the_default_length(self):
+        session = ScheduledSession(
+            user=self.session.user,
+            teach_skill=self.session.teach_skill,
+            learn_skill=self.session.learn_skill,
+            scheduled_date=self.START,
+        )
+        session.save()
+
+        self.assertEqual(session.end_date, self.START + ScheduledSession.DEFAULT_LENGTH)
+
+    def test_rescheduling_moves_the_end_with_the_start(self):
+        session = ScheduledSession.objects.get(pk=self.session.pk)
+        session.scheduled_date += timedelta(days=1)
+        session.save()
+
+        session.refresh_from_db()
+        self.assertEqual(
+            session.end_date, session.scheduled_date + timedelta(minutes=90)
+        )
+        self.assertEqual(
+            SessionParticipant.objects.filter(session=session)
+            .values_list("end_date", flat=True)
+            .distinct()
+            .get(),
+            session.end_date,
+        )
+
+    def test_rescheduling_keeps_a_new_end(self):
+        self.session.scheduled_date = self.START + timedelta(hours=1)
+        self.session.end_date = self.START + timedelta(hours=4)
+        self.session.save()
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.end_date, self.START + timedelta(hours=4))
+
+    def test_invalid_lengths_are_rejected(self):
+        for end in (self.START, self.START + timedelta(hours=9)):
+            with self.subTest(end=end):
+                self.session.end_date = end
+                with self.assertRaises(ValidationError) as raised:
+                    self.session.full_clean()
+                self.assertIn("end_date", raised.exception.message_dict)
+                with self.assertRaises(ValueError):
+                    self.session.save()
+
+    def test_admin_edits_the_end(self):
+        self.client.force_login(
+            CustomUser.objects.create_superuser(
+                username="admin", email="admin@example.com", password="x"
+            )
+        )
+
+        response = self.client.get(
+            f"/admin/api/scheduledsession/{self.session.pk}/change/"
+        )
+
+        self.assertContains(response, 'name="end_date_0"')
+
+
+class SchedulingTests(TestCase):
+    START = datetime(2030, 1, 7, 9, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.session, self.teacher = make_session(
+            scheduled_date=self.START, end_date=self.START + timedelta(hours=2)
+        )
+        self.learner = self.session.user
+        self.other = make_user("other")
+        self.client = APIClient()
+        self.client.force_authenticate(self.other)
+
+    def book(self, start, **data):
+        return self.client.post(
+            "/api/scheduled-sessions/",
+            {
+                "user_id": self.other.pk,
+                "teacher_id": self.teacher.pk,
+                "learn_skill": "Go",
+                "scheduled_date": start.isoformat(),
+                **data,
+            },
+            format="json",
+        )
+
+    def test_overlapping_booking_is_rejected(self):
+        response = self.book(self.START + timedelta(hours=1))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            json.loads(response.content)["conflicts"],
+            {"learner": [], "teacher": [self.session.pk]},
+        )
+        self.assertEqual(ScheduledSession.objects.count(), 1)
+
+    def test_adjacent_booking_is_accepted(self):
+        response = self.book(self.START + timedelta(hours=2), duration_minutes=30)
+
+        self.assertEqual(response.status_code, 200)
+        session = ScheduledSession.objects.get(pk=response.json()["session_id"])
+        self.assertEqual(
+            session.end_date - session.scheduled_date, timedelta(minutes=30)
+        )
+
+    def test_allow_overlap_flags_conflicts(self):
+        response = self.book(self.START, allow_overlap=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["conflicts"]["teacher"], [self.session.pk])
+        self.assertEqual(ScheduledSession.objects.count(), 2)
+
+    def test_sessions_longer_than_max_length_are_rejected(self):
+        end = self.START + ScheduledSession.MAX_LENGTH + timedelta(hours=1)
+
+        self.assertEqual(
+            self.book(self.START, end_date=end.isoformat()).status_code, 400
+        )
+
+    def test_availability_excludes_busy_time(self):
+        response = self.client.get(
+            "/api/availability/",
+            {
+                "teachers": f"{self.teacher.pk},{self.other.pk}",
+                "start": self.START.replace(hour=8).isoformat(),
+                "end": self.START.replace(hour=12).isoformat(),
+                "min_minutes": 30,
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        slots = response.data["teachers"]
+        self.assertEqual(
+            [
+                (slot["start"].hour, slot["end"].hour)
+                for slot in slots[str(self.teacher.pk)]
+            ],
+            [(8, 9), (11, 12)],
+        )
+        self.assertEqual(len(slots[str(self.other.pk)]), 1)
+
+    def test_interval_index_merges_overlaps(self):
+        index = scheduling.IntervalIndex([(1, 3), (2, 5), (7, 8), (5, 6)])
+
+        self.assertEqual(list(index), [(1, 6), (7, 8)])
+        self.assertTrue(index.overlaps(5, 7))
+        self.assertFalse(index.overlaps(6, 7))
+        self.assertEqual(index.gaps(0, 10, min_length=2), [(8, 10)])
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        self.session, self.teacher = make_session()
+        token = RefreshToken.for_user(self.session.user).access_token
+        # The async views authenticate the token themselves
+        self.client = APIClient(headers={"Authorization": f"Bearer {token}"})
+
+    @override_settings(PERFORMANCE={"SERVER_TIMING": True})
+    def test_server_timing_counts_queries(self):
+        response = self.client.get("/api/sessions/")
+
+        self.assertIn("db;dur=", response["Server-Timing"])
+        # The token's user and the page
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+
+    @override_settings(
+        PERFORMANCE={"QUERY_BUDGETS": {"user_sessions": 0}, "BUDGET_ACTION": "raise"}
+    )
+    def test_exceeding_query_budget_raises(self):
+        with self.assertRaises(instrumentation.QueryBudgetExceeded):
+            self.client.get("/api/sessions/")
+
+    @override_settings(PERFORMANCE={**settings.PERFORMANCE, "BUDGET_ACTION": "raise"})
+    def test_endpoints_stay_within_budgets(self):
+        for url in ("/api/profile/", "/api/sessions/", "/api/skills/", "/api/xp/"):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.post(f"/api/complete-session/{self.session.pk}/")
+        self.client.post(
+            f"/api/rate-teacher/{self.session.pk}/", {"rating": 5}, format="json"
+        )
+
+    def test_json_encoding_of_async_views_counts_as_rendering(self):
+        before = instrumentation.metrics().get("user_sessions", {})
+
+        self.client.get("/api/sessions/")
+
+        # Only the encoding of TimedJsonResponse is timed for this view
+        after = instrumentation.metrics()["user_sessions"]
+        self.assertGreater(after["render_seconds"], before.get("render_seconds", 0))
+
+    def test_metrics_endpoint(self):
+        self.client.get("/api/sessions/")
+
+        response = self.client.get("/api/metrics/")
+
+        self.assertEqual(response["Content-Type"].split(";")[0], "text/plain")
+        self.assertIn(
+            'skillbloom_request_duration_seconds_count{endpoint="user_sessions"}',
+            response.content.decode(),
+        )
+
+
+class BenchmarkTests(TestCase):
+    def test_seeded_endpoints_run_without_errors(self):
+        rows = benchmarks.seed(users=40, skills=8, sessions=200, random_seed=1)
+
+        self.assertEqual(rows["sessions"], 200)
+        self.assertEqual(Rating.objects.count(), rows["ratings"])
+        self.assertEqual(
+            SessionParticipant.objects.filter(is_teacher=False).count(), 200
+        )
+        results = benchmarks.run_endpoints(repeat=2, warmup=0)
+        self.assertEqual(set(results), set(benchmarks.ENDPOINTS))
+        for name, result in results.items():
+            for phase in benchmarks.PASSES:
+                self.assertEqual(result[phase]["errors"], 0, (name, phase))
+        # Cold requests miss the caches; warm ones are served from them
+        for name in ("find_match", "user_profile", "get_skills"):
+            cold, warm = results[name]["cold"], results[name]["warm"]
+            self.assertGreater(cold["queries"]["max"], warm["queries"]["max"], name)
+
+
+def bulk_users(prefix, start, stop):
+    """Users ``start`` to ``stop``, inserted without hashing passwords."""
+    return CustomUser.objects.bulk_create(
+        CustomUser(
+            username=f"{prefix}{i}",
+            email=f"{prefix}{i}@example.com",
+            fullName=f"{prefix} {i}",
+            password="!",
+        )
+        for i in range(start, stop)
+    )
+
+
+def bulk_skills(prefix, start, stop):
+    return Skill.objects.bulk_create(
+        Skill(name=f"{prefix} {i}") for i in range(start, stop)
+    )
+
+
+# Literals vary between otherwise identical statements
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_their_indexes(self):
+        benchmarks.seed(users=40, skills=8, sessions=200, random_seed=1)
+
+        plans = {
+            name: result["plan"]
+            for name, result in query_plans.Command().measure(repeat=1).items()
+        }
+
+        self.assertIn("participant_date_idx", plans["user_sessions"])
+        self.assertIn("session_pending_idx", plans["admin_status_filter"])
+        self.assertIn("session_unrated_idx", plans["pending_ratings"])
+        self.assertIn("rating_teacher_rating_idx", plans["teacher_rating"])
+        self.assertIn("review_user_rating_idx", plans["review_rating"])
+        self.assertIn("skill_name_lower_idx", plans["skill_by_name"])
+
+
+class QueryScalingTests(TestCase):
+    """Every endpoint runs as many queries for 1000 related rows as for one.
+
+    A failure lists the statements that ran more often at the larger size,
+    which is where an N+1 comes from.
+    """
+
+    SIZES = (1, 10, 1000)
+
+    def setUp(self):
+        self.user = make_user("owner")
+        token = RefreshToken.for_user(self.user).access_token
+        self.client = APIClient(headers={"Authorization": f"Bearer {token}"})
+
+    def assertConstantQueries(self, grow, request):
+        """Call ``grow(start, stop)`` to add rows up to each of ``SIZES`` and
+        count the queries of ``request()`` at each size."""
+        statements, size = {}, 0
+        for target in self.SIZES:
+            grow(size, target)
+            size = target
+            clear_caches()
+            with CaptureQueriesContext(connection) as captured:
+                response = request()
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            self.assertLess(response.status_code, 400, response.content[:200])
+            statements[size] = [query["sql"] for query in captured]
+
+        counts = {size: len(sql) for size, sql in statements.items()}
+        if len(set(counts.values())) > 1:
+            smallest, largest = (
+                Counter(SQL_LITERALS.sub("?", sql) for sql in statements[size])
+                for size in (self.SIZES[0], self.SIZES[-1])
+            )
+            extra = "\n".join(
+                f"  {count}x {sql}" for sql, count in (largest - smallest).items()
+            )
+            self.fail(
+                f"Query count depends on data size {counts}; "
+                f"statements added at {self.SIZES[-1]} rows:\n{extra}"
+            )
+
+    def test_user_sessions(self):
+        teacher = make_user("teacher")
+        skill = Skill.objects.create(name="Go")
+        start = timezone.now()
+
+        def grow(first, stop):
+            sessions = ScheduledSession.objects.bulk_create(
+                ScheduledSession(
+                    user=self.user,
+                    teacher=teacher,
+                    teach_skill=skill,
+                    learn_skill=skill,
+                    scheduled_date=start + timedelta(hours=i),
+                    end_date=start + timedelta(hours=i + 1),
+                )
+                for i in range(first, stop)
+            )
+            SessionParticipant.objects.bulk_create(
+                row
+                for session in sessions
+                for row in session_history.participant_rows(session)
+            )
+
+        self.assertConstantQueries(grow, lambda: self.client.get("/api/sessions/"))
+
+    def test_user_profile(self):
+        def grow(first, stop):
+            skills = bulk_skills("Profile skill", first, stop)
+            self.user.skills.add(*skills)
+            skills[0].teachers.add(*bulk_users("teacher", first, stop))
+            reviewers = bulk_users("reviewer", first, stop)
+            Review.objects.bulk_create(
+                Review(reviewer=reviewer, user=self.user, comment="Good", rating=4)
+                for reviewer in reviewers
+            )
+            badges = Badge.objects.bulk_create(
+                Badge(name=f"Badge {i}", image="badges/badge.png")
+                for i in range(first, stop)
+            )
+            self.user.badges.add(*badges)
+
+        self.assertConstantQueries(grow, lambda: self.client.get("/api/profile/"))
+
+    def test_register(self):
+        def grow(first, stop):
+            bulk_users("existing", first, stop)
+            bulk_skills("Existing skill", first, stop)
+
+        registered = iter(range(len(self.SIZES)))
+
+        def register():
+            n = next(registered)
+            return self.client.post(
+                "/api/register/",
+                {
+                    "email": f"new{n}@example.com",
+                    "password": f"Register-{n}-password",
+                    "skill_names": ["Existing skill 0", f"New skill {n}"],
+                },
+                format="json",
+            )
+
+        self.assertConstantQueries(grow, register)
+
+    def login_admin(self):
+        admin = CustomUser.objects.create_superuser(
+            username="admin", email="admin@example.com", password="x"
+        )
+        self.client.force_login(admin)
+
+    def test_admin_user_changelist(self):
+        self.login_admin()
+        skills = bulk_skills("Admin skill", 0, 3)
+
+        def grow(first, stop):
+            for user in bulk_users("listed", first, stop):
+                user.skills.add(*skills)
+
+        self.assertConstantQueries(
+            grow, lambda: self.client.get("/admin/api/customuser/")
+        )
+
+    def test_admin_session_changelist(self):
+        self.login_admin()
+        skill = Skill.objects.create(name="Go")
+        start = timezone.now()
+
+        def grow(first, stop):
+            learners = bulk_users("learner", first, stop)
+            teachers = bulk_users("teacher", first, stop)
+            ScheduledSession.objects.bulk_create(
+                ScheduledSession(
+                    user=learner,
+                    teacher=teacher,
+                    teach_skill=skill,
+                    learn_skill=skill,
+                    scheduled_date=start,
+                    end_date=start + timedelta(hours=1),
+                )
+                for learner, teacher in zip(learners, teachers)
+            )
+
+        self.assertConstantQueries(
+            grow, lambda: self.client.get("/admin/api/scheduledsession/")
+        )
+
+    def test_admin_skill_changelist(self):
+        self.login_admin()
+
+        self.assertConstantQueries(
+            lambda first, stop: bulk_skills("Listed skill", first, stop),
+            lambda: self.client.get("/admin/api/skill/"),
+        )
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username="admin", email="admin@example.com", password="x"
+        )
+        self.client.force_login(self.admin)
+
+    def test_sessions_filter_by_typed_skill_name(self):
+        session, teacher = make_session()
+        ScheduledSession.objects.create(
+            user=session.user,
+            teacher=teacher,
+            teach_skill=Skill.objects.create(name="Piano"),
+            learn_skill=session.learn_skill,
+            scheduled_date=timezone.now(),
+        )
+
+        response = self.client.get(
+            "/admin/api/scheduledsession/", {"teach_skill": "guitar"}
+        )
+
+        self.assertEqual(list(response.context["cl"].result_list), [session])
+        self.assertContains(response, 'name="teach_skill"')
+
+    def test_count_is_estimated_for_big_unfiltered_tables(self):
+        bulk_skills("Counted", 0, 20)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        self.assertEqual(admin.estimated_count(Skill.objects.all()), 20)
+        self.assertIsNone(admin.estimated_count(Skill.objects.filter(pk=1)))
+        paginator = admin.EstimatedCountPaginator(Skill.objects.order_by("pk"), 5)
+        paginator.ESTIMATE_FROM = 10
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 20)
+
+
+class UserImportTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.media = Path(media.name)
+        # Threads hash as well as processes and see the test's settings
+        self.enterContext(
+            mock.patch.object(user_import, "ProcessPoolExecutor", ThreadPoolExecutor)
+        )
+
+    def write(self, name, lines):
+        path = self.media / name
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return path
+
+    def test_rows_are_imported_with_their_skills(self):
+        Skill.objects.create(name="Python")
+        path = self.write(
+            "users.csv",
+            [
+                "email,password,fullName,proficiency,skills",
+                "ada@example.com,pw-1,Ada,expert,python;Chess",
+                "bob@example.com,pw-2,Bob,wizard,",
+                "ada@example.com,pw-3,Ada again,,",
+                ",pw-4,Nobody,,",
+            ],
+        )
+
+        totals = user_import.import_users(path, chunk_size=2)
+
+        self.assertEqual(totals, {"imported": 2, "skipped": 2})
+        ada = CustomUser.objects.get(email="ada@example.com")
+        self.assertTrue(ada.check_password("pw-1"))
+        self.assertEqual(ada.proficiency, "expert")
+        self.assertEqual(
+            sorted(ada.skills.values_list("name", flat=True)), ["Chess", "Python"]
+        )
+        self.assertEqual(
+            CustomUser.objects.get(email="bob@example.com").proficiency, "beginner"
+        )
+        self.assertEqual(user_import.checkpoint_path(path).read_text(), "4")
+
+    def test_conflicting_rows_are_skipped_one_by_one(self):
+        # Not found by the email lookup, but takes the username of a row
+        CustomUser.objects.create(
+            username="taken@example.com", email="other@example.com"
+        )
+        path = self.write(
+            "users.jsonl",
+            [
+                json.dumps({"email": "taken@example.com", "password": "pw-1"}),
+                json.dumps(
+                    {"email": "free@example.com", "password": "pw-2", "skills": ["Go"]}
+                ),
+            ],
+        )
+
+        totals = user_import.import_users(path)
+
+        self.assertEqual(totals, {"imported": 1, "skipped": 1})
+        free = CustomUser.objects.get(email="free@example.com")
+        self.assertEqual(list(free.skills.values_list("name", flat=True)), ["Go"])
+
+    def test_interrupted_import_resumes_from_its_checkpoint(self):
+        path = self.write(
+            "users.csv",
+            ["email,password"] + [f"user{i}@example.com,pw-{i}" for i in range(4)],
+        )
+        user_import.checkpoint_path(path).write_text("2")
+
+        totals = user_import.import_users(path)
+
+        self.assertEqual(totals, {"imported": 2, "skipped": 0})
+        self.assertEqual(
+            sorted(CustomUser.objects.values_list("email", flat=True)),
+            ["user2@example.com", "user3@example.com"],
+        )
+
+    def test_admin_upload_is_queued_for_the_worker(self):
+        self.client.force_login(
+            CustomUser.objects.create_superuser(
+                username="admin", email="admin@example.com", password="x"
+            )
+        )
+        upload = SimpleUploadedFile(
+            "users.csv", b"email,password\nada@example.com,pw-1\n"
+        )
+
+        response = self.client.post("/admin/api/customuser/import/", {"file": upload})
+
+        self.assertRedirects(response, "/admin/api/userimport/")
+        job = UserImport.objects.get()
+        self.assertEqual(job.status, UserImport.PENDING)
+        self.assertFalse(CustomUser.objects.filter(email="ada@example.com").exists())
+
+        call_command("run_user_imports", once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.imported, job.skipped), (UserImport.DONE, 1, 0)
+        )
+        self.assertIsNotNone(job.finished_at)
+        self.assertTrue(CustomUser.objects.filter(email="ada@example.com").exists())
+        self.assertFalse(user_import.checkpoint_path(job.file.path).exists())
+        self.assertFalse(user_import.run_next())
+
+    def test_failed_import_records_the_error(self):
+        job = UserImport.objects.create(
+            file=SimpleUploadedFile("users.jsonl", b"{not json}\n")
+        )
+
+        self.assertTrue(user_import.run_next())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, UserImport.FAILED)
+        self.assertTrue(job.error)
+
+
+class SendSmsTests(TestCase):
+    def setUp(self):
+        Skill.objects.create(name="Guitar")
+        # Matching itself is covered by MatchingTests
+        self.enterContext(
+            mock.patch.object(
+                views,
+                "_cached_match",
+                mock.AsyncMock(return_value=({"id": 1, "name": "Tess"}, "Match")),
+            )
+        )
+
+    def send(self, **data):
+        return self.client.post("/api/send_sms/", data, content_type="application/json")
+
+    def test_sms_is_queued_not_sent(self):
+        response = self.send(
+            phone_number="+254700000001",
+            skill_name="guitar",
+            scheduled_date="2030-01-07 09:00",
+            student="Sam",
+        )
+
+        self.assertEqual(response.status_code, 202)
+        sms = SmsOutbox.objects.get(pk=response.json()["id"])
+        self.assertEqual(sms.status, SmsOutbox.PENDING)
+        self.assertEqual(sms.phone_number, "+254700000001")
+        self.assertIn("Your guitar session with Tess", sms.message)
+        self.assertLessEqual(len(sms.message), 160)
+
+    def test_missing_fields_are_rejected(self):
+        response = self.send(phone_number="+254700000001")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("skill_name", response.json()["error"])
+        self.assertFalse(SmsOutbox.objects.exists())
+
+    def test_unknown_skill_has_no_teacher(self):
+        response = self.send(
+            phone_number="+254700000001",
+            skill_name="Juggling",
+            scheduled_date="2030-01-07 09:00",
+            student="Sam",
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(SmsOutbox.objects.exists())
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.provider = FakeProvider().start()
+        self.addCleanup(self.provider.stop)
+        self.enterContext(override_settings(AFRICASTALKING_SMS_URL=self.provider.url))
+        self.host = urlsplit(self.provider.url).netloc
+
+    def queue(self, *numbers, message="See you at 9"):
+        return [notifications.queue_sms(number, message) for number in numbers]
+
+    def refreshed(self, messages):
+        return [SmsOutbox.objects.get(pk=sms.pk) for sms in messages]
+
+    def test_identical_messages_go_out_in_one_request(self):
+        self.queue("+1", "+2", "+3")
+        self.queue("+4", message="Something else")
+
+        counts = notifications.send_due()
+
+        self.assertEqual(counts, {"sent": 4, "retry": 0, "failed": 0})
+        self.assertEqual(self.provider.requests, 2)
+        self.assertEqual(
+            sorted(number for number, _ in self.provider.messages),
+            ["+1", "+2", "+3", "+4"],
+        )
+        self.assertEqual(
+            set(SmsOutbox.objects.values_list("status", flat=True)), {SmsOutbox.SENT}
+        )
+
+    def test_server_errors_and_throttling_back_off(self):
+        for status in (500, 429):
+            with self.subTest(status=status):
+                self.provider.reply(status, {"error": "Try later"})
+                [sms] = self.queue(f"+{status}")
+                before = timezone.now()
+
+                self.assertEqual(notifications.send_due()["retry"], 1)
+
+                [sms] = self.refreshed([sms])
+                self.assertEqual((sms.status, sms.attempts), (SmsOutbox.PENDING, 1))
+                self.assertTrue(
+                    sms.last_error.startswith(f"SMS provider error {status}")
+                )
+                delay = sms.next_attempt_at - before
+                self.assertGreaterEqual(delay, timedelta(seconds=15))
+                self.assertLessEqual(delay, timedelta(seconds=31))
+
+    def test_message_fails_after_the_last_attempt(self):
+        [sms] = self.queue("+1")
+        SmsOutbox.objects.update(attempts=notifications.MAX_ATTEMPTS - 1)
+        self.provider.reply(500)
+
+        with self.assertLogs("api.notifications", "ERROR"):
+            self.assertEqual(notifications.send_due()["failed"], 1)
+        self.assertEqual(self.refreshed([sms])[0].status, SmsOutbox.FAILED)
+
+    def test_only_confirmed_recipients_count_as_sent(self):
+        confirmed, missing, rejected = self.queue("+2", "+3", "+4")
+        self.provider.reply(
+            201,
+            {
+                "SMSMessageData": {
+                    "Recipients": [
+                        {"number": "+2", "status": "Success", "statusCode": 101},
+                        {
+                            "number": "+4",
+                            "status": "InvalidPhoneNumber",
+                            "statusCode": 403,
+                        },
+                    ]
+                }
+            },
+        )
+
+        counts = notifications.send_due()
+
+        self.assertEqual(counts, {"sent": 1, "retry": 2, "failed": 0})
+        confirmed, missing, rejected = self.refreshed([confirmed, missing, rejected])
+        self.assertEqual(confirmed.status, SmsOutbox.SENT)
+        self.assertEqual(missing.status, SmsOutbox.PENDING)
+        self.assertEqual(missing.last_error, "SMS provider did not confirm delivery")
+        self.assertEqual(rejected.last_error, "InvalidPhoneNumber")
+
+    def test_numbers_match_whatever_format_they_come_back_in(self):
+        messages = self.queue("0712 345 678", "254712345679", "+254 (712) 345-680")
+        self.provider.reply(
+            201,
+            {
+                "SMSMessageData": {
+                    "Recipients": [
+                        {"number": number, "status": "Success", "statusCode": 101}
+                        for number in ("+254712345678", "254712345679", "0712345680")
+                    ]
+                }
+            },
+        )
+
+        self.assertEqual(notifications.send_due()["sent"], 3)
+        self.assertEqual(
+            [number for number, _ in self.provider.messages],
+            ["+254712345678", "+254712345679", "+254712345680"],
+        )
+        self.assertEqual(
+            {sms.status for sms in self.refreshed(messages)}, {SmsOutbox.SENT}
+        )
+
+    def test_unreadable_acceptance_counts_as_sent(self):
+        [sms] = self.queue("+1")
+        self.provider.reply(201, "<html>Accepted</html>")
+
+        with self.assertLogs("api.notifications", "WARNING"):
+            self.assertEqual(notifications.send_due()["sent"], 1)
+        self.assertEqual(self.refreshed([sms])[0].status, SmsOutbox.SENT)
+
+    def test_breaker_opens_and_lets_one_trial_through(self):
+        with override_settings(HTTP_CLIENT={"BREAKER_FAILURES": 2}):
+            for i in range(3):
+                self.queue(f"+{i}", message=f"Message {i}")
+            self.provider.reply(500)
+            self.provider.reply(500)
+
+            self.assertEqual(notifications.send_due()["retry"], 3)
+
+        # The third group failed fast without reaching the provider, which
+        # doesn't count as an attempt
+        self.assertEqual(self.provider.requests, 2)
+        self.assertEqual(http_client.metrics()[self.host]["rejected"], 1)
+        [rejected] = SmsOutbox.objects.filter(last_error="Circuit breaker is open")
+        self.assertEqual(rejected.attempts, 0)
+        self.assertEqual(SmsOutbox.objects.filter(attempts=1).count(), 2)
+        breaker = http_client._breaker(self.host)
+        self.assertEqual(breaker.state, "open")
+
+        # After the reset timeout a single trial call is let through
+        breaker.opened_at -= breaker.reset_timeout
+        self.assertEqual(breaker.state, "half-open")
+        breaker.before_call()
+        with self.assertRaises(http_client.CircuitOpenError):
+            breaker.before_call()
+        breaker.record(False)
+        self.assertEqual(breaker.state, "open")
+
+        # A successful trial closes it again
+        breaker.opened_at -= breaker.reset_timeout
+        SmsOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(notifications.send_due()["sent"], 3)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_async_worker_sends_every_group(self):
+        self.queue("+1", "+2")
+        self.queue("+3", message="Something else")
+
+        counts = async_to_sync(notifications.asend_due)()
+
+        self.assertEqual(counts, {"sent": 3, "retry": 0, "failed": 0})
+        self.assertEqual(self.provider.requests, 2)
+
+
+# Without DB_REPLICA_NAME the test runner mirrors the test database as the
+# replica; queries are told apart by connection
+@override_settings(
+    READ_REPLICA={**settings.READ_REPLICA, "VIEWS": ["get_skills", "user_sessions"]}
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        clear_caches()
+        # Date the last bumps back beyond the replica lag
+        versions = caches[cache.version_alias()]
+        for namespace in ("skills", "badges", "matches"):
+            versions.set(
+                cache._version_key(namespace), time.time_ns() - 60 * 10**9, None
+            )
+
+    def queries(self, request):
+        """``request()``'s query counts on the primary and the replica."""
+        with CaptureQueriesContext(connections["default"]) as primary:
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                response = request()
+        self.assertLess(response.status_code, 400)
+        return len(primary), len(replica)
+
+    def test_read_only_views_read_the_replica(self):
+        self.assertEqual(self.queries(lambda: self.client.get("/api/skills/")), (0, 1))
+
+    def test_cache_filled_soon_after_a_bump_reads_the_primary(self):
+        cache.bump_version("skills")
+
+        self.assertEqual(self.queries(lambda: self.client.get("/api/skills/")), (1, 0))
+
+    def test_other_views_read_the_primary(self):
+        user = make_user("reader")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        primary, replica = self.queries(lambda: client.get("/api/xp/"))
+
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_writes_pin_the_tokens_user_to_the_primary(self):
+        session, teacher = make_session()
+        learner = token_client(session.user)
+
+        response = learner.post(f"/api/complete-session/{session.pk}/")
+
+        self.assertNotIn("primary_until", response.cookies)
+        self.assertTrue(db_router.is_pinned(session.user.pk))
+        primary, replica = self.queries(lambda: learner.get("/api/sessions/"))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        # Other users still read the replica
+        primary, replica = self.queries(
+            lambda: token_client(teacher).get("/api/sessions/")
+        )
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_anonymous_writes_pin_nobody(self):
+        response = self.client.post(
+            "/api/register/",
+            {"email": "new@example.com", "password": "Register-1-password"},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.cookies)
+        self.assertEqual(self.queries(lambda: self.client.get("/api/skills/")), (0, 1))
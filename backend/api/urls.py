@@ -1,7 +1,12 @@
 from django.urls import path
 from .views import (
     find_match,
+    find_match_batch,
+    rank_matches,
     get_skills,
+    cache_stats,
+    http_stats,
+    prometheus_metrics,
     hello_world,
     login_view,
     register_view,
@@ -13,6 +18,7 @@ from .views import (
     complete_session,
     rate_teacher,
     scheduled_sessions,
+    teacher_availability,
     user_sessions,
     home_view,
 )
@@ -23,7 +29,12 @@ urlpatterns = [
     path("login/", login_view, name="login"),
     path("register/", register_view, name="register"),
     path("find_match/", find_match, name="find_match"),
+    path("find_match/batch/", find_match_batch, name="find_match_batch"),
+    path("matches/", rank_matches, name="rank_matches"),
     path("skills/", get_skills, name="get_skills"),
+    path("cache/stats/", cache_stats, name="cache_stats"),
+    path("http/stats/", http_stats, name="http_stats"),
+    path("metrics/", prometheus_metrics, name="prometheus_metrics"),
     path("logout/", logout_view, name="logout"),
     path("send_sms/", send_sms, name="send_sms"),
     path("about/", about_view, name="about"),
@@ -32,6 +43,11 @@ urlpatterns = [
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("profile/", UserProfileView.as_view(), name="user_profile_api"),
     path("xp/", XPTransactionViewSet.as_view({"get": "list"}), name="xp_transactions"),
+    path(
+        "xp/transfer/",
+        XPTransactionViewSet.as_view({"post": "transfer_xp"}),
+        name="xp_transfer",
+    ),
     path(
         "complete-session/<int:skill_match_id>/",
         complete_session,
@@ -40,4 +56,5 @@ urlpatterns = [
     path("rate-teacher/<int:skill_match_id>/", rate_teacher, name="rate_teacher"),
     path("scheduled-sessions/", scheduled_sessions, name="scheduled_sessions"),
     path("sessions/", user_sessions, name="user_sessions"),
+    path("availability/", teacher_availability, name="teacher_availability"),
 ]
@@ -0,0 +1,203 @@
+"""Bulk import of users from CSV or JSON Lines files.
+
+Rows are read lazily and processed in chunks. Per chunk, passwords are
+hashed in a process pool, users are inserted with one ``bulk_create``,
+their skills are resolved in bulk and linked with one through-table insert,
+all in a single transaction. After each chunk the number of rows consumed
+is written to a checkpoint file next to the input, so an interrupted run
+resumes where it stopped. Rows whose email or username already exists
+are skipped, also when another process inserts them mid-chunk, which makes
+re-running a finished import harmless.
+
+Files uploaded in the admin are queued as ``UserImport`` rows and imported
+by ``run_next()``, which the ``run_user_imports`` worker calls, so hashing
+never runs inside a web request.
+
+CSV files need ``email`` and ``password`` columns and may have
+``fullName``, ``proficiency`` and ``skills`` (separated by ``;``). JSONL
+rows use the same keys, with ``skills`` as a list.
+"""
+
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import signals
+from .models import CustomUser, UserImport
+from .skills import normalize_names, resolve_skills
+
+PROFICIENCY_LEVELS = {level for level, _ in CustomUser.PROFICIENCY_LEVELS}
+
+
+def read_rows(path):
+    path = Path(path)
+    with path.open(newline="", encoding="utf-8") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def _skill_list(skills):
+    if isinstance(skills, str):
+        return skills.split(";")
+    return skills or []
+
+
+def checkpoint_path(path):
+    return Path(f"{path}.progress")
+
+
+def _read_checkpoint(path):
+    try:
+        return int(checkpoint_path(path).read_text())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def import_users(
+    path, chunk_size=1000, workers=None, resume=True, progress=None, executor=None
+):
+    """Import every row of ``path`` and return ``{"imported", "skipped"}`` counts.
+
+    ``progress`` is called after each chunk with the number of rows consumed
+    so far and the running counts.
+    """
+    done = _read_checkpoint(path) if resume else 0
+    totals = {"imported": 0, "skipped": 0}
+    rows = islice(read_rows(path), done, None)
+
+    owns_executor = executor is None
+    if owns_executor:
+        executor = ProcessPoolExecutor(workers, initializer=django.setup)
+    try:
+        while chunk := list(islice(rows, chunk_size)):
+            imported, skipped = _import_chunk(chunk, executor)
+            done += len(chunk)
+            totals["imported"] += imported
+            totals["skipped"] += skipped
+            checkpoint_path(path).write_text(str(done))
+            if progress:
+                progress(done, totals)
+    finally:
+        if owns_executor:
+            executor.shutdown()
+    return totals
+
+
+def _import_chunk(chunk, executor):
+    rows = {}
+    for row in chunk:
+        email = (row.get("email") or "").strip()
+        if email and row.get("password") and email not in rows:
+            rows[email] = row
+    existing = set(
+        CustomUser.objects.filter(email__in=rows).values_list("email", flat=True)
+    )
+    rows = {email: row for email, row in rows.items() if email not in existing}
+
+    passwords = executor.map(
+        make_password,
+        [row["password"] for row in rows.values()],
+        chunksize=max(1, len(rows) // 32),
+    )
+    users = [
+        CustomUser(
+            username=email,
+            email=email,
+            fullName=row.get("fullName") or None,
+            proficiency=(
+                row.get("proficiency")
+                if row.get("proficiency") in PROFICIENCY_LEVELS
+                else "beginner"
+            ),
+            password=password,
+        )
+        for (email, row), password in zip(rows.items(), passwords)
+    ]
+
+    with transaction.atomic():
+        # A row taken since the lookup above is skipped rather than failing
+        # the chunk; the salted hash tells the rows inserted here apart
+        CustomUser.objects.bulk_create(users, ignore_conflicts=True)
+        hashes = {user.email: user.password for user in users}
+        user_ids = {
+            email: pk
+            for email, pk, password in CustomUser.objects.filter(
+                email__in=rows
+            ).values_list("email", "pk", "password")
+            if hashes.get(email) == password
+        }
+        rows = {email: row for email, row in rows.items() if email in user_ids}
+
+        skill_names = {
+            email: normalize_names(_skill_list(row.get("skills")))
+            for email, row in rows.items()
+        }
+        skills = {
+            skill.name.lower(): skill.pk
+            for skill in resolve_skills(
+                name for names in skill_names.values() for name in names
+            )
+        }
+        Through = CustomUser.skills.through
+        Through.objects.bulk_create(
+            [
+                Through(customuser_id=user_ids[email], skill_id=skills[name.lower()])
+                for email, names in skill_names.items()
+                for name in names
+            ],
+            ignore_conflicts=True,
+        )
+        # Bulk inserts skip the m2m signals
+        signals.bump_versions("matches")
+
+    return len(user_ids), len(chunk) - len(user_ids)
+
+
+def run_next(workers=None):
+    """Import the oldest pending ``UserImport``; False if there was none.
+
+    The upload is claimed by switching it to running, so several workers
+    never import the same file. Progress is saved after every chunk.
+    """
+    for job in UserImport.objects.filter(status=UserImport.PENDING).order_by("pk"):
+        claimed = UserImport.objects.filter(
+            pk=job.pk, status=UserImport.PENDING
+        ).update(status=UserImport.RUNNING)
+        if claimed:
+            break
+    else:
+        return False
+
+    # A requeued import resumes from its checkpoint; keep the earlier counts
+    def counts(totals):
+        return {
+            "imported": job.imported + totals["imported"],
+            "skipped": job.skipped + totals["skipped"],
+        }
+
+    def progress(done, totals):
+        UserImport.objects.filter(pk=job.pk).update(**counts(totals))
+
+    try:
+        totals = import_users(job.file.path, workers=workers, progress=progress)
+    except Exception as e:
+        UserImport.objects.filter(pk=job.pk).update(
+            status=UserImport.FAILED, error=str(e), finished_at=timezone.now()
+        )
+    else:
+        UserImport.objects.filter(pk=job.pk).update(
+            status=UserImport.DONE, finished_at=timezone.now(), **counts(totals)
+        )
+        checkpoint_path(job.file.path).unlink(missing_ok=True)
+    return True
@@ -1,35 +1,117 @@
-from venv import logger
+import logging
 from django.shortcuts import render
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_201_CREATED
-from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.http import JsonResponse
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-import requests
+from django.views.decorators.http import condition
+from django.views import View
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.contrib.auth.models import AnonymousUser
+from functools import wraps
 import json
+import uuid
+from datetime import timedelta
 from django.contrib.auth import get_user_model
 from rest_framework import status, viewsets
-from django.db import models
-
-
-# skillmatch imports
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import spacy
+from django.db import IntegrityError, transaction
 
 from backend import settings
-from backend.settings import AFRICASTALKING_API_KEY, AFRICASTALKING_USERNAME
-from .models import Skill, CustomUser, ScheduledSession, Rating
-from api.serializers import SkillSerializer, UserProfileSerializer, SkillMatchSerializer
+from . import (
+    cache,
+    http_client,
+    instrumentation,
+    matching,
+    notifications,
+    profiles,
+    scheduling,
+    session_history,
+    sessions,
+    xp,
+)
+from .instrumentation import TimedJsonResponse
+from .models import Skill, CustomUser, ScheduledSession
+from .skills import assign_skills
+from api.serializers import (
+    SkillSerializer,
+    SkillMatchSerializer,
+    XPTransactionSerializer,
+)
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+_jwt = JWTAuthentication()
+
+
+async def _authenticate(request, required=False):
+    """Set ``request.user`` from the request's JWT, like the DRF views do.
+
+    Async views can't go through DRF, whose views are sync only. Returns an
+    error response if authentication fails, or is ``required`` and missing.
+    """
+    request.user = AnonymousUser()
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header else None
+    if raw_token is not None:
+        try:
+            token = _jwt.get_validated_token(raw_token)
+            request.user = await User.objects.aget(
+                **{jwt_settings.USER_ID_FIELD: token[jwt_settings.USER_ID_CLAIM]},
+                is_active=True,
+            )
+        except AuthenticationFailed as e:
+            detail = e.detail if isinstance(e.detail, dict) else {"detail": e.detail}
+            return TimedJsonResponse(detail, status=401)
+        except (KeyError, User.DoesNotExist):
+            return TimedJsonResponse({"detail": "User not found"}, status=401)
+    elif required:
+        return TimedJsonResponse(
+            {"detail": "Authentication credentials were not provided."}, status=401
+        )
+    return None
+
+
+def async_api_view(methods, authenticated=False):
+    """Async counterpart of ``@api_view`` for I/O-bound endpoints."""
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return TimedJsonResponse(
+                    {"detail": f'Method "{request.method}" not allowed.'}, status=405
+                )
+            error = await _authenticate(request, authenticated)
+            if error is not None:
+                return error
+            return await view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _request_data(request):
+    """The JSON or form body of a request; raises ValueError if malformed."""
+    if request.content_type == "application/json":
+        data = json.loads(request.body or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        return data
+    return request.POST
 
 
 @api_view(["GET"])
@@ -43,7 +125,7 @@ def about_view(request):
         "description": "A platform for exchanging skills with others.",
         "version": "1.0.0",
     }
-    return JsonResponse(data)
+    return TimedJsonResponse(data)
 
 
 def home_view(request):
@@ -53,7 +135,7 @@ def home_view(request):
         "features": ["Global Community", "Skill Exchange", "Personal Growth"],
         "version": "1.0.0",
     }
-    return JsonResponse(data)
+    return TimedJsonResponse(data)
 
 
 # Function to generate JWT token
@@ -123,19 +205,21 @@ def register_view(request):
     except ValidationError as e:
         return Response({"error": e.messages}, status=HTTP_400_BAD_REQUEST)
 
-    # Create user
-    user = CustomUser.objects.create_user(
-        username=email,
-        email=email,
-        fullName=fullName,
-        password=password,
-        proficiency=proficiency,
-    )
+    try:
+        with transaction.atomic():
+            # Create user
+            user = CustomUser.objects.create_user(
+                username=email,
+                email=email,
+                fullName=fullName,
+                password=password,
+                proficiency=proficiency,
+            )
 
-    # Process skills - create if they don't exist
-    for skill_name in skill_names:
-        skill, created = Skill.objects.get_or_create(name=skill_name)
-        user.skills.add(skill)
+            # Process skills - create if they don't exist
+            skills = assign_skills(user, skill_names)
+    except IntegrityError:
+        return Response({"error": "Email already exists"}, status=HTTP_400_BAD_REQUEST)
 
     # Generate token
     token = get_tokens_for_user(user)
@@ -147,7 +231,7 @@ def register_view(request):
                 "id": user.id,
                 "email": user.email,
                 "fullName": user.fullName,
-                "skills": list(user.skills.values_list("name", flat=True)),
+                "skills": [skill.name for skill in skills],
                 "proficiency": user.proficiency,
             },
         },
@@ -155,91 +239,267 @@ def register_view(request):
     )
 
 
+MAX_SKILLS_PAGE_SIZE = 500
+
+
+def _skills_query(request):
+    """Validated ``(fields, q, offset, limit)`` from the query string."""
+    params = request.GET
+    fields = params.get("fields")
+    if fields:
+        fields = sorted(set(fields.split(",")))
+        unknown = set(fields) - set(SkillSerializer().fields)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    offset = int(params.get("offset", 0))
+    limit = params.get("limit")
+    limit = min(int(limit), MAX_SKILLS_PAGE_SIZE) if limit is not None else None
+    if offset < 0 or (limit is not None and limit <= 0):
+        raise ValueError("offset and limit must be positive")
+    return fields or None, params.get("q", ""), offset, limit
+
+
+def _skills_etag(request):
+    try:
+        query = _skills_query(request)
+    except ValueError:
+        return None
+    return cache.make_key("skills", cache.get_version("skills"), query)
+
+
+@condition(etag_func=_skills_etag)
 @api_view(["GET"])
 def get_skills(request):
-    skills = Skill.objects.all()
-    serializer = SkillSerializer(skills, many=True)
-    return Response({"skills": serializer.data})
+    try:
+        fields, q, offset, limit = _skills_query(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
 
+    def serialize():
+        skills = Skill.objects.defer("embedding").order_by("pk")
+        if q:
+            skills = skills.filter(name__istartswith=q)
+        if fields is None or "teachers" in fields:
+            skills = skills.prefetch_related("teachers")
 
-# Load NLP model for similarity comparison
-nlp = spacy.load("en_core_web_md")
+        page = skills[offset:] if limit is None else skills[offset : offset + limit]
+        payload = {"skills": SkillSerializer(page, many=True, fields=fields).data}
+        if limit is not None:
+            count = skills.count()
+            payload["count"] = count
+            payload["next_offset"] = offset + limit if offset + limit < count else None
+        return payload
 
+    payload = cache.get_or_set("skills", (fields, q, offset, limit), serialize)
+    return Response(payload)
 
-@api_view(["POST"])
-def find_match(request):
-    learn_skill_name = request.data.get("learn")  # User wants to learn this skill
+
+# Upper bound on how long a cached match can outlive the data behind it
+MATCH_CACHE_TIMEOUT = 60
+
+
+def _matcher(learn_skill, learner_id):
+    async def compute():
+        return await matching.run_in_executor(
+            lambda: next(matching.best_matches([learn_skill], [learner_id]))[1:]
+        )
+
+    return compute
+
+
+async def _cached_match(learn_skill, learner_id=None):
+    """``(match, message)`` for ``learn_skill``, as returned by find_match.
+
+    ``learner_id`` is never matched with themselves. Only learners who are
+    the best teacher of the skill get a match cached for them alone; everyone
+    else shares one entry. Misses are matched in the matching thread pool,
+    off the event loop.
+    """
+    result = await cache.aget_or_set(
+        "matches", (learn_skill.pk,), _matcher(learn_skill, None), MATCH_CACHE_TIMEOUT
+    )
+    match = result[0]
+    if learner_id is not None and match and match["id"] == learner_id:
+        result = await cache.aget_or_set(
+            "matches",
+            (learn_skill.pk, learner_id),
+            _matcher(learn_skill, learner_id),
+            MATCH_CACHE_TIMEOUT,
+        )
+    return result
+
+
+@async_api_view(["POST"])
+async def find_match(request):
+    try:
+        data = _request_data(request)
+    except ValueError:
+        return TimedJsonResponse({"error": "Invalid JSON"}, status=400)
+    learn_skill_name = data.get("learn")  # User wants to learn this skill
 
     if not learn_skill_name:
-        return Response({"error": "Skill to learn is required"}, status=400)
+        return TimedJsonResponse({"error": "Skill to learn is required"}, status=400)
 
     # 🔹 Check if the requested skill exists in the database
-    learn_skill = Skill.objects.filter(name__iexact=learn_skill_name).first()
+    learn_skill = await Skill.objects.named(learn_skill_name).afirst()
     if not learn_skill:
-        return Response(
+        return TimedJsonResponse(
             {"match": None, "message": "No such skill found in the database"}
         )
 
-    # 🔹 Get users who have this skill
-    potential_teachers = CustomUser.objects.filter(skills=learn_skill)
+    # 🔹 AI Matching: score teachers of this skill and of related skills
+    learner_id = request.user.pk if request.user.is_authenticated else None
+    match, message = await _cached_match(learn_skill, learner_id)
+
+    if match:
+        return TimedJsonResponse({"match": match})
 
-    if not potential_teachers.exists():
-        return Response({"match": None, "message": "No users found with this skill"})
+    return TimedJsonResponse({"match": None, "message": message})
 
-    # 🔹 AI Matching: Compare similarity using NLP
-    best_match = None
-    highest_similarity = 0.0
 
-    user_learn_doc = nlp(learn_skill.name)
+MAX_BATCH_SIZE = 5000
 
-    for teacher in potential_teachers:
-        for skill in teacher.skills.all():
-            teach_doc = nlp(skill.name)
-            similarity = user_learn_doc.similarity(teach_doc)  # NLP similarity score
 
-            if similarity > highest_similarity:
-                highest_similarity = similarity
-                best_match = teacher
+@api_view(["POST"])
+def find_match_batch(request):
+    """Match many requests at once, streamed back as NDJSON.
+
+    Accepts either ``{"learn": [skill names]}`` or ``{"learners": [user ids]}``;
+    the latter matches every skill of every listed learner.
+    """
+    learn_skill_names = request.data.get("learn")
+    learner_ids = request.data.get("learners")
+    requested = learner_ids if learn_skill_names is None else learn_skill_names
+
+    if not isinstance(requested, list):
+        return Response(
+            {"error": "A list of skills to learn or of learner ids is required"},
+            status=400,
+        )
 
-    if best_match:
+    if len(requested) > MAX_BATCH_SIZE:
+        return Response(
+            {"error": f"At most {MAX_BATCH_SIZE} matches can be requested at once"},
+            status=400,
+        )
+
+    if learn_skill_names is None:
+        if not all(
+            isinstance(pk, int) and not isinstance(pk, bool) for pk in requested
+        ):
+            return Response({"error": "Learner ids must be integers"}, status=400)
+        links = list(
+            CustomUser.skills.through.objects.filter(customuser_id__in=learner_ids)
+            .order_by("customuser_id", "skill_id")
+            .values_list("customuser_id", "skill_id")
+        )
+        items = [{"learner": learner_id} for learner_id, _ in links]
+        skills = Skill.objects.in_bulk([skill_id for _, skill_id in links])
+        learn_skills = [skills[skill_id] for _, skill_id in links]
+    else:
+        if not all(isinstance(name, str) for name in requested):
+            return Response({"error": "Skill names must be strings"}, status=400)
+        items = [{"learn": name} for name in learn_skill_names]
+        lowered = [name.lower() for name in learn_skill_names]
+        skills = {skill.name.lower(): skill for skill in Skill.objects.named(*lowered)}
+        learn_skills = [skills.get(name) for name in lowered]
+
+    def lines():
+        found = [skill for skill in learn_skills if skill is not None]
+        results = matching.best_matches(
+            found,
+            [
+                item.get("learner")
+                for item, skill in zip(items, learn_skills)
+                if skill is not None
+            ],
+        )
+        for item, skill in zip(items, learn_skills):
+            if skill is None:
+                item.update(match=None, message="No such skill found in the database")
+            else:
+                _, match, message = next(results)
+                item.update(skill=skill.name, match=match)
+                if message:
+                    item["message"] = message
+            yield json.dumps(item) + "\n"
+
+    return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+
+
+MAX_MATCHES_PAGE_SIZE = 50
+
+
+@api_view(["GET"])
+def rank_matches(request):
+    learn_skill_name = request.query_params.get("learn")
+
+    if not learn_skill_name:
+        return Response({"error": "Skill to learn is required"}, status=400)
+
+    try:
+        limit = min(int(request.query_params.get("limit", 10)), MAX_MATCHES_PAGE_SIZE)
+        cursor = request.query_params.get("cursor")
+        cursor = matching.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    if limit <= 0:
+        return Response({"error": "limit must be positive"}, status=400)
+
+    learn_skill = Skill.objects.named(learn_skill_name).first()
+    if not learn_skill:
         return Response(
             {
-                "match": {
-                    "id": best_match.id,
-                    "name": best_match.fullName or best_match.email,
-                    "teaches": learn_skill.name,
-                    "proficiency": best_match.proficiency,
-                    "similarity_score": round(highest_similarity, 2),
-                }
+                "results": [],
+                "next_cursor": None,
+                "message": "No such skill found in the database",
             }
         )
 
-    return Response({"match": None, "message": "No suitable match found"})
+    results, next_cursor = matching.rank_teachers(learn_skill, limit, cursor)
+    return Response({"results": results, "next_cursor": next_cursor})
 
 
-class UserProfileView(APIView):
-    # authentication_classes = [JWTAuthentication]
-    permission_classes = [IsAuthenticated]
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    return Response(cache.stats())
 
-    def get(self, request):
-        user = request.user  # Ensure this is the logged-in user
-        print("User:", user.email)  # Debugging output
-        print("Authenticated:", user.is_authenticated)
 
-        if not user.is_authenticated:
-            return Response({"error": "User is not authenticated"}, status=401)
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def http_stats(request):
+    return Response(http_client.metrics())
+
+
+def prometheus_metrics(request):
+    """Request and outbound HTTP metrics for a Prometheus scraper running
+    on one of ``PERFORMANCE["METRICS_ALLOWED_IPS"]``."""
+    allowed = instrumentation.config()["METRICS_ALLOWED_IPS"]
+    if request.META.get("REMOTE_ADDR") not in allowed:
+        return HttpResponse(status=403)
+    return HttpResponse(
+        instrumentation.prometheus(http_client.metrics()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
 
-        serializer = UserProfileSerializer(user, many=False)  # Serialize single user
-        return Response(serializer.data)
 
+class UserProfileView(View):
+    async def get(self, request):
+        error = await _authenticate(request)
+        if error is not None:
+            return error
+        user = request.user  # Ensure this is the logged-in user
 
-API_KEY = AFRICASTALKING_API_KEY
-USERNAME = AFRICASTALKING_USERNAME
-SMS_URL = "https://api.africastalking.com/version1/messaging"
+        if not user.is_authenticated:
+            return TimedJsonResponse({"error": "User is not authenticated"}, status=401)
+
+        return TimedJsonResponse(await profiles.aget_profile(user.pk))
 
 
 @csrf_exempt
-def send_sms(request):
+async def send_sms(request):
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -253,27 +513,16 @@ def send_sms(request):
             ]
             missing_fields = [f for f in required_fields if not data.get(f)]
             if missing_fields:
-                return JsonResponse(
+                return TimedJsonResponse(
                     {"error": f"Missing required fields: {', '.join(missing_fields)}"},
                     status=400,
                 )
 
-            # Get teacher info from your API
-            match_response = requests.post(
-                "http://127.0.0.1:8000/api/find_match/",
-                json={"learn": data["skill_name"]},
-                headers={"Content-Type": "application/json"},
-                timeout=10,
-            )
-
-            if match_response.status_code != 200:
-                return JsonResponse(
-                    {"error": "Teacher matching service unavailable"}, status=503
-                )
-
-            match_data = match_response.json().get("match")
+            # Match a teacher in-process, sharing find_match's cache
+            learn_skill = await Skill.objects.named(data["skill_name"]).afirst()
+            match_data = (await _cached_match(learn_skill))[0] if learn_skill else None
             if not match_data:
-                return JsonResponse(
+                return TimedJsonResponse(
                     {"error": "No available teachers for this skill"}, status=404
                 )
 
@@ -285,108 +534,137 @@ def send_sms(request):
                 "Thank you for using SkillBloom!"
             )
 
-            # Send SMS via Africa’s Talking API
-            sms_response = requests.post(
-                SMS_URL,
-                data={
-                    "username": USERNAME,
-                    "to": data["phone_number"],
-                    "message": message[:160],  # Truncate to 160 characters
-                },
-                headers={
-                    "apiKey": API_KEY,
-                    "Content-Type": "application/x-www-form-urlencoded",
+            # Delivered by the send_sms_outbox worker
+            sms = await notifications.aqueue_sms(data["phone_number"], message)
+            return TimedJsonResponse(
+                {
+                    "status": "queued",
+                    "message": "SMS queued for delivery",
+                    "id": sms.id,
                 },
-                timeout=10,
+                status=202,
             )
 
-            # Check response from SMS provider
-            if sms_response.status_code == 201:
-                return JsonResponse(
-                    {"status": "success", "message": "SMS sent successfully!"}
-                )
-            else:
-                return JsonResponse(
-                    {"error": f"SMS provider error: {sms_response.text}"}, status=500
-                )
-
         except json.JSONDecodeError:
-            return JsonResponse({"error": "Invalid JSON"}, status=400)
-        except requests.Timeout:
-            return JsonResponse({"error": "Service timeout"}, status=504)
+            return TimedJsonResponse({"error": "Invalid JSON"}, status=400)
         except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
+            return TimedJsonResponse({"error": str(e)}, status=500)
 
-    return JsonResponse({"error": "Method not allowed"}, status=405)
+    return TimedJsonResponse({"error": "Method not allowed"}, status=405)
 
 
 User = get_user_model()
 
 
+MAX_XP_PAGE_SIZE = 200
+
+
 class XPTransactionViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
+    def list(self, request):
+        """The user's XP ledger, newest first, keyset-paginated."""
+        try:
+            limit = int(request.query_params.get("limit", 50))
+            cursor = request.query_params.get("cursor")
+            cursor = xp.decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if limit <= 0:
+            return Response(
+                {"error": "limit must be positive"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        txns, next_cursor = xp.history(
+            request.user, min(limit, MAX_XP_PAGE_SIZE), cursor
+        )
+        return Response(
+            {
+                "results": XPTransactionSerializer(txns, many=True).data,
+                "next_cursor": next_cursor,
+            }
+        )
+
     @action(detail=False, methods=["POST"])
     def transfer_xp(self, request):
         sender = request.user
         recipient_username = request.data.get("recipient")
-        amount = int(request.data.get("amount", 0))
+        # Clients retrying a transfer must resend the same key
+        idempotency_key = request.headers.get("Idempotency-Key") or request.data.get(
+            "idempotency_key", uuid.uuid4().hex
+        )
+        try:
+            amount = int(request.data.get("amount", 0))
+        except (TypeError, ValueError):
+            amount = 0
 
-        if amount <= 0 or sender.xp < amount:
+        if amount <= 0 or len(str(idempotency_key)) > 64:
             return Response(
                 {"error": "Insufficient XP or invalid amount"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        try:
-            recipient = User.objects.get(username=recipient_username)
-        except User.DoesNotExist:
+        recipient_id = (
+            User.objects.filter(username=recipient_username)
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if recipient_id is None:
             return Response(
                 {"error": "Recipient not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        sender.xp -= amount
-        recipient.xp += amount
-        sender.save()
-        recipient.save()
+        try:
+            txn, created = xp.transfer(
+                sender.pk, recipient_id, amount, str(idempotency_key)
+            )
+        except xp.IdempotencyConflict as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except xp.InsufficientXP:
+            return Response(
+                {"error": "Insufficient XP or invalid amount"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except xp.TransferError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({"message": f"Transferred {amount} XP to {recipient_username}"})
+        return Response(
+            {
+                "message": f"Transferred {amount} XP to {recipient_username}",
+                "transaction": XPTransactionSerializer(txn).data,
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
 
 
 @api_view(["POST"])
 def complete_session(request, skill_match_id):
-    skill_match = ScheduledSession.objects.get(id=skill_match_id)
-    if not skill_match.is_completed:
-        skill_match.is_completed = True
-        skill_match.save()
+    try:
+        completed = sessions.complete(skill_match_id)
+    except ScheduledSession.DoesNotExist:
+        return Response({"error": "Session not found"}, status=404)
+    if completed:
         return Response({"message": "Session marked as completed."})
     return Response({"message": "Session already completed."})
 
 
 @api_view(["POST"])
 def rate_teacher(request, skill_match_id):
-    skill_match = ScheduledSession.objects.get(id=skill_match_id)
-    if skill_match.is_completed and not skill_match.is_rated:
-        rating = request.data.get("rating")
-        feedback = request.data.get("feedback", "")
-
-        # Create the rating
-        Rating.objects.create(
-            skill_match=skill_match,
-            learner=skill_match.user,  # Learner is the user who requested the session
-            teacher=skill_match.teach_skill.user,  # Teacher is the user offering the skill
-            rating=rating,
-            feedback=feedback,
-        )
-
-        # Allocate credits to the teacher based on the rating
-        teacher = skill_match.teach_skill.user
-        teacher.credits += rating  # Give credits equal to the rating (e.g., 5 credits for a 5-star rating)
-        teacher.save()
+    try:
+        rating = int(request.data.get("rating"))
+    except (TypeError, ValueError):
+        rating = None
+    if rating not in range(1, 6):
+        return Response({"error": "rating must be between 1 and 5"}, status=400)
 
-        skill_match.is_rated = True
-        skill_match.save()
+    try:
+        rated = sessions.rate(skill_match_id, rating, request.data.get("feedback", ""))
+    except ScheduledSession.DoesNotExist:
+        return Response({"error": "Session not found"}, status=404)
+    except sessions.RatingError as e:
+        return Response({"error": str(e)}, status=400)
 
+    if rated:
         return Response({"message": "Teacher rated successfully!"})
     return Response({"message": "Session not completed or already rated."})
 
@@ -403,7 +681,7 @@ def scheduled_sessions(request):
 
         # Validate required fields
         if not (user_id and teacher_id and learn_skill_name and scheduled_date):
-            return JsonResponse(
+            return TimedJsonResponse(
                 {"status": "error", "message": "Missing required fields"},
                 status=400,
             )
@@ -413,7 +691,7 @@ def scheduled_sessions(request):
             user = CustomUser.objects.get(id=user_id)
             teacher = CustomUser.objects.get(id=teacher_id)
         except CustomUser.DoesNotExist:
-            return JsonResponse(
+            return TimedJsonResponse(
                 {"status": "error", "message": "User or Teacher not found"},
                 status=404,
             )
@@ -422,97 +700,178 @@ def scheduled_sessions(request):
         try:
             learn_skill = Skill.objects.get(name=learn_skill_name)
         except Skill.DoesNotExist:
-            return JsonResponse(
+            return TimedJsonResponse(
                 {"status": "error", "message": "Learn skill not found"},
                 status=404,
             )
 
-        # Create and save the session
-        session = ScheduledSession.objects.create(
-            user=user,
-            teach_skill=learn_skill,  # Assuming teach_skill is the skill being taught
-            learn_skill=learn_skill,
-            scheduled_date=scheduled_date,
-            is_completed=False,
-            is_rated=False,
-        )
+        start = _parse_datetime(scheduled_date)
+        if request.data.get("end_date"):
+            end = _parse_datetime(request.data["end_date"])
+        else:
+            try:
+                minutes = int(request.data.get("duration_minutes") or 60)
+                end = start + timedelta(minutes=minutes)
+            except (TypeError, ValueError):
+                end = None
+        if start is None or end is None:
+            return TimedJsonResponse(
+                {"status": "error", "message": "Invalid session date"}, status=400
+            )
+
+        # Create and save the session unless it clashes with another one of
+        # the learner's or the teacher's; allow_overlap only flags the clash
+        try:
+            session, conflicts = scheduling.schedule(
+                allow_overlap=bool(request.data.get("allow_overlap")),
+                user=user,
+                teacher=teacher,
+                teach_skill=learn_skill,  # Assuming teach_skill is the skill being taught
+                learn_skill=learn_skill,
+                scheduled_date=start,
+                end_date=end,
+                is_completed=False,
+                is_rated=False,
+            )
+        except scheduling.SchedulingConflict as e:
+            return TimedJsonResponse(
+                {
+                    "status": "error",
+                    "message": "Session overlaps an existing session",
+                    "conflicts": _conflicts_by_role(e.conflicts, user, teacher),
+                },
+                status=409,
+            )
+        except ValueError as e:
+            return TimedJsonResponse({"status": "error", "message": str(e)}, status=400)
 
-        return JsonResponse(
+        return TimedJsonResponse(
             {
                 "status": "success",
                 "message": "Session created successfully",
                 "session_id": session.id,
+                "conflicts": _conflicts_by_role(conflicts, user, teacher),
             }
         )
 
     except Exception as e:
-        return JsonResponse({"status": "error", "message": str(e)}, status=500)
+        return TimedJsonResponse({"status": "error", "message": str(e)}, status=500)
+
+
+def _parse_datetime(value):
+    """An aware datetime from an ISO 8601 string, or None if it isn't one."""
+    try:
+        parsed = parse_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _conflicts_by_role(conflicts, user, teacher):
+    return {
+        "learner": conflicts.get(user.pk, []),
+        "teacher": conflicts.get(teacher.pk, []),
+    }
+
+
+MAX_AVAILABILITY_TEACHERS = 100
+MAX_AVAILABILITY_WINDOW = timedelta(days=31)
 
 
 @api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def user_sessions(request):
+def teacher_availability(request):
+    """Free time of up to ``MAX_AVAILABILITY_TEACHERS`` teachers between
+    ``start`` and ``end``, in gaps of at least ``min_minutes``."""
+    try:
+        teacher_ids = [
+            int(pk) for pk in request.query_params.get("teachers", "").split(",") if pk
+        ]
+        min_minutes = int(request.query_params.get("min_minutes") or 0)
+    except ValueError:
+        return Response({"error": "Invalid teachers or min_minutes"}, status=400)
+    start = _parse_datetime(request.query_params.get("start"))
+    end = _parse_datetime(request.query_params.get("end"))
+
+    if not teacher_ids or len(teacher_ids) > MAX_AVAILABILITY_TEACHERS:
+        return Response(
+            {"error": f"Give 1 to {MAX_AVAILABILITY_TEACHERS} teacher ids"},
+            status=400,
+        )
+    if start is None or end is None or not start < end:
+        return Response({"error": "Invalid start or end"}, status=400)
+    if end - start > MAX_AVAILABILITY_WINDOW:
+        return Response(
+            {"error": f"The window can't be longer than {MAX_AVAILABILITY_WINDOW}"},
+            status=400,
+        )
+
+    slots = scheduling.free_slots(
+        teacher_ids, start, end, timedelta(minutes=min_minutes)
+    )
+    return Response(
+        {
+            "start": start,
+            "end": end,
+            "teachers": {
+                str(teacher_id): [{"start": s, "end": e} for s, e in gaps]
+                for teacher_id, gaps in slots.items()
+            },
+        }
+    )
+
+
+MAX_SESSIONS_PAGE_SIZE = 500
+
+
+@async_api_view(["GET"], authenticated=True)
+async def user_sessions(request):
     user = request.user
 
     try:
-        # Get sessions where user is either the student or teacher
-        sessions = (
-            ScheduledSession.objects.filter(
-                models.Q(user=user) | models.Q(teach_skill__teachers=user)
-            )
-            .select_related("user", "teach_skill", "learn_skill")
-            .prefetch_related("teach_skill__teachers")
-            .order_by("-scheduled_date")
-            .distinct()
+        limit = request.GET.get("limit")
+        limit = min(int(limit), MAX_SESSIONS_PAGE_SIZE) if limit else None
+        cursor = request.GET.get("cursor")
+        cursor = session_history.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return TimedJsonResponse({"success": False, "message": str(e)}, status=400)
+
+    if limit is not None and limit <= 0:
+        return TimedJsonResponse(
+            {"success": False, "message": "limit must be positive"}, status=400
         )
 
-        response_data = {"success": True, "sessions": [], "count": sessions.count()}
-
-        for session in sessions:
-            # Get all teacher IDs for this session's teach_skill
-            teacher_ids = list(
-                session.teach_skill.teachers.values_list("id", flat=True)
-            )
-            is_teacher = user.id in teacher_ids
-
-            # Determine counterpart information
-            if is_teacher:
-                counterpart = {
-                    "id": session.user.id,
-                    "fullName": session.user.fullName,
-                    "email": session.user.email,
-                }
-                role = "teacher"
-            else:
-                first_teacher = session.teach_skill.teachers.first()
-                counterpart = {
-                    "id": first_teacher.id if first_teacher else None,
-                    "fullName": (
-                        first_teacher.fullName if first_teacher else "Unknown Teacher"
-                    ),
-                    "email": first_teacher.email if first_teacher else "",
-                }
-                role = "student"
-
-            session_data = {
-                "id": session.id,
-                "teach_skill": session.teach_skill.name,
-                "learn_skill": session.learn_skill.name,
-                "role": role,
-                "counterpart": counterpart,
-                "scheduled_date": session.scheduled_date.isoformat(),
-                "status": "completed" if session.is_completed else "pending",
-                "is_rated": session.is_rated,
-            }
-            response_data["sessions"].append(session_data)
+    # Whole histories can be streamed as NDJSON, one keyset page at a time
+    if request.GET.get("stream"):
+        lines = (
+            json.dumps(session) + "\n"
+            async for session in session_history.aiter_sessions(user)
+        )
+        return StreamingHttpResponse(lines, content_type="application/x-ndjson")
 
-        return Response(response_data)
+    try:
+        page, next_cursor = await session_history.asession_page(user, limit, cursor)
+        # "count" is every session of the user, not only this page's
+        if limit is None and cursor is None:
+            count = len(page)
+        else:
+            count = await session_history.asession_count(user)
+        response_data = {
+            "success": True,
+            "sessions": page,
+            "count": count,
+        }
+        if limit is not None:
+            response_data["next_cursor"] = next_cursor
+
+        return TimedJsonResponse(response_data)
 
     except Exception as e:
         logger.error(
             f"Error fetching sessions for user {user.id}: {str(e)}", exc_info=True
         )
-        return Response(
+        return TimedJsonResponse(
             {"success": False, "message": "Error fetching sessions", "error": str(e)},
             status=500,
         )
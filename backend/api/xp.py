@@ -0,0 +1,126 @@
+"""Transfers of XP between users, recorded in the ``XPTransaction`` ledger."""
+
+import base64
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from . import signals
+from .models import CustomUser, XPTransaction
+
+
+class TransferError(Exception):
+    pass
+
+
+class InsufficientXP(TransferError):
+    pass
+
+
+class IdempotencyConflict(TransferError):
+    """The idempotency key was already used for a different transfer."""
+
+
+def _replay(sender_id, recipient_id, amount, idempotency_key):
+    txn = XPTransaction.objects.filter(
+        sender_id=sender_id, idempotency_key=idempotency_key
+    ).first()
+    if txn is not None and (txn.recipient_id, txn.amount) != (recipient_id, amount):
+        raise IdempotencyConflict(
+            "This idempotency key was already used for another transfer"
+        )
+    return txn
+
+
+def transfer(sender_id, recipient_id, amount, idempotency_key):
+    """Move ``amount`` XP from one user to another.
+
+    Returns ``(transaction, created)``. Retrying with the same
+    ``idempotency_key`` returns the recorded transaction without moving any
+    XP again. Both users' rows are locked in primary key order, so opposite
+    transfers between the same pair can't deadlock, and balances change
+    through ``F()`` updates that can't lose a concurrent write. The debit
+    only applies while the sender still has enough XP.
+    """
+    if amount <= 0:
+        raise TransferError("Amount must be positive")
+    if sender_id == recipient_id:
+        raise TransferError("Can't transfer XP to yourself")
+
+    try:
+        with transaction.atomic():
+            list(
+                CustomUser.objects.select_for_update()
+                .filter(pk__in=[sender_id, recipient_id])
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+            # Checked under the lock, so a concurrent retry sees our row
+            txn = _replay(sender_id, recipient_id, amount, idempotency_key)
+            if txn is not None:
+                return txn, False
+
+            debited = CustomUser.objects.filter(
+                pk=sender_id, xp_points__gte=amount
+            ).update(xp_points=F("xp_points") - amount)
+            if not debited:
+                raise InsufficientXP("Insufficient XP")
+            CustomUser.objects.filter(pk=recipient_id).update(
+                xp_points=F("xp_points") + amount
+            )
+            txn = XPTransaction.objects.create(
+                sender_id=sender_id,
+                recipient_id=recipient_id,
+                amount=amount,
+                idempotency_key=idempotency_key,
+            )
+            signals.bump_profiles([sender_id, recipient_id])
+    except IntegrityError:
+        # A concurrent request with the same key won the insert (databases
+        # without row locks, like SQLite, can get here)
+        txn = _replay(sender_id, recipient_id, amount, idempotency_key)
+        if txn is None:
+            raise
+        return txn, False
+    return txn, True
+
+
+def encode_cursor(txn):
+    return base64.urlsafe_b64encode(json.dumps([txn.pk]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the id a history page ended on, or raise ValueError."""
+    try:
+        (txn_id,) = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(txn_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def history(user, limit, cursor=None):
+    """One page of the transfers ``user`` sent or received, newest first.
+
+    Keyset-paginated on id. Returns ``(transactions, next_cursor)``.
+    """
+    txns = (
+        XPTransaction.objects.filter(Q(sender=user) | Q(recipient=user))
+        .select_related("sender", "recipient")
+        .only(
+            "amount",
+            "created_at",
+            "sender__username",
+            "recipient__username",
+        )
+        .order_by("-pk")
+    )
+    if cursor is not None:
+        txns = txns.filter(pk__lt=cursor)
+    txns = list(txns[: limit + 1])
+
+    next_cursor = None
+    if len(txns) > limit:
+        txns = txns[:limit]
+        next_cursor = encode_cursor(txns[-1])
+    return txns, next_cursor
@@ -35,6 +35,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover the rest of the stack
+    "api.instrumentation.PerformanceMiddleware",
+    # Routes read-only views to the replica, if one is configured
+    "api.db_router.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -111,6 +115,9 @@ SIMPLE_JWT = {
 
 ROOT_URLCONF = "backend.urls"
 
+# Runs the tests without the spaCy model, see api.testing
+TEST_RUNNER = "api.testing.TestRunner"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -131,11 +138,79 @@ WSGI_APPLICATION = "backend.wsgi.application"
 
 # Database Configuration
 # Database Configuration
-DATABASES = {
-    "default": {
+# DB_BACKEND picks sqlite (the default) or postgresql. DB_* variables
+# configure the primary. DB_REPLICA_NAME (SQLite) or DB_REPLICA_HOST
+# (PostgreSQL) adds a read replica; its other DB_REPLICA_* variables fall back
+# to the primary's.
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite")
+# PostgreSQL connection pooling: "none", "psycopg" for a pool in every
+# process, or "pgbouncer" for a server-side pooler in transaction mode
+DB_POOL = os.getenv("DB_POOL", "none")
+
+
+def database_settings(prefix):
+    def env(key, default=None):
+        return os.getenv(f"{prefix}_{key}", os.getenv(f"DB_{key}", default))
+
+    if DB_BACKEND == "postgresql":
+        options = {"connect_timeout": int(env("CONNECT_TIMEOUT", 5))}
+        if env("STATEMENT_TIMEOUT"):
+            options["options"] = f"-c statement_timeout={env('STATEMENT_TIMEOUT')}"
+        database = {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": env("NAME", "skillbloom"),
+            "USER": env("USER", "skillbloom"),
+            "PASSWORD": env("PASSWORD", ""),
+            "HOST": env("HOST", "localhost"),
+            "PORT": env("PORT", "5432"),
+            # Keep connections open between requests, and check them before
+            # reuse so a restarted server doesn't fail the next request
+            "CONN_MAX_AGE": int(env("CONN_MAX_AGE", 60)),
+            "CONN_HEALTH_CHECKS": env("CONN_HEALTH_CHECKS", "True") == "True",
+            "OPTIONS": options,
+        }
+        if DB_POOL == "psycopg":
+            # The pool replaces persistent connections
+            database["CONN_MAX_AGE"] = 0
+            options["pool"] = {
+                "min_size": int(env("POOL_MIN_SIZE", 2)),
+                "max_size": int(env("POOL_MAX_SIZE", 10)),
+                "timeout": int(env("POOL_TIMEOUT", 10)),
+            }
+        elif DB_POOL == "pgbouncer":
+            # A transaction-mode pooler can't keep a cursor open across
+            # transactions
+            database["DISABLE_SERVER_SIDE_CURSORS"] = True
+        return database
+
+    return {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": env("NAME", BASE_DIR / "db.sqlite3"),
+        # Take the write lock when a transaction starts, so concurrent writers
+        # wait for each other instead of failing on lock upgrade
+        "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
+    }
+
+
+DATABASES = {"default": database_settings("DB")}
+if DB_BACKEND == "sqlite":
+    # A file, so tests exercising concurrent transactions can share it
+    DATABASES["default"]["TEST"] = {"NAME": BASE_DIR / "test_db.sqlite3"}
+if os.getenv("DB_REPLICA_NAME") or os.getenv("DB_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **database_settings("DB_REPLICA"),
+        # Tests read the replica's data from the test primary
+        "TEST": {"MIRROR": "default"},
     }
+    DATABASE_ROUTERS = ["api.db_router.ReplicaRouter"]
+
+# Read-only views (URL names) served from the replica, and how far it may
+# lag: for that long a user who wrote, and cache entries filled after a
+# write, read from the primary, see api.db_router
+READ_REPLICA = {
+    "ALIAS": "replica",
+    "VIEWS": ["get_skills", "find_match", "user_sessions", "user_profile_api"],
+    "STICKY_SECONDS": int(os.getenv("DB_REPLICA_STICKY_SECONDS", 5)),
 }
 
 # Password validation settings
@@ -183,3 +258,94 @@ load_dotenv()
 
 AFRICASTALKING_API_KEY = os.getenv("AFRICASTALKING_API_KEY")
 AFRICASTALKING_USERNAME = os.getenv("AFRICASTALKING_USERNAME")
+AFRICASTALKING_SMS_URL = os.getenv(
+    "AFRICASTALKING_SMS_URL", "https://api.africastalking.com/version1/messaging"
+)
+# Calling code given to phone numbers queued in national format (07...)
+SMS_DEFAULT_COUNTRY_CODE = os.getenv("SMS_DEFAULT_COUNTRY_CODE", "254")
+
+# Outbound provider calls made through api.http_client
+HTTP_CLIENT = {
+    "CONNECT_TIMEOUT": float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05)),
+    "READ_TIMEOUT": float(os.getenv("HTTP_READ_TIMEOUT", 10)),
+    "POOL_CONNECTIONS": int(os.getenv("HTTP_POOL_CONNECTIONS", 8)),
+    "POOL_MAXSIZE": int(os.getenv("HTTP_POOL_MAXSIZE", 16)),
+    "BREAKER_FAILURES": int(os.getenv("HTTP_BREAKER_FAILURES", 5)),
+    "BREAKER_RESET": float(os.getenv("HTTP_BREAKER_RESET", 30)),
+}
+
+# Request instrumentation (api.instrumentation). QUERY_BUDGETS caps the
+# queries per request by URL name; BUDGET_ACTION "raise" fails the request
+# (and so the test) instead of logging a warning.
+PERFORMANCE = {
+    "SERVER_TIMING": os.getenv("SERVER_TIMING", str(DEBUG)) == "True",
+    "BUDGET_ACTION": os.getenv("QUERY_BUDGET_ACTION", "log"),
+    "METRICS_ALLOWED_IPS": os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(","),
+    "QUERY_BUDGETS": {
+        "user_profile_api": 8,
+        "user_sessions": 3,
+        "get_skills": 3,
+        "xp_transactions": 3,
+        "xp_transfer": 11,
+        "complete_session": 2,
+        "rate_teacher": 12,
+        "scheduled_sessions": 11,
+        "teacher_availability": 2,
+    },
+}
+
+# spaCy model used for skill matching, loaded lazily by api.nlp
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_md")
+# Turns skill names into vectors, see api.embeddings
+SKILL_VECTORIZER = os.getenv("SKILL_VECTORIZER", "api.nlp.vectorize")
+# Only load the static word vectors, not the tagger/parser/NER pipeline
+SPACY_VECTORS_ONLY = os.getenv("SPACY_VECTORS_ONLY", "False") == "True"
+# Load the model in the WSGI master so forked workers share it (gunicorn --preload)
+SPACY_PRELOAD = os.getenv("SPACY_PRELOAD", "False") == "True"
+# Threads that run matching (spaCy/numpy) off the event loop in async views
+MATCH_WORKERS = int(os.getenv("MATCH_WORKERS", 4))
+
+# Cache tiers used by api.cache: "default" is an in-process LRU, "shared" is
+# seen by every worker. CACHE_SHARED_BACKEND picks file, sqlite or redis, or
+# "none" for only the local tier. Redis evicts keys itself (maxmemory-policy),
+# so its evictions show up in INFO's evicted_keys rather than cache.stats().
+CACHE_SHARED_BACKEND = os.getenv("CACHE_SHARED_BACKEND", "none")
+CACHE_SHARED_LOCATION = os.getenv("CACHE_SHARED_LOCATION")
+SHARED_CACHE_BACKENDS = {
+    "file": {
+        "BACKEND": "api.cache_backends.FileCache",
+        "LOCATION": CACHE_SHARED_LOCATION or str(BASE_DIR / ".cache"),
+    },
+    "sqlite": {
+        "BACKEND": "api.cache_backends.SQLiteCache",
+        "LOCATION": CACHE_SHARED_LOCATION or str(BASE_DIR / "cache.sqlite3"),
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_SHARED_LOCATION or "redis://127.0.0.1:6379/1",
+    },
+}
+CACHES = {
+    "default": {
+        "BACKEND": "api.cache_backends.LRUCache",
+        "LOCATION": "skillbloom",
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", 1000))},
+    },
+}
+if CACHE_SHARED_BACKEND in SHARED_CACHE_BACKENDS:
+    CACHES["shared"] = {
+        **SHARED_CACHE_BACKENDS[CACHE_SHARED_BACKEND],
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_SHARED_MAX_ENTRIES", 10000))},
+    }
+else:
+    # Cache versions must be seen by every worker. Without a shared tier they
+    # live in a SQLite file, which only reaches the workers of one host;
+    # deployments on several hosts need CACHE_SHARED_BACKEND=redis.
+    CACHES["versions"] = {
+        "BACKEND": "api.cache_backends.SQLiteCache",
+        "LOCATION": os.getenv(
+            "CACHE_VERSIONS_LOCATION", str(BASE_DIR / "cache_versions.sqlite3")
+        ),
+        # One version per namespace, and every user has a profile namespace
+        "OPTIONS": {"MAX_ENTRIES": 1000000, "TIER": "versions"},
+    }